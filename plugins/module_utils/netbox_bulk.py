@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# (c) 2020, Larry Smith Jr. <mrlesmithjr@gmail.com>
+# MIT License (see LICENSE.md)
+"""Bulk writes of netbox_* collections through NetBox's list endpoints"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type  # pylint: disable=invalid-name
+
+import json
+
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.module_utils.urls import open_url
+from ansible_collections.mrlesmithjr.netbox.plugins.module_utils.netbox_plan \
+    import NetBoxPlan, answered
+
+
+class NetBoxBulkError(Exception):
+    """Error answered by NetBox, or an object which can not be resolved"""
+
+
+class NetBoxBulk(NetBoxPlan):
+    """Bulk writes of a netbox_* collection
+
+    Changes are planned and made by NetBoxPlan, shared with utils/apply.py,
+    through Ansible's open_url.
+    """
+
+    def __init__(self, url, token, validate_certs=True, timeout=60,
+                 batch_size=100):
+        super(NetBoxBulk, self).__init__(
+            '{}/api'.format(url.rstrip('/')), batch_size=batch_size)
+        self.headers = {'Accept': 'application/json',
+                        'Authorization': 'Token {}'.format(token),
+                        'Content-Type': 'application/json'}
+        self.validate_certs = validate_certs
+        self.timeout = timeout
+
+    def request(self, method, url, body=None, bulk=False):
+        """Returns the status and data NetBox answers a request with
+
+        Errors are raised with the errors NetBox gives, but the ones
+        answered as expected.
+        """
+        data = None if body is None else json.dumps(body)
+        try:
+            response = open_url(
+                url, method=method, data=data, headers=self.headers,
+                validate_certs=self.validate_certs, timeout=self.timeout)
+        except HTTPError as error:
+            if answered(method, error.code, bulk):
+                return error.code, None
+            raise NetBoxBulkError('{} {} {}: {}'.format(
+                error.code, method, url, error.read()))
+        content = response.read()
+
+        return response.getcode(), json.loads(content) if content else None
+
+    def read(self, key):
+        """Returns every object of a collection, page by page
+
+        A limit of 0 asks NetBox for its maximum page size.
+        """
+        url = '{}?{}'.format(self.endpoint(key), urlencode({'limit': 0}))
+        objects = []
+        while url:
+            _, page = self.request('GET', url)
+            objects.extend(page['results'])
+            url = page['next']
+
+        return objects
+
+    def run(self, key, records, check_mode=False):
+        """Apply the records of a collection, returning what changed
+
+        Changes are returned as lists of created, updated and deleted
+        objects, each with its name and its fields before and after. In
+        check mode nothing is written, and objects referencing missing ones
+        are counted as created, as previous tasks would have created those.
+        """
+        try:
+            plan = self.plan_collection(key, records, strict=not check_mode)
+        except LookupError as error:
+            raise NetBoxBulkError(str(error))
+        objects = self.cache.collection(key)
+        changes = {
+            'created': [{'name': create['name'], 'before': {},
+                         'after': create['data']}
+                        for create in plan['create']],
+            'updated': [dict((field, update[field])
+                             for field in ('name', 'before', 'after'))
+                        for update in plan['update']],
+            'deleted': [{'name': delete['name'],
+                         'before': dict(objects[delete['id']]), 'after': {}}
+                        for delete in plan['delete']],
+            'unchanged': plan['noop']}
+        if not check_mode:
+            self.apply_collection(key, plan)
+            self.delete(key, plan['delete'])
+            for change, create in zip(changes['created'], plan['create']):
+                change['after'] = self.substituted(key, create['data'])
+
+        return changes
@@ -0,0 +1,726 @@
+# -*- coding: utf-8 -*-
+# (c) 2020, Larry Smith Jr. <mrlesmithjr@gmail.com>
+# MIT License (see LICENSE.md)
+"""Planning of bulk writes of netbox_* collections, without Ansible
+
+Shared by the netbox_bulk module and utils/apply.py, so it only uses the
+standard library.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type  # pylint: disable=invalid-name
+
+import re
+import threading
+from itertools import count
+
+# Every collection managed, by the name of its variable. Each has its API
+# endpoint, the fields of its data identifying an object, the field its
+# slug is made from when not given, and the fields referencing other
+# collections, as (NetBox field, collection, attribute). Collections
+# tried in turn are given as a tuple, and lists of references by a list.
+# Objects are identified by the fields the netbox.netbox modules run by
+# manage_netbox.yml find them by, so a changed record updates the object
+# the previous one described. Fields slugs are made from stand for them.
+# Records not matching an object by key are matched by the fields to
+# match, if given, so changing a reference of the key, such as moving a
+# virtual machine to another cluster, updates the object.
+COLLECTIONS = {
+    # DCIM
+    'netbox_regions': {
+        'endpoint': 'dcim/regions', 'key': ('name',), 'slug': 'name',
+        'references': {'parent_region': ('parent', 'netbox_regions')}},
+    'netbox_sites': {
+        'endpoint': 'dcim/sites', 'key': ('slug',), 'slug': 'name',
+        'references': {'region': ('region', 'netbox_regions'),
+                       'tenant': ('tenant', 'netbox_tenants')}},
+    'netbox_rack_roles': {
+        'endpoint': 'dcim/rack-roles', 'key': ('name',), 'slug': 'name'},
+    'netbox_rack_groups': {
+        'endpoint': 'dcim/rack-groups', 'key': ('site', 'name'),
+        'slug': 'name',
+        'references': {'site': ('site', 'netbox_sites')}},
+    'netbox_racks': {
+        'endpoint': 'dcim/racks', 'key': ('site', 'name'),
+        'references': {'rack_group': ('group', 'netbox_rack_groups'),
+                       'rack_role': ('role', 'netbox_rack_roles'),
+                       'site': ('site', 'netbox_sites'),
+                       'tenant': ('tenant', 'netbox_tenants')}},
+    'netbox_manufacturers': {
+        'endpoint': 'dcim/manufacturers', 'key': ('name',), 'slug': 'name'},
+    'netbox_platforms': {
+        'endpoint': 'dcim/platforms', 'key': ('name',), 'slug': 'name',
+        'references': {
+            'manufacturer': ('manufacturer', 'netbox_manufacturers')}},
+    'netbox_device_types': {
+        'endpoint': 'dcim/device-types', 'key': ('slug',), 'slug': 'model',
+        'references': {
+            'manufacturer': ('manufacturer', 'netbox_manufacturers')}},
+    'netbox_device_roles': {
+        'endpoint': 'dcim/device-roles', 'key': ('name',), 'slug': 'name'},
+    'netbox_devices': {
+        'endpoint': 'dcim/devices', 'key': ('name',),
+        'references': {
+            'cluster': ('cluster', 'netbox_clusters'),
+            'device_role': ('device_role', 'netbox_device_roles'),
+            'device_type': ('device_type', 'netbox_device_types', 'model'),
+            'platform': ('platform', 'netbox_platforms'),
+            'rack': ('rack', 'netbox_racks'),
+            'site': ('site', 'netbox_sites'),
+            'tenant': ('tenant', 'netbox_tenants')}},
+    'netbox_device_interfaces': {
+        'endpoint': 'dcim/interfaces', 'key': ('device', 'name'),
+        'references': {
+            'device': ('device', 'netbox_devices'),
+            'lag': ('lag', 'netbox_device_interfaces'),
+            'tagged_vlans': ('tagged_vlans', ['netbox_vlans']),
+            'untagged_vlan': ('untagged_vlan', 'netbox_vlans')}},
+    'netbox_inventory_items': {
+        'endpoint': 'dcim/inventory-items', 'key': ('device', 'name'),
+        'references': {
+            'device': ('device', 'netbox_devices'),
+            'manufacturer': ('manufacturer', 'netbox_manufacturers')}},
+    # Tenancy
+    'netbox_tenant_groups': {
+        'endpoint': 'tenancy/tenant-groups', 'key': ('name',),
+        'slug': 'name'},
+    'netbox_tenants': {
+        'endpoint': 'tenancy/tenants', 'key': ('slug',), 'slug': 'name',
+        'references': {'tenant_group': ('group', 'netbox_tenant_groups')}},
+    # IPAM
+    'netbox_ipam_roles': {
+        'endpoint': 'ipam/roles', 'key': ('name',), 'slug': 'name'},
+    'netbox_vlan_groups': {
+        'endpoint': 'ipam/vlan-groups', 'key': ('site', 'name'),
+        'slug': 'name',
+        'references': {'site': ('site', 'netbox_sites')}},
+    'netbox_vlans': {
+        'endpoint': 'ipam/vlans', 'key': ('site', 'name'),
+        'references': {'site': ('site', 'netbox_sites'),
+                       'tenant': ('tenant', 'netbox_tenants'),
+                       'vlan_group': ('group', 'netbox_vlan_groups'),
+                       'vlan_role': ('role', 'netbox_ipam_roles')}},
+    'netbox_vrfs': {
+        'endpoint': 'ipam/vrfs', 'key': ('name', 'tenant'),
+        'match': ('name',),
+        'references': {'tenant': ('tenant', 'netbox_tenants')}},
+    'netbox_rirs': {
+        'endpoint': 'ipam/rirs', 'key': ('name',), 'slug': 'name'},
+    'netbox_aggregates': {
+        'endpoint': 'ipam/aggregates', 'key': ('prefix', 'rir'),
+        'match': ('prefix',),
+        'references': {'rir': ('rir', 'netbox_rirs')}},
+    'netbox_prefixes': {
+        'endpoint': 'ipam/prefixes', 'key': ('prefix', 'vrf'),
+        'references': {'prefix_role': ('role', 'netbox_ipam_roles'),
+                       'site': ('site', 'netbox_sites'),
+                       'tenant': ('tenant', 'netbox_tenants'),
+                       'vlan': ('vlan', 'netbox_vlans'),
+                       'vrf': ('vrf', 'netbox_vrfs')}},
+    'netbox_ip_addresses': {
+        'endpoint': 'ipam/ip-addresses', 'key': ('address', 'vrf'),
+        'references': {
+            'interface': ('interface', ('netbox_device_interfaces',
+                                        'netbox_virtual_interfaces')),
+            'nat_inside': ('nat_inside', 'netbox_ip_addresses', 'address'),
+            'tenant': ('tenant', 'netbox_tenants'),
+            'vrf': ('vrf', 'netbox_vrfs')}},
+    # Virtualization
+    'netbox_cluster_groups': {
+        'endpoint': 'virtualization/cluster-groups', 'key': ('name',),
+        'slug': 'name'},
+    'netbox_cluster_types': {
+        'endpoint': 'virtualization/cluster-types', 'key': ('name',),
+        'slug': 'name'},
+    'netbox_clusters': {
+        'endpoint': 'virtualization/clusters',
+        'key': ('name', 'cluster_type'), 'match': ('name',),
+        'references': {'cluster_group': ('group', 'netbox_cluster_groups'),
+                       'cluster_type': ('type', 'netbox_cluster_types'),
+                       'site': ('site', 'netbox_sites')}},
+    'netbox_virtual_machines': {
+        'endpoint': 'virtualization/virtual-machines',
+        'key': ('cluster', 'name'), 'match': ('name',),
+        'references': {
+            'cluster': ('cluster', 'netbox_clusters'),
+            'platform': ('platform', 'netbox_platforms'),
+            'site': ('site', 'netbox_sites'),
+            'tenant': ('tenant', 'netbox_tenants'),
+            'virtual_machine_role': ('role', 'netbox_device_roles')}},
+    'netbox_virtual_interfaces': {
+        'endpoint': 'virtualization/interfaces',
+        'key': ('virtual_machine', 'name'),
+        'references': {
+            'tagged_vlans': ('tagged_vlans', ['netbox_vlans']),
+            'untagged_vlan': ('untagged_vlan', 'netbox_vlans'),
+            'virtual_machine': ('virtual_machine',
+                                'netbox_virtual_machines')}},
+    # Circuits
+    'netbox_providers': {
+        'endpoint': 'circuits/providers', 'key': ('slug',), 'slug': 'name'},
+    'netbox_circuit_types': {
+        'endpoint': 'circuits/circuit-types', 'key': ('slug',),
+        'slug': 'name'},
+    'netbox_circuits': {
+        'endpoint': 'circuits/circuits', 'key': ('cid',),
+        'references': {'circuit_type': ('type', 'netbox_circuit_types'),
+                       'provider': ('provider', 'netbox_providers'),
+                       'tenant': ('tenant', 'netbox_tenants')}},
+    # Secrets
+    'netbox_secret_roles': {
+        'endpoint': 'secrets/secret-roles', 'key': ('slug',),
+        'slug': 'name'},
+    'netbox_secrets': {
+        'endpoint': 'secrets/secrets',
+        'key': ('device', 'secret_role', 'name'),
+        'references': {'device': ('device', 'netbox_devices'),
+                       'secret_role': ('role', 'netbox_secret_roles')}},
+    # Extras
+    'netbox_config_contexts': {
+        'endpoint': 'extras/config-contexts', 'key': ('name',),
+        'references': {
+            'cluster_groups': ('cluster_groups', ['netbox_cluster_groups']),
+            'clusters': ('clusters', ['netbox_clusters']),
+            'platforms': ('platforms', ['netbox_platforms']),
+            'regions': ('regions', ['netbox_regions']),
+            'roles': ('roles', ['netbox_device_roles']),
+            'sites': ('sites', ['netbox_sites']),
+            'tenant_groups': ('tenant_groups', ['netbox_tenant_groups']),
+            'tenants': ('tenants', ['netbox_tenants'])}},
+}
+
+
+def slugify(value):
+    """Returns the slug of a name, as made by the netbox.netbox modules"""
+    value = re.sub(r'[^\w\s.-]', '', value)
+
+    return re.sub(r'[-.\s]+', '-', value).strip().lower()
+
+
+def normalized(value):
+    """Returns a NetBox value as written: references and choices by id"""
+    if isinstance(value, dict):
+        if 'value' in value and 'label' in value:
+            return value['value']
+        if 'id' in value:
+            return value['id']
+    elif isinstance(value, list):
+        return [normalized(item) for item in value]
+
+    return value
+
+
+def differs(field, value, current):
+    """Returns whether a written value differs from the current one
+
+    Lists are compared regardless of order, and custom fields only by the
+    ones written.
+    """
+    if field == 'custom_fields' and isinstance(value, dict):
+        current = current or {}
+        return any(current.get(name) != item for name, item in value.items())
+    if isinstance(value, list) and isinstance(current, list):
+        return sorted(value, key=str) != sorted(current, key=str)
+
+    return value != current
+
+
+def reference(key, output):
+    """Returns how a field of a collection references others, if it does
+
+    References are returned as their NetBox field, the collections tried,
+    the attribute objects are referenced by and whether there are many.
+    """
+    found = COLLECTIONS[key].get('references', {}).get(output)
+    if found is None:
+        return None
+
+    field, collections = found[:2]
+    attribute = found[2] if len(found) > 2 else 'name'
+    many = isinstance(collections, list)
+    if isinstance(collections, str):
+        collections = (collections,)
+
+    return field, tuple(collections), attribute, many
+
+
+def source(key, output):
+    """Returns the NetBox field a field of a collection is written to"""
+    found = reference(key, output)
+
+    return output if found is None else found[0]
+
+
+def references(key):
+    """Returns the NetBox fields of a collection holding references"""
+    return set(source(key, output)
+               for output in COLLECTIONS[key].get('references', {}))
+
+
+def self_references(key):
+    """Returns the NetBox fields of a collection referencing its own
+    objects"""
+    return set(source(key, output)
+               for output in COLLECTIONS[key].get('references', {})
+               if key in reference(key, output)[1])
+
+
+def answered(method, status, bulk=False):
+    """Returns whether a NetBox error answers a request as expected
+
+    Bulk requests may answer 405, NetBox taking them from version 2.10
+    only, and deletes 404 when the object is already gone, such as one
+    deleted along with the object it referenced.
+    """
+    return (bulk and status == 405) or (method == 'DELETE' and status == 404)
+
+
+def dependencies(key):
+    """Returns the collections the objects of a collection reference"""
+    return set(collection
+               for output in COLLECTIONS[key].get('references', {})
+               for collection in reference(key, output)[1])
+
+
+def key_fields(key, fields='key'):
+    """Returns the NetBox fields of the natural key of a collection, or of
+    its fields to match"""
+    return tuple(source(key, output) for output in COLLECTIONS[key].get(
+        fields, COLLECTIONS[key]['key']))
+
+
+def object_name(key, data):
+    """Returns the name of an object given by its natural key fields
+
+    Objects identified by a slug they are not given are named by the field
+    it is made from.
+    """
+    names = []
+    for output in COLLECTIONS[key]['key']:
+        if output == 'slug' and data.get(output) is None:
+            output = COLLECTIONS[key]['slug']
+        if data.get(output) is not None:
+            names.append(str(data[output]))
+
+    return '/'.join(names)
+
+
+def batches(objects, size):
+    """Yields lists of at most size objects"""
+    for start in range(0, len(objects), size):
+        yield objects[start:start + size]
+
+
+class ObjectCache:
+    """Objects of NetBox collections, indexed by the values of their fields
+
+    Each collection is read once, when first needed, with the function
+    given. Objects written afterwards are remembered and forgotten as they
+    are created and deleted, so the cache stays current without reading
+    the collection again. Indexes are built on first use.
+    """
+
+    def __init__(self, read):
+        self.read = read
+        # Objects of every collection read, by id
+        self.objects = {}
+        # Objects of a collection by the values of some of their fields
+        self.indexes = {}
+        # Collections are read and indexed once, even by concurrent threads
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def collection_lock(self, key):
+        """Returns the lock guarding the reading and indexing of a key"""
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def collection(self, key):
+        """Returns the objects of a collection by id, reading it if needed"""
+        with self.collection_lock(key):
+            if key not in self.objects:
+                self.objects[key] = dict((data['id'], data)
+                                         for data in self.read(key))
+
+        return self.objects[key]
+
+    def index(self, key, fields):
+        """Returns the objects of a collection by the values of fields"""
+        objects = self.collection(key)
+        with self.collection_lock(key):
+            if (key, fields) not in self.indexes:
+                index = {}
+                for data in objects.values():
+                    index.setdefault(
+                        tuple(data.get(field) for field in fields),
+                        []).append(data)
+                self.indexes[(key, fields)] = index
+
+        return self.indexes[(key, fields)]
+
+    def find(self, key, fields, values):
+        """Returns the objects of a collection with the values of fields"""
+        return self.index(key, fields).get(tuple(values), [])
+
+    def remember(self, key, data):
+        """Add an object written to a collection"""
+        self.collection(key)[data['id']] = data
+        for (indexed, fields), index in list(self.indexes.items()):
+            if indexed == key:
+                index.setdefault(tuple(data.get(field) for field in fields),
+                                 []).append(data)
+
+    def forget(self, key, data):
+        """Remove an object deleted from a collection"""
+        self.collection(key).pop(data['id'], None)
+        for (indexed, fields), index in list(self.indexes.items()):
+            if indexed == key:
+                values = tuple(data.get(field) for field in fields)
+                index[values] = [found for found in index.get(values, [])
+                                 if found['id'] != data['id']]
+
+
+class NetBoxPlan:
+    """Plan and make the changes bringing netbox_* collections to NetBox
+
+    Collections are given as written for manage_netbox.yml, one list of
+    records with their data and state per collection. Each collection is
+    read from NetBox once and joined with its records by natural key,
+    telling the objects to create, update or delete from the ones already
+    as given. Collections referenced are read once too, so references are
+    resolved without any further request. Only the planned changes are
+    then sent, in batches through the list endpoints.
+
+    Subclasses send the requests, through request and read.
+    """
+
+    def __init__(self, url, batch_size=100):
+        # Base url of the API
+        self.url = url.rstrip('/')
+        self.batch_size = batch_size
+        # OPTIONS metadata of the fields of each collection
+        self.metadata = {}
+        # Objects of the collections read, as written
+        self.cache = ObjectCache(self.current)
+        # Placeholder ids of planned objects, and their ids once created
+        self.placeholders = count(-1, -1)
+        self.created = {}
+        # List endpoints which do not take bulk updates and deletes
+        self.single = set()
+
+    def request(self, method, url, body=None, bulk=False):
+        """Returns the status and data NetBox answers a request with
+
+        Errors are raised with the errors NetBox gives, but the ones
+        answered as expected.
+        """
+        raise NotImplementedError
+
+    def read(self, key):
+        """Returns every object of a collection, as NetBox answers them"""
+        raise NotImplementedError
+
+    def current(self, key):
+        """Returns every object of a collection in NetBox as written"""
+        return [dict((field, normalized(value))
+                     for field, value in data.items())
+                for data in self.read(key)]
+
+    def endpoint(self, key):
+        """Returns the url of the list endpoint of a collection"""
+        return '{}/{}/'.format(self.url, COLLECTIONS[key]['endpoint'])
+
+    def fields(self, key):
+        """Returns the metadata of the fields NetBox accepts for a collection
+
+        It is empty when the token may not create objects.
+        """
+        if key not in self.metadata:
+            _, options = self.request('OPTIONS', self.endpoint(key))
+            self.metadata[key] = options.get('actions', {}).get('POST', {})
+
+        return self.metadata[key]
+
+    def natural_key(self, key, data, fields='key'):
+        """Returns the natural key of an object as written, or the values of
+        its fields to match"""
+        return tuple(data.get(field) for field in key_fields(key, fields))
+
+    def existing(self, key, payload, excluded, fields='key'):
+        """Returns the objects of a collection with the natural key of an
+        object as written, or its fields to match, but the excluded ids"""
+        return [data for data in self.cache.find(
+            key, key_fields(key, fields),
+            self.natural_key(key, payload, fields))
+                if not any(data['id'] in ids for ids in excluded)]
+
+    def plan_collection(self, key, records, strict=True):
+        """Returns the changes to make to a collection
+
+        Objects to create, with their placeholder id and data, to update,
+        with their fields before and after, and to delete are listed by
+        name, and the objects already as given counted. Records are joined
+        with objects by natural key, or by their fields to match when
+        present and only one object left has them, and each object with one
+        record at most. Planned creates and updates are made to the cached
+        objects, so records referencing objects of the same collection are
+        planned in passes, once those are. Objects to delete stay cached
+        until deleted, so the absent objects referencing them can be planned
+        too. Records referencing missing objects raise a LookupError, or are
+        planned as created with their data as given when not strict, as
+        previous changes not made would have created those.
+        """
+        plan = {'create': [], 'update': [], 'delete': [], 'noop': 0}
+        deleted, joined = set(), set()
+        pending = list(records)
+        while pending:
+            deferred = []
+            for record in pending:
+                absent = record.get('state', 'present') == 'absent'
+                try:
+                    payload = self.payload(key, record['data'])
+                except LookupError:
+                    # Objects referencing missing ones can not exist
+                    if not absent:
+                        deferred.append(record)
+                    continue
+                name = object_name(key, record['data'])
+                # Records sharing a key are joined with the objects having
+                # it in turn, never twice with the same one
+                found = self.existing(key, payload, (deleted, joined))
+                if not found and not absent and 'match' in COLLECTIONS[key]:
+                    # Objects changing a reference of their key are found
+                    # by the fields to match, when only one not joined
+                    # with another record has them
+                    found = self.existing(
+                        key, payload, (deleted, joined), 'match')
+                    found = found if len(found) == 1 else []
+                existing = next(iter(found), None)
+                if absent:
+                    if existing is not None:
+                        plan['delete'].append(
+                            {'name': name, 'id': existing['id']})
+                        deleted.add(existing['id'])
+                elif existing is None:
+                    planned = dict(payload, id=next(self.placeholders))
+                    plan['create'].append(
+                        {'name': name, 'id': planned['id'], 'data': payload})
+                    self.cache.remember(key, planned)
+                    joined.add(planned['id'])
+                else:
+                    joined.add(existing['id'])
+                    changes = dict(
+                        (field, value) for field, value in payload.items()
+                        if differs(field, value, existing.get(field)))
+                    if changes:
+                        plan['update'].append({
+                            'name': name, 'id': existing['id'],
+                            'before': dict((field, existing.get(field))
+                                           for field in changes),
+                            'after': changes})
+                        self.cache.forget(key, existing)
+                        self.cache.remember(key, dict(existing, **changes))
+                    else:
+                        plan['noop'] += 1
+            if len(deferred) == len(pending):
+                if not strict:
+                    plan['create'].extend(
+                        {'name': object_name(key, record['data']),
+                         'id': next(self.placeholders),
+                         'data': record['data']} for record in deferred)
+                    break
+                # Raise the lookup error of the first one left
+                self.payload(key, deferred[0]['data'])
+            pending = deferred
+
+        return plan
+
+    def payload(self, key, data):
+        """Returns an object of a collection as written to NetBox
+
+        References are resolved to ids and choices to their values. Fields
+        unknown to NetBox or read only are left out.
+        """
+        metadata = self.fields(key)
+        payload = {}
+        for output, value in data.items():
+            payload[source(key, output)] = self.value(key, output, value)
+        slug = COLLECTIONS[key].get('slug')
+        if slug and 'slug' not in payload and payload.get(slug):
+            payload['slug'] = slugify(payload[slug])
+        if metadata:
+            payload = dict((field, value) for field, value in payload.items()
+                           if field in metadata and
+                           not metadata[field].get('read_only'))
+
+        return payload
+
+    def value(self, key, output, value):
+        """Returns the value of a field as written to NetBox
+
+        Choices are given by value or label.
+        """
+        found = reference(key, output)
+        if value is None:
+            return None
+        if found is not None:
+            _, collections, attribute, many = found
+            if many:
+                return [self.resolve(collections, attribute, item)
+                        for item in value]
+            return self.resolve(collections, attribute, value)
+
+        choices = self.fields(key).get(output, {}).get('choices')
+        for choice in choices or ():
+            if str(value).lower() in (str(choice['value']).lower(),
+                                      str(choice['display_name']).lower()):
+                return choice['value']
+
+        return normalized(value)
+
+    def resolve(self, collections, attribute, value):
+        """Returns the id of a referenced object
+
+        Objects are referenced by id, by the attribute of the reference or
+        by a nested object of their fields, looked up in the first
+        collection having all of them.
+        """
+        if isinstance(value, int):
+            return value
+        if isinstance(value, dict) and 'id' in value:
+            return value['id']
+
+        query = value if isinstance(value, dict) else {attribute: value}
+        for key in collections:
+            known = set(COLLECTIONS[key].get('references', {}))
+            known.update(COLLECTIONS[key]['key'], ('name', 'slug', attribute))
+            if set(query) <= known:
+                return self.lookup(key, query)
+
+        raise LookupError('No collection has objects like {}'.format(value))
+
+    def lookup(self, key, query):
+        """Returns the id of the only object of a collection matching query
+
+        The query is written like an object, and matched against the cached
+        objects of the collection.
+        """
+        fields, values = [], []
+        for output, value in sorted(query.items()):
+            fields.append(source(key, output))
+            values.append(self.value(key, output, value))
+        found = self.cache.find(key, tuple(fields), values)
+        if len(found) != 1:
+            raise LookupError('{} {} of {} matching {}'.format(
+                len(found) or 'No', 'objects' if found else 'object', key,
+                query))
+
+        return found[0]['id']
+
+    def apply_collection(self, key, plan, step=None):
+        """Create and update the objects of a collection as planned
+
+        Objects referencing others of the same collection are created in
+        passes, once those are.
+        """
+        pending = plan['create']
+        while pending:
+            ready = [create for create in pending
+                     if self.ready(key, create['data'])]
+            if not ready:
+                raise LookupError('Circular references between the objects '
+                                  'of {} to create'.format(key))
+            created = self.write('POST', key, [
+                self.substituted(key, create['data']) for create in ready],
+                step)
+            for create, data in zip(ready, created):
+                self.created[create['id']] = data['id']
+            pending = [create for create in pending
+                       if create['id'] not in self.created]
+        self.write('PATCH', key, [
+            dict(self.substituted(key, update['after']), id=update['id'])
+            for update in plan['update']], step)
+
+    def ready(self, key, data):
+        """Returns whether the objects referenced by planned data exist"""
+        try:
+            self.substituted(key, data)
+        except KeyError:
+            return False
+
+        return True
+
+    def substituted(self, key, data):
+        """Returns planned data with the ids of the objects created
+
+        Placeholder ids of objects not created yet raise a KeyError.
+        """
+        def created(value):
+            if isinstance(value, list):
+                return [created(item) for item in value]
+            if isinstance(value, int) and value < 0:
+                return self.created[value]
+            return value
+
+        fields = references(key)
+
+        return dict((field, created(value) if field in fields else value)
+                    for field, value in data.items())
+
+    def delete(self, key, deletes, step=None):
+        """Delete the planned objects of a collection
+
+        Objects referencing others of the same collection are deleted in
+        passes before those, the reverse of their creation, as NetBox may
+        delete them along with the objects they reference.
+        """
+        fields = self_references(key)
+        objects = self.cache.collection(key)
+        pending = [delete['id'] for delete in deletes]
+        while pending:
+            referenced = set()
+            for object_id in pending:
+                for field in fields:
+                    value = objects.get(object_id, {}).get(field)
+                    referenced.update(
+                        value if isinstance(value, list) else [value])
+            ready = [object_id for object_id in pending
+                     if object_id not in referenced]
+            if not ready:
+                raise LookupError('Circular references between the objects '
+                                  'of {} to delete'.format(key))
+            self.write('DELETE', key, [{'id': object_id}
+                                       for object_id in ready], step)
+            pending = [object_id for object_id in pending
+                       if object_id in referenced]
+
+    def write(self, method, key, objects, step=None):
+        """Send objects to the list endpoint of a collection in batches
+
+        NetBox only takes bulk updates and deletes from version 2.10, older
+        versions answering 405, so objects are then sent one at a time.
+        Requests and objects sent are counted in step. Returns the objects
+        written, as NetBox answers them.
+        """
+        step = step if step is not None else {'requests': 0, 'objects': 0}
+        url = self.endpoint(key)
+        written = []
+        for batch in batches(objects, self.batch_size):
+            if method == 'POST' or url not in self.single:
+                status, answer = self.request(method, url, batch, bulk=True)
+                step['requests'] += 1
+                if status != 405:
+                    written.extend(answer or ())
+                    continue
+                self.single.add(url)
+            for item in batch:
+                item = dict(item)
+                object_url = '{}{}/'.format(url, item.pop('id'))
+                _, answer = self.request(
+                    method, object_url, item if method == 'PATCH' else None)
+                step['requests'] += 1
+                if answer:
+                    written.append(answer)
+        step['objects'] += len(objects)
+
+        return written
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# (c) 2020, Larry Smith Jr. <mrlesmithjr@gmail.com>
+# MIT License (see LICENSE.md)
+"""Ansible module managing a whole netbox_* collection in bulk"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type  # pylint: disable=invalid-name
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = r'''
+---
+module: netbox_bulk
+short_description: Manage a whole collection of NetBox objects in bulk
+description:
+  - Creates, updates and deletes every object of a netbox_* collection,
+    as used by manage_netbox.yml, in a single task.
+  - The collection is read from NetBox once and matched against the
+    objects given by natural key, so only the objects to create, update
+    or delete are sent, in batches through NetBox's list endpoints.
+  - NetBox versions before 2.10 do not take bulk updates and deletes,
+    which are then sent one object at a time.
+  - References to other objects are given by name, as to the
+    netbox.netbox modules, and choices by label or value.
+author:
+  - Larry Smith Jr. (@mrlesmithjr)
+options:
+  netbox_url:
+    description:
+      - URL of the NetBox instance.
+    required: true
+    type: str
+  netbox_token:
+    description:
+      - NetBox API token, allowed to write the collection.
+    required: true
+    type: str
+  collection:
+    description:
+      - Name of the variable of the collection managed.
+    required: true
+    type: str
+    choices:
+      - netbox_regions
+      - netbox_sites
+      - netbox_rack_roles
+      - netbox_rack_groups
+      - netbox_racks
+      - netbox_manufacturers
+      - netbox_platforms
+      - netbox_device_types
+      - netbox_device_roles
+      - netbox_devices
+      - netbox_device_interfaces
+      - netbox_inventory_items
+      - netbox_tenant_groups
+      - netbox_tenants
+      - netbox_ipam_roles
+      - netbox_vlan_groups
+      - netbox_vlans
+      - netbox_vrfs
+      - netbox_rirs
+      - netbox_aggregates
+      - netbox_prefixes
+      - netbox_ip_addresses
+      - netbox_cluster_groups
+      - netbox_cluster_types
+      - netbox_clusters
+      - netbox_virtual_machines
+      - netbox_virtual_interfaces
+      - netbox_providers
+      - netbox_circuit_types
+      - netbox_circuits
+      - netbox_secret_roles
+      - netbox_secrets
+      - netbox_config_contexts
+  objects:
+    description:
+      - Objects of the collection, each with its C(data) and optionally
+        its C(state), C(present) or C(absent).
+    required: true
+    type: list
+    elements: dict
+  batch_size:
+    description:
+      - Objects to send per bulk request.
+    type: int
+    default: 100
+  timeout:
+    description:
+      - Seconds to wait for NetBox to respond.
+    type: int
+    default: 60
+  validate_certs:
+    description:
+      - Whether to validate the SSL certificate of NetBox.
+    type: bool
+    default: true
+'''
+
+EXAMPLES = r'''
+- name: Manage NetBox Prefixes
+  mrlesmithjr.netbox.netbox_bulk:
+    netbox_url: "{{ netbox_url }}"
+    netbox_token: "{{ netbox_token }}"
+    collection: netbox_prefixes
+    objects: "{{ netbox_prefixes }}"
+
+- name: Manage NetBox Device Interfaces
+  mrlesmithjr.netbox.netbox_bulk:
+    netbox_url: "{{ netbox_url }}"
+    netbox_token: "{{ netbox_token }}"
+    collection: netbox_device_interfaces
+    objects: "{{ netbox_device_interfaces }}"
+    batch_size: 500
+'''
+
+RETURN = r'''
+created:
+  description: Names of the objects created.
+  returned: always
+  type: list
+  elements: str
+updated:
+  description: Names of the objects updated.
+  returned: always
+  type: list
+  elements: str
+deleted:
+  description: Names of the objects deleted.
+  returned: always
+  type: list
+  elements: str
+unchanged:
+  description: Number of objects already as given.
+  returned: always
+  type: int
+'''
+
+from ansible.module_utils.basic import AnsibleModule  # noqa E402
+from ansible_collections.mrlesmithjr.netbox.plugins.module_utils.netbox_bulk \
+    import NetBoxBulk, NetBoxBulkError  # noqa E402
+from ansible_collections.mrlesmithjr.netbox.plugins.module_utils.netbox_plan \
+    import COLLECTIONS  # noqa E402
+
+
+def main():
+    """Main module execution"""
+    module = AnsibleModule(
+        argument_spec=dict(
+            netbox_url=dict(type='str', required=True),
+            netbox_token=dict(type='str', required=True, no_log=True),
+            collection=dict(type='str', required=True,
+                            choices=list(COLLECTIONS)),
+            objects=dict(type='list', elements='dict', required=True),
+            batch_size=dict(type='int', default=100),
+            timeout=dict(type='int', default=60),
+            validate_certs=dict(type='bool', default=True),
+        ),
+        supports_check_mode=True,
+    )
+    params = module.params
+    netbox_bulk = NetBoxBulk(
+        params['netbox_url'], params['netbox_token'],
+        validate_certs=params['validate_certs'], timeout=params['timeout'],
+        batch_size=params['batch_size'])
+    try:
+        changes = netbox_bulk.run(params['collection'], params['objects'],
+                                  check_mode=module.check_mode)
+    except NetBoxBulkError as error:
+        module.fail_json(msg=str(error))
+
+    result = {action: [change['name'] for change in changes[action]]
+              for action in ('created', 'updated', 'deleted')}
+    result['unchanged'] = changes['unchanged']
+    result['changed'] = any(result[action]
+                            for action in ('created', 'updated', 'deleted'))
+    if module._diff:  # pylint: disable=protected-access
+        result['diff'] = [
+            {'before_header': change['name'],
+             'after_header': change['name'],
+             'before': change['before'], 'after': change['after']}
+            for action in ('created', 'updated', 'deleted')
+            for change in changes[action]]
+
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
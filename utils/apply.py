@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""Script to apply Ansible NetBox data to NetBox in bulk"""
+
+# (c) 2020, Larry Smith Jr. <mrlesmithjr@gmail.com>
+#
+# This file is a module for applying the netbox_* collections managed by
+# manage_netbox.yml through NetBox's list endpoints
+
+#
+# Module usage:
+# python apply.py --vars ../group_vars/all/netbox.yml # noqa E501
+# Example:
+# python apply.py --vars ../group_vars/all/netbox.yml \
+# --url http://127.0.0.1:8080 \
+# --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f # noqa E501
+#
+# The url and token default to netbox_url and netbox_token of the
+# variables. Directories written by ingest.py --output-dir are read too,
+# one file per collection:
+# python apply.py --vars netbox-export --batch-size 500 # noqa E501
+#
+# Collections which do not depend on each other, such as IPAM roles, RIRs,
+# manufacturers and tenant groups, can be applied concurrently with
+# --workers:
+# python apply.py --vars ../group_vars/all/netbox.yml --workers 8 # noqa E501
+#
+# Every change is planned before any is made. The plan of the objects to
+# create, update and delete, and of the ones already as given, can be
+# printed without making it, as a summary or as JSON:
+# python apply.py --vars ../group_vars/all/netbox.yml --plan # noqa E501
+# python apply.py --vars ../group_vars/all/netbox.yml --plan json # noqa E501
+#
+
+
+import argparse
+import json
+import sys
+import pynetbox
+from lib.netbox.apply import NetBoxApply, plan_summary, plan_table
+from lib.netbox.diff import load_ansible
+from lib.netbox.session import build_session
+from lib.netbox.stats import Stats
+
+
+def get_args():
+    """Get CLI command arguments"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vars', help='Ansible variables file, or '
+                        'directory of files, holding the netbox_* '
+                        'collections to apply',
+                        default='../group_vars/all/netbox.yml')
+    parser.add_argument('--token', help='NetBox API token, netbox_token of '
+                        'the variables by default')
+    parser.add_argument('--url', help='NetBox API host url, netbox_url of '
+                        'the variables by default')
+    parser.add_argument('--batch-size', help='Objects to send per bulk '
+                        'request', type=int, default=100)
+    parser.add_argument('--workers', help='Number of independent '
+                        'collections to apply concurrently', type=int,
+                        default=1)
+    parser.add_argument('--page-workers', help='Number of pages to fetch '
+                        'concurrently when reading a collection', type=int,
+                        default=1)
+    parser.add_argument('--timeout', help='Seconds to wait for NetBox to '
+                        'connect or respond', type=float, default=60)
+    parser.add_argument('--retries', help='Times to retry failed or rate '
+                        'limited requests', type=int, default=3)
+    parser.add_argument('--backoff', help='Backoff factor in seconds '
+                        'between retries', type=float, default=0.5)
+    parser.add_argument('--plan', help='Only print the changes planned, '
+                        'as a summary table or as JSON', nargs='?',
+                        const='summary', choices=['summary', 'json'])
+    parser.add_argument('--stats', help='Print apply statistics to stderr',
+                        nargs='?', const='json', choices=['json', 'table'])
+
+    return parser.parse_args()
+
+
+def main():
+    """Main module execution"""
+    args = get_args()
+    stats = Stats()
+    ansible_data = load_ansible(args.vars)
+    url = args.url or ansible_data.get('netbox_url', 'http://127.0.0.1:8080')
+    token = args.token or ansible_data.get('netbox_token')
+    if token is None:
+        sys.exit('A NetBox API token is required, with --token or '
+                 'netbox_token')
+
+    netbox = pynetbox.api(url=url, token=token)
+    netbox.http_session = build_session(
+        pool_size=args.workers * args.page_workers, timeout=args.timeout,
+        retries=args.retries, backoff=args.backoff)
+    netbox_apply = NetBoxApply(netbox, batch_size=args.batch_size,
+                               workers=args.workers,
+                               page_workers=args.page_workers, stats=stats)
+    with stats.measure('total', 'plan'):
+        plan = netbox_apply.plan(ansible_data)
+
+    if args.plan == 'summary':
+        print(plan_table(plan))
+    elif args.plan == 'json':
+        # Dates of the variables are planned as read by YAML
+        print(json.dumps(plan, indent=2, default=str))
+    else:
+        with stats.measure('total', 'apply'):
+            netbox_apply.apply(plan)
+        print(json.dumps(plan_summary(plan), indent=2))
+    stats.write(args.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""Script to benchmark NetBox ingestion against a fake NetBox API"""
+
+# (c) 2020, Larry Smith Jr. <mrlesmithjr@gmail.com>
+#
+# This file is a module for benchmarking the NetBox ingest pipeline
+
+#
+# Module usage:
+# python benchmark.py --scale 1000 --scale 100000 \
+# --latency 0.02 # noqa E501
+# Example:
+# python benchmark.py --scale 100000 --latency 0.05 --workers 8 \
+# --page-workers 4 --format table # noqa E501
+#
+# Every scale is served by an in-process HTTP server generating synthetic
+# sites, devices, interfaces, IP addresses... so no NetBox is needed. Peak
+# memory only grows, so scales are run in increasing order. The fake NetBox
+# shares this interpreter, so --latency is what models a remote server
+# rather than its own serialization time.
+#
+
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import pynetbox
+from lib.netbox.ansible import BRIEF, FIELDS, REFERENCES, NetBoxToAnsible
+from lib.netbox.fakeapi import FakeNetBox
+from lib.netbox.ingest import NetBoxIngest
+from lib.netbox.session import build_session
+from lib.netbox.stats import max_rss
+
+
+def get_args():
+    """Get CLI command arguments"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', help='Approximate number of objects in '
+                        'the fake NetBox, may be repeated', type=int,
+                        action='append')
+    parser.add_argument('--latency', help='Seconds the fake NetBox waits '
+                        'before answering each request', type=float,
+                        default=0.0)
+    parser.add_argument('--max-page-size', help='MAX_PAGE_SIZE of the fake '
+                        'NetBox', type=int, default=1000)
+    parser.add_argument('--output', help='Pipeline to benchmark',
+                        choices=['ansible', 'netbox'], default='ansible')
+    parser.add_argument('--workers', help='Number of collections to ingest '
+                        'concurrently', type=int, default=1)
+    parser.add_argument('--page-workers', help='Number of pages to fetch '
+                        'concurrently within each collection', type=int,
+                        default=1)
+    parser.add_argument('--translate-workers', help='Number of processes '
+                        'translating large collections', type=int, default=1)
+    parser.add_argument('--page-size', help='Objects to request per page, '
+                        '0 for the NetBox maximum', type=int, default=0)
+    parser.add_argument('--auto-page-size', help='Grow the page size of '
+                        'each collection while NetBox answers quickly',
+                        action='store_true')
+    parser.add_argument('--sparse', help='Only ingest the collections and '
+                        'fields used by the Ansible output',
+                        action='store_true')
+    parser.add_argument('--format', help='Format to display',
+                        choices=['json', 'table'], default='json')
+    args = parser.parse_args()
+    args.scale = sorted(args.scale or [1000])
+
+    return args
+
+
+def percentile(values, fraction):
+    """Returns the value below which a fraction of the values fall"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(args, scale):
+    """Benchmark the pipeline against a fake NetBox of the given scale"""
+    server = FakeNetBox(scale=scale, latency=args.latency,
+                        max_page_size=args.max_page_size)
+    server.start()
+
+    latencies = []
+    netbox = pynetbox.api(url=server.url, token='benchmark')
+    netbox.http_session = build_session(
+        pool_size=args.workers * args.page_workers)
+    netbox.http_session.hooks['response'].append(
+        lambda response, *args, **kwargs: latencies.append(
+            response.elapsed.total_seconds()))
+
+    fields, brief, references = None, (), None
+    if args.sparse:
+        fields, brief, references = FIELDS, BRIEF, REFERENCES
+
+    netbox_ingest = NetBoxIngest(
+        netbox, workers=args.workers, page_workers=args.page_workers,
+        fields=fields, brief=brief, references=references,
+        page_size=args.page_size,
+        auto_page_size=args.auto_page_size)
+
+    peak = max_rss()
+    started = time.monotonic()
+    netbox_data = netbox_ingest.data()
+    ingest_time = time.monotonic() - started
+    objects = sum(len(records) for records in netbox_data.values())
+
+    translate_time = 0.0
+    if args.output == 'ansible':
+        started = time.monotonic()
+        NetBoxToAnsible(netbox_data, workers=args.translate_workers).data()
+        translate_time = time.monotonic() - started
+
+    server.stop()
+
+    return {
+        'scale': scale,
+        'objects': objects,
+        'requests': server.requests,
+        'bytes': server.bytes_sent,
+        'ingest_seconds': round(ingest_time, 3),
+        'translate_seconds': round(translate_time, 3),
+        'ingest_objects_per_second': round(objects / ingest_time),
+        'latency_mean_seconds': round(statistics.mean(latencies), 4),
+        'latency_p95_seconds': round(percentile(latencies, 0.95), 4),
+        'peak_memory_delta': max_rss() - peak,
+    }
+
+
+def main():
+    """Main module execution"""
+    args = get_args()
+    results = [run(args, scale) for scale in args.scale]
+
+    if args.format == 'json':
+        print(json.dumps(results, indent=2))
+        return
+
+    header = list(results[0])
+    rows = [header] + [[str(result[column]) for column in header]
+                       for result in results]
+    widths = [max(len(row[index]) for row in rows)
+              for index in range(len(header))]
+    for row in rows:
+        sys.stdout.write('  '.join(
+            value.rjust(width) for value, width in zip(row, widths)))
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -13,17 +13,104 @@
 # python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
 # --url http://127.0.0.1:8080 # noqa E501
 #
+# Collections can be ingested concurrently with --workers:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --workers 8 # noqa E501
+#
+# Large collections can additionally fetch their pages concurrently with
+# --page-workers:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --workers 8 --page-workers 4 # noqa E501
+#
+# Raw NetBox data can be streamed as one JSON object per line, tagged with
+# its collection, using --format ndjson:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --format ndjson # noqa E501
+#
+# Ansible output is streamed the same way, each object being translated as
+# it is ingested, collections coming in the order references are resolved:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --output ansible --format ndjson # noqa E501
+#
+# Repeated runs can only fetch objects changed since the previous run by
+# keeping a state file:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --state-file netbox-state.json # noqa E501
+#
+# Ingested collections can be cached on disk so that further runs, such as
+# translating the same data to another output, do not hit the API again:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --cache-dir .netbox-cache --output ansible # noqa E501
+#
+# Ansible output only needs some of the NetBox fields, --sparse only keeps
+# those, as ids for references to other objects, and skips collections
+# which are not translated:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --output ansible --sparse # noqa E501
+#
+# Each collection can be written to its own file, as soon as it is
+# complete, in an Ansible group_vars directory using --output-dir:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --output ansible --format yaml \
+# --output-dir ../group_vars/all # noqa E501
+#
+# Ingested NetBox data can be saved to a compact binary snapshot, which
+# is much faster to read back than JSON or YAML, and later translated or
+# displayed without querying NetBox again:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --save-snapshot netbox.snapshot # noqa E501
+# python ingest.py --load-snapshot netbox.snapshot --output ansible # noqa E501
+#
+# Only the Ansible objects added, changed or removed since a previous
+# Ansible output are written using --diff-from, removed ones with their
+# state absent:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --output ansible --format yaml \
+# --diff-from netbox-previous.yml # noqa E501
+#
+# Content fingerprints of every collection and object can be saved to a
+# manifest, which also lets --output-dir leave the files of collections
+# unchanged since the previous run as they are:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --output ansible --format yaml \
+# --output-dir ../group_vars/all --manifest netbox-manifest.json # noqa E501
+#
+# Large collections can be translated to Ansible by several processes with
+# --translate-workers:
+# python ingest.py --token 4f552cc2e8c3b76d9613a591e3adb58984a19a6f \
+# --url http://127.0.0.1:8080 --output ansible --translate-workers 4 # noqa E501
+#
 
 
 import argparse
 import json
+import os
+import sys
+from itertools import groupby
+from operator import itemgetter
 import yaml
 import pynetbox
 from lib.netbox.ingest import NetBoxIngest
-from lib.netbox.ansible import NetBoxToAnsible
+from lib.netbox.ansible import (
+    BRIEF, DEPENDENCIES, FIELDS, MAPPINGS, REFERENCES, STREAM_ORDER,
+    NetBoxToAnsible)
+from lib.netbox.cache import SnapshotCache
+from lib.netbox.diff import diff, diff_stream, load_ansible
+from lib.netbox.files import atomic_write
+from lib.netbox.fingerprint import Fingerprints, digest
+from lib.netbox.session import build_session
+from lib.netbox.snapshot import NetBoxSnapshot, save_snapshot
+from lib.netbox.state import IngestState
+from lib.netbox.stats import Stats
 
 # pylint: disable=too-many-public-methods
 
+# LibYAML's emitter is much faster than the pure Python one
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
 
 def get_args():
     """Get CLI command arguments"""
@@ -31,29 +118,287 @@ def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--output', help='Output type to display',
                         choices=['ansible', 'netbox'], default='netbox')
-    parser.add_argument('--token', help='NetBox API token', required=True)
+    parser.add_argument('--token', help='NetBox API token')
     parser.add_argument('--url', help='NetBox API host url',
                         default='http://127.0.0.1:8080')
     parser.add_argument('--format', help='Format to display',
-                        choices=['json', 'yaml'], default='json')
+                        choices=['json', 'ndjson', 'yaml'], default='json')
+    parser.add_argument('--output-dir', help='Write each collection to its '
+                        'own file in this directory, such as an Ansible '
+                        'group_vars directory')
+    parser.add_argument('--save-snapshot', help='Save the ingested NetBox '
+                        'data to this binary snapshot file instead of '
+                        'displaying it')
+    parser.add_argument('--load-snapshot', help='Read NetBox data from this '
+                        'binary snapshot file instead of the API')
+    parser.add_argument('--diff-from', help='Only output the Ansible '
+                        'objects added, changed or removed since this '
+                        'previous Ansible output file or directory')
+    parser.add_argument('--manifest', help='Write the content fingerprints '
+                        'of the ingested collections and objects to this '
+                        'file. With --output-dir, files of collections '
+                        'unchanged since the previous run are not rewritten')
+    parser.add_argument('--workers', help='Number of collections to ingest '
+                        'concurrently', type=int, default=1)
+    parser.add_argument('--page-workers', help='Number of pages to fetch '
+                        'concurrently within each collection', type=int,
+                        default=1)
+    parser.add_argument('--translate-workers', help='Number of processes '
+                        'translating large collections to Ansible', type=int,
+                        default=1)
+    parser.add_argument('--state-file', help='Ingest incrementally, only '
+                        'fetching objects changed since the state saved in '
+                        'this file')
+    parser.add_argument('--cache-dir', help='Cache ingested collections in '
+                        'this directory and reuse them while fresh')
+    parser.add_argument('--cache-ttl', help='Seconds a cached collection '
+                        'stays fresh', type=int, default=3600)
+    parser.add_argument('--refresh', help='Ignore cached collections and '
+                        'fetch them again', action='store_true')
+    parser.add_argument('--sparse', help='Only ingest the collections and '
+                        'fields used by the Ansible output, keeping '
+                        'references to other objects as ids',
+                        action='store_true')
+    parser.add_argument('--timeout', help='Seconds to wait for NetBox to '
+                        'connect or respond', type=float, default=60)
+    parser.add_argument('--retries', help='Times to retry failed or rate '
+                        'limited requests', type=int, default=3)
+    parser.add_argument('--backoff', help='Backoff factor in seconds '
+                        'between retries', type=float, default=0.5)
+    parser.add_argument('--page-size', help='Objects to request per page, '
+                        '0 for the NetBox maximum', type=int, default=0)
+    parser.add_argument('--auto-page-size', help='Grow the page size of '
+                        'each collection while NetBox answers quickly',
+                        action='store_true')
+    parser.add_argument('--stats', help='Print ingest and translation '
+                        'statistics to stderr', nargs='?', const='json',
+                        choices=['json', 'table'])
+    parser.add_argument('--stats-prometheus', help='Write ingest and '
+                        'translation statistics to this Prometheus textfile')
     args = parser.parse_args()
+    if args.token is None and args.load_snapshot is None:
+        parser.error('--token is required to read NetBox data from the API')
+    if args.output_dir and args.format == 'ndjson':
+        parser.error('--output-dir writes json or yaml files')
+    if args.diff_from and args.output != 'ansible':
+        parser.error('--diff-from compares Ansible output')
+    if args.save_snapshot and args.output != 'netbox':
+        parser.error('--save-snapshot saves NetBox data, not Ansible output')
 
     return args
 
 
+def write_ndjson(records):
+    """Write (collection, record) pairs as one JSON document per line"""
+    for key, record in records:
+        sys.stdout.write(json.dumps(dict(collection=key, **record)))
+        sys.stdout.write('\n')
+
+
+def write_split(records, directory, output_format, keys, skipped=()):
+    """Write (collection, record) pairs to a file per collection
+
+    Each file is written as soon as its collection is complete and replaced
+    atomically, so it is never read partially written. Empty collections
+    are written too, replacing any previous file, unless they were skipped
+    while streaming the records.
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = set()
+    for key, pairs in groupby(records, itemgetter(0)):
+        write_collection(directory, output_format, key,
+                         [record for _, record in pairs])
+        written.add(key)
+    for key in keys:
+        if key not in written and key not in skipped:
+            write_collection(directory, output_format, key, [])
+
+
+def collection_path(directory, output_format, key):
+    """Returns the path of the file a collection is written to"""
+    extension = 'json' if output_format == 'json' else 'yml'
+
+    return os.path.join(directory, '{}.{}'.format(key, extension))
+
+
+def write_collection(directory, output_format, key, records):
+    """Write a single collection to its own file"""
+    path = collection_path(directory, output_format, key)
+    with atomic_write(path) as output:
+        if output_format == 'json':
+            json.dump({key: records}, output)
+        else:
+            yaml.dump({key: records}, output, Dumper=SafeDumper,
+                      explicit_start=True)
+
+
+def write_yaml(data):
+    """Write collections as a single YAML mapping, one at a time
+
+    Collections are dumped one after another, in the sorted order of a
+    whole dump, as single key mappings which together form one document.
+    """
+    for key in sorted(data):
+        yaml.dump({key: data[key]}, sys.stdout, Dumper=SafeDumper)
+
+
+def skip_unchanged(args, fingerprints, skipped):
+    """Returns a function telling whether to skip writing a collection
+
+    Collections are skipped when their file was written by the previous
+    run and what it was written from is unchanged since. Skipped
+    collections are added to skipped.
+    """
+    def skip(key):
+        dependencies = ()
+        if args.output == 'ansible':
+            dependencies = DEPENDENCIES[key]
+        path = collection_path(args.output_dir, args.format, key)
+        if fingerprints.unchanged(key, dependencies) and os.path.exists(path):
+            skipped.add(key)
+            return True
+        return False
+
+    return skip
+
+
+def skip_collections(records, skip):
+    """Yields (collection, record) pairs of collections not skipped
+
+    Each collection is buffered until complete to tell whether to skip it.
+    """
+    for key, pairs in groupby(records, itemgetter(0)):
+        collection = list(pairs)
+        if not skip(key):
+            yield from collection
+
+
+def save_state(state):
+    """Persist the incremental ingest state if one is in use"""
+    if state is not None:
+        state.save()
+
+
+def save_manifest(fingerprints):
+    """Write the fingerprints manifest if one is in use"""
+    if fingerprints is not None:
+        fingerprints.save()
+
+
+def report_stats(args, stats):
+    """Report the ingest and translation statistics if requested"""
+    stats.write(args.stats)
+    if args.stats_prometheus:
+        stats.prometheus(args.stats_prometheus)
+
+
+def get_ingest(args, stats):
+    """Returns the source of NetBox data, and the ingest state if any"""
+    if args.load_snapshot:
+        return NetBoxSnapshot(args.load_snapshot, stats=stats), None
+
+    netbox = pynetbox.api(url=args.url, token=args.token)
+    netbox.http_session = build_session(
+        pool_size=args.workers * args.page_workers, timeout=args.timeout,
+        retries=args.retries, backoff=args.backoff)
+    state = None
+    if args.state_file:
+        state = IngestState(args.state_file, args.url)
+
+    cache = None
+    if args.cache_dir:
+        cache = SnapshotCache(args.cache_dir, args.url,
+                              ttl=args.cache_ttl, refresh=args.refresh)
+
+    fields, brief, references = None, (), None
+    if args.sparse:
+        fields, brief, references = FIELDS, BRIEF, REFERENCES
+
+    netbox_ingest = NetBoxIngest(
+        netbox, workers=args.workers, page_workers=args.page_workers,
+        state=state, cache=cache, fields=fields, brief=brief,
+        references=references,
+        page_size=args.page_size, auto_page_size=args.auto_page_size,
+        stats=stats)
+
+    return netbox_ingest, state
+
+
 def main():
     """Main module execution"""
     args = get_args()
-    netbox_token = args.token
-    netbox_url = args.url
+    stats = Stats()
+    netbox_ingest, state = get_ingest(args, stats)
+    previous = None
+    if args.diff_from:
+        previous = load_ansible(args.diff_from)
+    fingerprints = None
+    if args.manifest:
+        fingerprints = Fingerprints(args.manifest, settings={
+            'output': args.output, 'format': args.format,
+            'sparse': args.sparse, 'mappings': digest(repr(MAPPINGS))})
+
+    # Snapshots are saved one collection at a time
+    if args.save_snapshot:
+        records = netbox_ingest.stream()
+        if fingerprints is not None:
+            records = fingerprints.stream(records)
+        with stats.measure('total', 'ingest'):
+            save_snapshot(args.save_snapshot, records,
+                          netbox_ingest.collections)
+        save_state(state)
+        save_manifest(fingerprints)
+        report_stats(args, stats)
+        return
 
-    netbox = pynetbox.api(url=netbox_url, token=netbox_token)
-    netbox_ingest = NetBoxIngest(netbox)
-    netbox_data = netbox_ingest.data()
+    # NetBox data is streamed straight from the API, through the
+    # translation for Ansible output
+    if args.format == 'ndjson' or args.output_dir:
+        order = STREAM_ORDER if args.output == 'ansible' else None
+        records = netbox_ingest.stream(order)
+        keys = [key for key in order or netbox_ingest.collections
+                if key in netbox_ingest.collections]
+        if fingerprints is not None:
+            records = fingerprints.stream(records)
+        # Files of unchanged collections are left as they are, which a
+        # diff can not tell
+        skip, skipped = None, set()
+        if fingerprints is not None and args.output_dir and previous is None:
+            skip = skip_unchanged(args, fingerprints, skipped)
+        if args.output == 'netbox':
+            if skip is not None:
+                records = skip_collections(records, skip)
+        else:
+            records = NetBoxToAnsible(stats=stats).stream(records, skip)
+            if previous is not None:
+                records = diff_stream(previous, records, keys)
+        with stats.measure('total', 'ingest'):
+            if args.output_dir:
+                write_split(records, args.output_dir, args.format, keys,
+                            skipped)
+            else:
+                write_ndjson(records)
+        save_state(state)
+        save_manifest(fingerprints)
+        report_stats(args, stats)
+        return
+
+    with stats.measure('total', 'ingest'):
+        netbox_data = netbox_ingest.data()
+    save_state(state)
+    if fingerprints is not None:
+        for key, records in netbox_data.items():
+            for record in records:
+                fingerprints.add(key, record)
+        save_manifest(fingerprints)
 
     if args.output == 'ansible':
-        netbox_ansible = NetBoxToAnsible(netbox_data)
-        netbox_ansible_data = netbox_ansible.data()
+        netbox_ansible = NetBoxToAnsible(
+            netbox_data, stats=stats, workers=args.translate_workers)
+        with stats.measure('total', 'translate'):
+            netbox_ansible_data = netbox_ansible.data()
+            if previous is not None:
+                netbox_ansible_data = diff(previous, netbox_ansible_data)
 
     if args.format == 'json':
         if args.output == 'netbox':
@@ -62,9 +407,11 @@ def main():
             print(json.dumps(netbox_ansible_data))
     else:
         if args.output == 'netbox':
-            print(yaml.dump(netbox_data))
+            write_yaml(netbox_data)
         else:
-            print(yaml.dump(netbox_ansible_data))
+            write_yaml(netbox_ansible_data)
+
+    report_stats(args, stats)
 
 
 if __name__ == '__main__':
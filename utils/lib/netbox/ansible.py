@@ -1,15 +1,394 @@
 """lib/netbox/ansible.py"""
 
+import gc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby, repeat
+from operator import itemgetter
+from lib.netbox.mapping import (
+    Field, Reference, compile_mapping, dependency_order, lookups, references,
+    sources)
+from lib.netbox.stats import Stats
+
+# Translation of every collection, in output order. Each entry is a Field,
+# or just the name of a field copied as is.
+MAPPINGS = {
+    # DCIM
+    'netbox_regions': (
+        'name',
+        Field('parent_region', 'parent', Reference('netbox_regions')),
+    ),
+    'netbox_sites': (
+        'asn', 'comments', 'contact_name', 'contact_phone', 'contact_email',
+        'custom_fields', 'description', 'facility', 'latitude', 'longitude',
+        'name', 'physical_address', 'shipping_address', 'slug',
+        Field('region', extract=Reference('netbox_regions')),
+        Field('status', extract='label'),
+        'tags',
+        Field('tenant', extract=Reference('netbox_tenants')),
+        'time_zone',
+    ),
+    'netbox_rack_roles': ('name', 'color'),
+    'netbox_rack_groups': (
+        'name',
+        Field('site', extract=Reference('netbox_sites')),
+    ),
+    'netbox_racks': (
+        'asset_tag', 'comments', 'custom_fields', 'desc_units', 'name',
+        'facility_id', 'outer_depth', 'outer_width',
+        Field('rack_group', 'group', Reference('netbox_rack_groups')),
+        Field('rack_role', 'role'),
+        'serial',
+        Field('site', extract=Reference('netbox_sites')),
+        Field('status', extract='label'),
+        'tags',
+        Field('tenant', extract=Reference('netbox_tenants')),
+        Field('type', extract='label'),
+        'u_height',
+        Field('width', extract='value'),
+        Field('outer_unit', optional=True),
+    ),
+    'netbox_manufacturers': ('name',),
+    'netbox_platforms': (
+        Field('manufacturer', extract=Reference('netbox_manufacturers')),
+        'name', 'napalm_driver', 'napalm_args',
+    ),
+    'netbox_device_types': (
+        'comments', 'custom_fields', 'is_full_depth',
+        Field('manufacturer', extract=Reference('netbox_manufacturers')),
+        'model', 'part_number', 'slug', 'tags', 'u_height',
+        Field('subdevice_role', extract='label', optional=True),
+    ),
+    'netbox_device_roles': ('name', 'color', 'vm_role'),
+    'netbox_devices': (
+        'name', 'platform', 'serial', 'asset_tag', 'position',
+        Field('status', extract='label'),
+        'comments', 'tags', 'custom_fields',
+        Field('cluster', extract=Reference('netbox_clusters'),
+              optional=True),
+        Field('device_role', extract=Reference('netbox_device_roles'),
+              optional=True),
+        Field('device_type',
+              extract=Reference('netbox_device_types', 'model'),
+              optional=True),
+        Field('face', extract='label', optional=True),
+        Field('rack', extract=Reference('netbox_racks'), optional=True),
+        Field('site', extract=Reference('netbox_sites'), optional=True),
+        Field('tenant', extract=Reference('netbox_tenants'),
+              optional=True),
+    ),
+    'netbox_device_interfaces': (
+        'description',
+        Field('device', extract=Reference('netbox_devices')),
+        'enabled',
+        # This is related to https://github.com/netbox-community/ansible_modules/issues/193
+        Field('type', ('type', 'form_factor'), 'label'),
+        'lag', 'mac_address', 'mgmt_only',
+        Field('mode', extract='label'),
+        'mtu', 'name', 'tagged_vlans', 'tags', 'untagged_vlan',
+    ),
+    'netbox_inventory_items': (
+        Field('device', extract=Reference('netbox_devices')),
+        'name', 'part_id',
+        Field('manufacturer', extract=Reference('netbox_manufacturers')),
+        'serial', 'asset_tag', 'description', 'tags',
+    ),
+    # Tenancy
+    'netbox_tenant_groups': ('name',),
+    'netbox_tenants': (
+        'description', 'comments', 'custom_fields', 'name', 'slug',
+        Field('tenant_group', 'group', Reference('netbox_tenant_groups')),
+        'tags',
+    ),
+    # IPAM
+    'netbox_ipam_roles': ('name', 'weight'),
+    'netbox_vlan_groups': (
+        'name',
+        Field('site', extract=Reference('netbox_sites')),
+    ),
+    'netbox_vlans': (
+        'name',
+        Field('site', extract=Reference('netbox_sites')),
+    ),
+    'netbox_vrfs': (
+        'name', 'rd', 'enforce_unique', 'description', 'tags',
+        'custom_fields',
+        Field('tenant', extract=Reference('netbox_tenants')),
+    ),
+    'netbox_rirs': ('name', 'is_private'),
+    'netbox_aggregates': (
+        'custom_fields', 'description', 'prefix',
+        Field('rir', extract=Reference('netbox_rirs')),
+        'tags',
+    ),
+    'netbox_prefixes': (
+        'custom_fields', 'description',
+        Field('family', extract='value'),
+        'is_pool', 'prefix',
+        Field('site', extract=Reference('netbox_sites')),
+        Field('status', extract='label'),
+        Field('prefix_role', 'role', Reference('netbox_ipam_roles')),
+        'tags',
+        Field('tenant', extract=Reference('netbox_tenants')),
+        'vlan',
+        Field('vrf', extract=Reference('netbox_vrfs')),
+    ),
+    'netbox_ip_addresses': (
+        'address', 'custom_fields', 'description',
+        Field('family', extract='value'),
+        # Only the interface name and its device or virtual machine
+        Field('interface', extract=(
+            'name',
+            Field('device', extract=Reference('netbox_devices'),
+                  optional=True),
+            Field('virtual_machine',
+                  extract=Reference('netbox_virtual_machines'),
+                  optional=True),
+        )),
+        Field('nat_inside', extract=('address', 'vrf')),
+        Field('status', extract='label'),
+        'tags',
+        Field('tenant', extract=Reference('netbox_tenants')),
+        Field('vrf', extract=Reference('netbox_vrfs')),
+        Field('role', extract='label', optional=True),
+    ),
+    # Virtualization
+    'netbox_cluster_groups': ('name',),
+    'netbox_cluster_types': ('name',),
+    'netbox_clusters': (
+        'comments', 'custom_fields', 'name',
+        Field('cluster_group', 'group', Reference('netbox_cluster_groups')),
+        Field('cluster_type', 'type', Reference('netbox_cluster_types')),
+        Field('site', extract=Reference('netbox_sites')),
+        'tags',
+    ),
+    'netbox_virtual_machines': (
+        'disk', 'memory', 'name',
+        Field('platform', extract=Reference('netbox_platforms')),
+        Field('site', extract=Reference('netbox_sites')),
+        'vcpus',
+        Field('status', extract='label'),
+        'tags', 'custom_fields',
+        Field('cluster', extract=Reference('netbox_clusters'),
+              optional=True),
+        Field('virtual_machine_role', 'role',
+              Reference('netbox_device_roles'), optional=True),
+        Field('tenant', extract=Reference('netbox_tenants'),
+              optional=True),
+    ),
+    'netbox_virtual_interfaces': (
+        'description', 'enabled', 'mac_address',
+        Field('mode', extract='label'),
+        'mtu', 'name', 'tagged_vlans', 'tags', 'untagged_vlan',
+        Field('virtual_machine',
+              extract=Reference('netbox_virtual_machines')),
+    ),
+    # Circuits
+    'netbox_providers': (
+        'name', 'slug', 'asn', 'account', 'portal_url', 'noc_contact',
+        'admin_contact', 'comments', 'tags', 'custom_fields',
+    ),
+    'netbox_circuit_types': ('name', 'slug'),
+    'netbox_circuits': (
+        'cid',
+        Field('provider', extract=Reference('netbox_providers')),
+        Field('circuit_type', 'type', Reference('netbox_circuit_types')),
+        Field('status', extract='label'),
+        Field('tenant', extract=Reference('netbox_tenants')),
+        'install_date', 'commit_rate', 'description', 'comments', 'tags',
+        'custom_fields',
+    ),
+    # Secrets
+    'netbox_secret_roles': ('name', 'slug'),
+    'netbox_secrets': (
+        Field('device', extract=Reference('netbox_devices')),
+        Field('secret_role', 'role', Reference('netbox_secret_roles')),
+        'name', 'tags', 'custom_fields',
+    ),
+    # Extras
+    'netbox_config_contexts': (
+        'name', 'weight', 'description', 'is_active',
+        Field('regions', extract=Reference('netbox_regions', many=True)),
+        Field('sites', extract=Reference('netbox_sites', many=True)),
+        Field('roles',
+              extract=Reference('netbox_device_roles', many=True)),
+        Field('platforms',
+              extract=Reference('netbox_platforms', many=True)),
+        Field('cluster_groups',
+              extract=Reference('netbox_cluster_groups', many=True)),
+        Field('clusters', extract=Reference('netbox_clusters', many=True)),
+        Field('tenant_groups',
+              extract=Reference('netbox_tenant_groups', many=True)),
+        Field('tenants', extract=Reference('netbox_tenants', many=True)),
+        'tags', 'data',
+    ),
+}
+
+# Fields of the ingested NetBox objects read by each translation.
+# NetBoxIngest can use it to only keep these fields when the data is only
+# going to be translated.
+FIELDS = {key: sources(mapping) for key, mapping in MAPPINGS.items()}
+
+# Fields of the ingested NetBox objects which reference other collections.
+# A sparse ingest keeps them as bare ids, resolved by NetBoxToAnsible.name().
+REFERENCES = {key: references(mapping) for key, mapping in MAPPINGS.items()
+              if references(mapping)}
+
+# Collections whose FIELDS are all part of NetBox's brief representation
+BRIEF = {
+    'netbox_circuit_types',
+    'netbox_cluster_groups',
+    'netbox_cluster_types',
+    'netbox_manufacturers',
+    'netbox_secret_roles',
+    'netbox_tenant_groups',
+}
+
+# Translation function of every collection, compiled from its mapping
+TRANSLATIONS = {key: compile_mapping(mapping)
+                for key, mapping in MAPPINGS.items()}
+
+# Id to name tables needed to resolve the references of each collection
+LOOKUPS = {key: lookups(mapping) for key, mapping in MAPPINGS.items()}
+
+# Collections referenced by each collection
+DEPENDENCIES = {key: {lookup[0] for lookup in LOOKUPS[key]}
+                for key in MAPPINGS}
+
+# Collection order in which every reference can be resolved from records
+# already streamed, but self references
+STREAM_ORDER = dependency_order(DEPENDENCIES)
+
+# Records per chunk of a collection sent to a translation worker process
+CHUNK_SIZE = 5000
+
+
+@contextmanager
+def gc_paused():
+    """Pause the cyclic garbage collector
+
+    Translation allocates millions of acyclic dicts, each allocation burst
+    otherwise triggering collections which traverse the whole snapshot.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# Records of the collections a translation worker process shards and the
+# id to name tables they reference, handed once when it starts rather than
+# with every chunk. Forked workers inherit them without any copy.
+WORKER_DATA = {}
+
+
+def init_worker(netbox_data, tables):
+    """Set up a translation worker process
+
+    Workers do not need the cyclic garbage collector.
+    """
+    gc.disable()
+    WORKER_DATA.update(netbox_data=netbox_data, tables=tables)
+
+
+def translate_chunk(key, start):
+    """Returns a chunk of translated records of a collection
+
+    Run by translation worker processes, which are only sent where the
+    chunk starts and resolve references through the tables they were
+    started with.
+    """
+    netbox_ansible = NetBoxToAnsible({})
+    netbox_ansible.tables = WORKER_DATA['tables']
+    records = WORKER_DATA['netbox_data'][key][start:start + CHUNK_SIZE]
+
+    return netbox_ansible.translated(key, records)
+
 
 class NetBoxToAnsible:
-    """Main NetBox to Ansible class"""
+    """Main NetBox to Ansible class
+
+    Translations read the ingested records without modifying them, so the
+    same NetBox data can be translated any number of times.
+    """
 
-    def __init__(self, netbox_data):
-        self.netbox_data = netbox_data
+    def __init__(self, netbox_data=None, stats=None, workers=1):
+        self.netbox_data = netbox_data if netbox_data is not None else {}
         self.ansible_data = {}
+        self.stats = stats if stats is not None else Stats()
+        # Id to name tables of referenced collections
+        self.tables = {}
+        # Large collections are translated in chunks by worker processes
+        self.workers = workers
+        self.executor = None
 
     def data(self):
         """Translate NetBox data to Ansible constructs"""
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_worker,
+                initargs=self.worker_data())
+        try:
+            with gc_paused():
+                self.translations()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+        return self.ansible_data
+
+    def stream(self, records, skip=None):
+        """Yields (collection, record) pairs translated from NetBox ones
+
+        Records are translated as they arrive and only the id to name
+        tables of referenced collections are kept, filled from the records
+        going through. References to records which have not been streamed
+        yet are not resolved, so collections should come in STREAM_ORDER.
+        Collections referencing themselves are buffered until complete.
+
+        Collections can be skipped, each one being buffered until complete
+        to then decide whether skip(key) is true. Records of skipped
+        collections still fill the id to name tables.
+        """
+        attributes = {}
+        for key, attribute in set().union(*LOOKUPS.values()):
+            self.tables[(key, attribute)] = {}
+            attributes.setdefault(key, []).append(attribute)
+
+        for key, pairs in groupby(records, itemgetter(0)):
+            if key not in TRANSLATIONS:
+                continue
+            collection = map(itemgetter(1), pairs)
+            if skip is not None or key in DEPENDENCIES[key]:
+                collection = list(collection)
+                for record in collection:
+                    self.remember(key, record, attributes)
+                if skip is not None and skip(key):
+                    continue
+            yield from self.translated_stream(key, collection, attributes)
+
+    def translated_stream(self, key, records, attributes):
+        """Yields the translated records of a collection, measuring it"""
+        translation, name = TRANSLATIONS[key], self.name
+        with self.stats.measure('translate', key) as step:
+            for record in records:
+                self.remember(key, record, attributes)
+                step['objects'] += 1
+                yield key, {'data': translation(record['data'], name),
+                            'state': record['state']}
+
+    def remember(self, key, record, attributes):
+        """Add a record to the id to name tables of its collection"""
+        data = record['data']
+        for attribute in attributes.get(key, ()):
+            self.tables[(key, attribute)][data['id']] = data[attribute]
+
+    def translations(self):
+        """Translate every collection"""
         # DCIM
         self.dcim_translations()
         # Tenancy
@@ -25,670 +404,120 @@ class NetBoxToAnsible:
         # Extras
         self.extras_translations()
 
-        return self.ansible_data
+    def name(self, key, value, attribute='name'):
+        """Returns the name of an object referenced from another collection
+
+        References are either nested objects, as returned by NetBox, or the
+        bare ids kept by a sparse ingest. Ids are resolved through an id to
+        name table of the referenced collection, built once on first use.
+        """
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            return value[attribute]
+
+        return self.table(key, attribute).get(value)
+
+    def table(self, key, attribute='name'):
+        """Returns the id to name table of a collection"""
+        table = self.tables.get((key, attribute))
+        if table is None:
+            table = {record['data']['id']: record['data'][attribute]
+                     for record in self.netbox_data[key]}
+            self.tables[(key, attribute)] = table
+
+        return table
+
+    def worker_data(self):
+        """Returns the collections to shard and the tables they reference"""
+        sharded = {key: records for key, records in self.netbox_data.items()
+                   if key in LOOKUPS and len(records) > CHUNK_SIZE}
+        tables = {lookup: self.table(*lookup)
+                  for key in sharded for lookup in LOOKUPS[key]}
+
+        return sharded, tables
+
+    def translate(self, key):
+        """Translate every record of a single collection, measuring it"""
+        records = self.netbox_data[key]
+        with self.stats.measure('translate', key) as step:
+            if self.executor is None or len(records) <= CHUNK_SIZE:
+                self.ansible_data[key] = self.translated(key, records)
+            else:
+                self.ansible_data[key] = self.sharded(key, records)
+            step['objects'] = len(self.ansible_data[key])
+
+    def translated(self, key, records):
+        """Returns the translated records of a collection"""
+        translation, name = TRANSLATIONS[key], self.name
+
+        return [{'data': translation(record['data'], name),
+                 'state': record['state']}
+                for record in records]
+
+    def sharded(self, key, records):
+        """Returns the records of a collection translated by the workers
+
+        Chunks are translated concurrently and merged back in order.
+        """
+        translated = []
+        for chunk in self.executor.map(
+                translate_chunk, repeat(key),
+                range(0, len(records), CHUNK_SIZE)):
+            translated.extend(chunk)
+
+        return translated
 
     def dcim_translations(self):
         """Translate DCIM related info"""
-        self.regions()
-        self.sites()
-        self.rack_roles()
-        self.rack_groups()
-        self.racks()
-        self.manufacturers()
-        self.platforms()
-        self.device_types()
-        self.device_roles()
-        self.devices()
-        self.interfaces()
-        self.inventory_items()
+        self.translate('netbox_regions')
+        self.translate('netbox_sites')
+        self.translate('netbox_rack_roles')
+        self.translate('netbox_rack_groups')
+        self.translate('netbox_racks')
+        self.translate('netbox_manufacturers')
+        self.translate('netbox_platforms')
+        self.translate('netbox_device_types')
+        self.translate('netbox_device_roles')
+        self.translate('netbox_devices')
+        self.translate('netbox_device_interfaces')
+        self.translate('netbox_inventory_items')
 
     def tenancy_translations(self):
         """Translate tenancy related info"""
-        self.tenant_groups()
-        self.tenants()
+        self.translate('netbox_tenant_groups')
+        self.translate('netbox_tenants')
 
     def ipam_translations(self):
         """Translate IPAM related info"""
-        self.roles()
-        self.vlan_groups()
-        self.vlans()
-        self.vrfs()
-        self.rirs()
-        self.aggs()
-        self.prefixes()
-        self.ip_addresses()
+        self.translate('netbox_ipam_roles')
+        self.translate('netbox_vlan_groups')
+        self.translate('netbox_vlans')
+        self.translate('netbox_vrfs')
+        self.translate('netbox_rirs')
+        self.translate('netbox_aggregates')
+        self.translate('netbox_prefixes')
+        self.translate('netbox_ip_addresses')
 
     def virtualization_translations(self):
         """Translate virtualization related info"""
-        self.cluster_groups()
-        self.cluster_types()
-        self.clusters()
-        self.virtual_machines()
-        self.virtual_interfaces()
+        self.translate('netbox_cluster_groups')
+        self.translate('netbox_cluster_types')
+        self.translate('netbox_clusters')
+        self.translate('netbox_virtual_machines')
+        self.translate('netbox_virtual_interfaces')
 
     def circuits_translations(self):
         """Translate circuit related info"""
-        # self.providers()
-        # self.circuit_types()
-        # self.circuits()
+        self.translate('netbox_providers')
+        self.translate('netbox_circuit_types')
+        self.translate('netbox_circuits')
 
     def extras_translations(self):
         """Translate extras related info"""
-        # self.config_contexts()
+        self.translate('netbox_config_contexts')
 
     def secrets_translations(self):
         """Translate secrets related info"""
-        # self.secret_roles()
-        # self.secrets()
-
-    def roles(self):
-        """Extract NetBox roles"""
-        netbox_ipam_roles = []
-        for role in self.netbox_data['netbox_ipam_roles']:
-            data = role['data']
-            role_info = {
-                'data': {'name': data['name'], 'weight': data['weight']},
-                'state': role['state']}
-            netbox_ipam_roles.append(role_info)
-
-        self.ansible_data['netbox_ipam_roles'] = netbox_ipam_roles
-
-    def vlan_groups(self):
-        """Extract NetBox VLAN groups"""
-        netbox_vlan_groups = []
-        for group in self.netbox_data['netbox_vlan_groups']:
-            data = group['data']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                data['site'] = data['site']['name']
-            group_info = {
-                'data': {'name': data['name'], 'site': data['site']},
-                'state': group['state']}
-            netbox_vlan_groups.append(group_info)
-
-        self.ansible_data['netbox_vlan_groups'] = netbox_vlan_groups
-
-    def vlans(self):
-        """Extract NetBox VLANs"""
-        netbox_vlans = []
-        for vlan in self.netbox_data['netbox_vlans']:
-            data = vlan['data']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                data['site'] = data['site']['name']
-            vlan_info = {
-                'data': {'name': data['name'], 'site': data['site']},
-                'state': vlan['state']}
-            netbox_vlans.append(vlan_info)
-
-        self.ansible_data['netbox_vlans'] = netbox_vlans
-
-    def vrfs(self):
-        """Extract NetBox VRFs"""
-        netbox_vrfs = []
-        for vrf in self.netbox_data['netbox_vrfs']:
-            data = vrf['data']
-            # Update tenant with name only if defined
-            if data['tenant'] is not None:
-                data['tenant'] = data['tenant']['name']
-            vrf_info = {
-                'data': {'name': data['name'], 'rd': data['rd'],
-                         'enforce_unique': data['enforce_unique'],
-                         'description': data['description'],
-                         'tags': data['tags'],
-                         'custom_fields': data['custom_fields'],
-                         'tenant': data['tenant']},
-                'state': vrf['state']}
-            netbox_vrfs.append(vrf_info)
-
-        self.ansible_data['netbox_vrfs'] = netbox_vrfs
-
-    def rirs(self):
-        """Extract NetBox RIRs"""
-        netbox_rirs = []
-        for rir in self.netbox_data['netbox_rirs']:
-            data = rir['data']
-            rir_info = {
-                'data': {'name': data['name'],
-                         'is_private': data['is_private']},
-                'state': rir['state']}
-            netbox_rirs.append(rir_info)
-
-        self.ansible_data['netbox_rirs'] = netbox_rirs
-
-    def aggs(self):
-        """Extract NetBox aggregates"""
-        netbox_aggregates = []
-        for agg in self.netbox_data['netbox_aggregates']:
-            data = agg['data']
-            if data['rir'] is not None:
-                data['rir'] = data['rir']['name']
-            agg_info = {
-                'data': {'custom_fields': data['custom_fields'],
-                         'description': data['description'],
-                         'prefix': data['prefix'],
-                         'rir': data['rir'],
-                         'tags': data['tags']},
-                'state': agg['state']}
-            netbox_aggregates.append(agg_info)
-
-        self.ansible_data['netbox_aggregates'] = netbox_aggregates
-
-    def prefixes(self):
-        """Extract NetBox prefixes"""
-        netbox_prefixes = []
-        for prefix in self.netbox_data['netbox_prefixes']:
-            data = prefix['data']
-            # Update role with name only if defined
-            if data['role'] is not None:
-                data['role'] = data['role']['name']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                data['site'] = data['site']['name']
-            # Update tenant with name only if defined
-            if data['tenant'] is not None:
-                data['tenant'] = data['tenant']['name']
-            # Update vrf with name only if defined
-            if data['vrf'] is not None:
-                data['vrf'] = data['vrf']['name']
-            prefix_info = {
-                'data': {'custom_fields': data['custom_fields'],
-                         'description': data['description'],
-                         'family': data['family']['value'],
-                         'is_pool': data['is_pool'],
-                         'prefix': data['prefix'],
-                         'site': data['site'],
-                         'status': data['status']['label'],
-                         'prefix_role': data['role'],
-                         'tags': data['tags'],
-                         'tenant': data['tenant'],
-                         'vlan': data['vlan'],
-                         'vrf': data['vrf']
-                         }, 'state': prefix['state']}
-            netbox_prefixes.append(prefix_info)
-
-        self.ansible_data['netbox_prefixes'] = netbox_prefixes
-
-    def ip_addresses(self):
-        """Extract NetBox IP addresses"""
-        netbox_ip_addresses = []
-        for address in self.netbox_data['netbox_ip_addresses']:
-            data = address['data']
-            # Update interface with name and device
-            if data['interface'] is not None:
-                interface = data['interface']
-                data['interface'] = {
-                    'name': interface['name']
-                }
-                try:
-                    data['interface']['device'] = interface['device']['name']
-                except TypeError:
-                    pass
-                if interface['virtual_machine'] is not None:
-                    data['interface']['virtual_machine'] = interface[
-                        'virtual_machine']['name']
-            # Update nat_inside
-            if data['nat_inside'] is not None:
-                data['nat_inside'] = {
-                    'address': data['nat_inside']['address'],
-                    'vrf': data['nat_inside']['vrf']
-                }
-            # Update tenant with name only if defined
-            if data['tenant'] is not None:
-                data['tenant'] = data['tenant']['name']
-            # Update vrf with name only if defined
-            if data['vrf'] is not None:
-                data['vrf'] = data['vrf']['name']
-            address_info = {'data': {'address': data['address'],
-                                     'custom_fields': data['custom_fields'],
-                                     'description': data['description'],
-                                     'family': data['family']['value'],
-                                     'interface': data['interface'],
-                                     'nat_inside': data['nat_inside'],
-                                     'status': data['status']['label'],
-                                     'tags': data['tags'],
-                                     'tenant': data['tenant'],
-                                     'vrf': data['vrf']},
-                            'state': address['state']}
-
-            if data['role'] is not None:
-                address_info['data']['role'] = data['role']['label']
-
-            netbox_ip_addresses.append(address_info)
-
-        self.ansible_data['netbox_ip_addresses'] = netbox_ip_addresses
-
-    def tenant_groups(self):
-        """Extract NetBox tenant groups"""
-        netbox_tenant_groups = []
-        for group in self.netbox_data['netbox_tenant_groups']:
-            data = group['data']
-            group_info = {
-                'data': {'name': data['name']}, 'state': group['state']}
-            netbox_tenant_groups.append(group_info)
-
-        self.ansible_data['netbox_tenant_groups'] = netbox_tenant_groups
-
-    def tenants(self):
-        """Extract NetBox tenant groups"""
-        netbox_tenants = []
-        for tenant in self.netbox_data['netbox_tenants']:
-            data = tenant['data']
-            # Update group with name only if defined
-            if data['group'] is not None:
-                data['group'] = data['group']['name']
-            tenant_info = {
-                'data': {'description': data['description'],
-                         'comments': data['comments'],
-                         'custom_fields': data['custom_fields'],
-                         'name': data['name'],
-                         'slug': data['slug'],
-                         'tenant_group': data['group'],
-                         'tags': data['tags']},
-                'state': tenant['state']}
-            netbox_tenants.append(tenant_info)
-
-        self.ansible_data['netbox_tenants'] = netbox_tenants
-
-    def regions(self):
-        """Extract NetBox regions"""
-        netbox_regions = []
-        for region in self.netbox_data['netbox_regions']:
-            data = region['data']
-            # Update parent region with name only if defined
-            if data['parent'] is not None:
-                data['parent'] = data['parent']['name']
-            region_info = {
-                'data': {'name': data['name'],
-                         'parent_region': data['parent']},
-                'state': region['state']}
-            netbox_regions.append(region_info)
-
-        self.ansible_data['netbox_regions'] = netbox_regions
-
-    def sites(self):
-        """Extract NetBox sites"""
-        netbox_sites = []
-        for site in self.netbox_data['netbox_sites']:
-            data = site['data']
-            # Update region with name only if defined
-            if data['region'] is not None:
-                data['region'] = data['region']['name']
-            # Update tenant with name only if defined
-            if data['tenant'] is not None:
-                data['tenant'] = data['tenant']['name']
-            site_info = {
-                'data': {'asn': data['asn'],
-                         'comments': data['comments'],
-                         'contact_name': data['contact_name'],
-                         'contact_phone': data['contact_phone'],
-                         'contact_email': data['contact_email'],
-                         'custom_fields': data['custom_fields'],
-                         'description': data['description'],
-                         'facility': data['facility'],
-                         'latitude': data['latitude'],
-                         'longitude': data['longitude'],
-                         'name': data['name'],
-                         'physical_address': data['physical_address'],
-                         'shipping_address': data['shipping_address'],
-                         'slug': data['slug'],
-                         'region': data['region'],
-                         'status': data['status']['label'],
-                         'tags': data['tags'],
-                         'tenant': data['tenant'],
-                         'time_zone': data['time_zone'],
-                         }, 'state': site['state']}
-            netbox_sites.append(site_info)
-
-        self.ansible_data['netbox_sites'] = netbox_sites
-
-    def rack_roles(self):
-        """Extract NetBox rack roles"""
-        netbox_rack_roles = []
-        for role in self.netbox_data['netbox_rack_roles']:
-            data = role['data']
-            role_info = {'data': {'name': data['name'],
-                                  'color': data['color']},
-                         'state': role['state']}
-            netbox_rack_roles.append(role_info)
-
-        self.ansible_data['netbox_rack_roles'] = netbox_rack_roles
-
-    def rack_groups(self):
-        """Extract NetBox rack groups"""
-        netbox_rack_groups = []
-        for group in self.netbox_data['netbox_rack_groups']:
-            data = group['data']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                data['site'] = data['site']['name']
-            group_info = {
-                'data': {'name': data['name'], 'site': data['site']},
-                'state': group['state']}
-            netbox_rack_groups.append(group_info)
-
-        self.ansible_data['netbox_rack_groups'] = netbox_rack_groups
-
-    def racks(self):
-        """Extract NetBox racks"""
-        netbox_racks = []
-        for rack in self.netbox_data['netbox_racks']:
-            data = rack['data']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                data['site'] = data['site']['name']
-            # Update rack group with name only if defined
-            if data['group'] is not None:
-                data['group'] = data['group']['name']
-            # Update tenant with name only if defined
-            if data['tenant'] is not None:
-                data['tenant'] = data['tenant']['name']
-            # Update type with label only if defined
-            if data['type'] is not None:
-                data['type'] = data['type']['label']
-            # Update width with value only if defined
-            if data['width'] is not None:
-                data['width'] = data['width']['value']
-            rack_info = {
-                'data': {'asset_tag': data['asset_tag'],
-                         'comments': data['comments'],
-                         'custom_fields': data['custom_fields'],
-                         'desc_units': data['desc_units'],
-                         'name': data['name'],
-                         'facility_id': data['facility_id'],
-                         'outer_depth': data['outer_depth'],
-                         'outer_width': data['outer_width'],
-                         'rack_group': data['group'],
-                         'rack_role': data['role'],
-                         'serial': data['serial'],
-                         'site': data['site'],
-                         'status': data['status']['label'],
-                         'tags': data['tags'],
-                         'tenant': data['tenant'],
-                         'type': data['type'],
-                         'u_height': data['u_height'],
-                         'width': data['width']
-                         }, 'state': rack['state']}
-
-            if data['outer_unit'] is not None:
-                rack_info['data']['outer_unit'] = data['outer_unit']
-
-            netbox_racks.append(rack_info)
-
-        self.ansible_data['netbox_racks'] = netbox_racks
-
-    def manufacturers(self):
-        """Extract NetBox manufacturers"""
-        netbox_manufacturers = []
-        for manufacturer in self.netbox_data['netbox_manufacturers']:
-            data = manufacturer['data']
-            manufacturer_info = {'data': {'name': data['name']},
-                                 'state': manufacturer['state']}
-            netbox_manufacturers.append(manufacturer_info)
-
-        self.ansible_data['netbox_manufacturers'] = netbox_manufacturers
-
-    def platforms(self):
-        """Extract NetBox platforms"""
-        netbox_platforms = []
-        for platform in self.netbox_data['netbox_platforms']:
-            data = platform['data']
-            # Update manufacturer with name only if defined
-            if data['manufacturer'] is not None:
-                data['manufacturer'] = data['manufacturer']['name']
-            platform_info = {'data': {'manufacturer': data['manufacturer'],
-                                      'name': data['name'],
-                                      'napalm_driver': data['napalm_driver'],
-                                      'napalm_args': data['napalm_args']},
-                             'state': platform['state']}
-            netbox_platforms.append(platform_info)
-
-        self.ansible_data['netbox_platforms'] = netbox_platforms
-
-    def device_types(self):
-        """Extract NetBox device types"""
-        netbox_device_types = []
-        for device_type in self.netbox_data['netbox_device_types']:
-            data = device_type['data']
-            # Update manufacturer with name only if defined
-            if data['manufacturer'] is not None:
-                data['manufacturer'] = data['manufacturer']['name']
-            device_type_info = {
-                'data': {
-                    'comments': data['comments'],
-                    'custom_fields': data['custom_fields'],
-                    'is_full_depth': data['is_full_depth'],
-                    'manufacturer': data['manufacturer'],
-                    'model': data['model'],
-                    'part_number': data['part_number'],
-                    'slug': data['slug'],
-                    'tags': data['tags'],
-                    'u_height': data['u_height']
-                },
-                'state': device_type['state']}
-
-            if data['subdevice_role'] is not None:
-                device_type_info['data']['subdevice_role'] = data[
-                    'subdevice_role']['label']
-
-            netbox_device_types.append(device_type_info)
-
-        self.ansible_data['netbox_device_types'] = netbox_device_types
-
-    def device_roles(self):
-        """Extract NetBox device roles"""
-        netbox_device_roles = []
-        for role in self.netbox_data['netbox_device_roles']:
-            data = role['data']
-            role_info = {'data': {
-                'name': data['name'],
-                'color': data['color'],
-                'vm_role': data['vm_role']
-            }, 'state': role['state']}
-            netbox_device_roles.append(role_info)
-
-        self.ansible_data['netbox_device_roles'] = netbox_device_roles
-
-    def devices(self):
-        """Extract NetBox devices"""
-        netbox_devices = []
-        for device in self.netbox_data['netbox_devices']:
-            data = device['data']
-            device_info = {'data': {
-                'name': data['name'],
-                'platform': data['platform'],
-                'serial': data['serial'],
-                'asset_tag': data['asset_tag'],
-                'position': data['position'],
-                'status': data['status']['label'],
-                'comments': data['comments'],
-                'tags': data['tags'],
-                'custom_fields': data['custom_fields']
-            }, 'state': device['state']}
-
-            # Update cluster with name only if defined
-            if data['cluster'] is not None:
-                device_info['data']['cluster'] = data['cluster']['name']
-            # Update device_role with name only if defined
-            if data['device_role'] is not None:
-                device_info['data']['device_role'] = data['device_role'][
-                    'name']
-            # Update device_type with name only if defined
-            if data['device_type'] is not None:
-                device_info['data']['device_type'] = data['device_type'][
-                    'model']
-            # Update face with label only if defined
-            if data['face'] is not None:
-                device_info['data']['face'] = data['face']['label']
-            # Update rack with name only if defined
-            if data['rack'] is not None:
-                device_info['data']['rack'] = data['rack']['name']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                device_info['data']['site'] = data['site']['name']
-            # Update tenant with name only if defined
-            if data['tenant'] is not None:
-                device_info['data']['tenant'] = data['tenant']['name']
-
-            netbox_devices.append(device_info)
-
-        self.ansible_data['netbox_devices'] = netbox_devices
-
-    def interfaces(self):
-        """Extract NetBox interfaces"""
-        netbox_device_interfaces = []
-        for interface in self.netbox_data['netbox_device_interfaces']:
-            data = interface['data']
-
-            # This is related to https://github.com/netbox-community/ansible_modules/issues/193
-            form_factor = data.get('form_factor')
-            int_type = data.get('type')
-            if int_type is not None:
-                data['type'] = data['type']['label']
-            elif form_factor is not None:
-                data['type'] = data['form_factor']['label']
-
-            if data['mode'] is not None:
-                data['mode'] = data['mode']['label']
-            interface_info = {'data': {
-                'description': data['description'],
-                'device': data['device']['name'],
-                'enabled': data['enabled'],
-                'type': data['type'],
-                'lag': data['lag'],
-                'mac_address': data['mac_address'],
-                'mgmt_only': data['mgmt_only'],
-                'mode': data['mode'],
-                'mtu': data['mtu'],
-                'name': data['name'],
-                'tagged_vlans': data['tagged_vlans'],
-                'tags': data['tags'],
-                'untagged_vlan': data['untagged_vlan']
-            }, 'state': interface['state']}
-            netbox_device_interfaces.append(interface_info)
-
-        self.ansible_data[
-            'netbox_device_interfaces'] = netbox_device_interfaces
-
-    def inventory_items(self):
-        """Extract NetBox inventory items"""
-        netbox_inventory_items = []
-        for item in self.netbox_data['netbox_inventory_items']:
-            data = item['data']
-            if data['manufacturer'] is not None:
-                data['manufacturer'] = data['manufacturer']['name']
-            item_info = {
-                'data': {'device': data['device']['name'],
-                         'name': data['name'],
-                         'part_id': data['part_id'],
-                         'manufacturer': data['manufacturer'],
-                         'serial': data['serial'],
-                         'asset_tag': data['asset_tag'],
-                         'description': data['description'],
-                         'tags': data['tags']
-                         }, 'state': item['state']}
-            netbox_inventory_items.append(item_info)
-
-        self.ansible_data['netbox_inventory_items'] = netbox_inventory_items
-
-    def cluster_groups(self):
-        """Extract NetBox cluster groups"""
-        netbox_cluster_groups = []
-        for group in self.netbox_data['netbox_cluster_groups']:
-            data = group['data']
-            group_info = {'data': {'name': data['name']},
-                          'state': group['state']}
-            netbox_cluster_groups.append(group_info)
-
-        self.ansible_data['netbox_cluster_groups'] = netbox_cluster_groups
-
-    def cluster_types(self):
-        """Extract NetBox cluster types"""
-        netbox_cluster_types = []
-        for cluster_type in self.netbox_data['netbox_cluster_types']:
-            data = cluster_type['data']
-            cluster_type_info = {'data': {'name': data['name']},
-                                 'state': cluster_type['state']}
-            netbox_cluster_types.append(cluster_type_info)
-
-        self.ansible_data['netbox_cluster_types'] = netbox_cluster_types
-
-    def clusters(self):
-        """Extract NetBox clusters"""
-        netbox_clusters = []
-        for cluster in self.netbox_data['netbox_clusters']:
-            data = cluster['data']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                data['site'] = data['site']['name']
-            cluster_info = {'data': {'comments': data['comments'],
-                                     'custom_fields': data['custom_fields'],
-                                     'name': data['name'],
-                                     'cluster_group': data['group']['name'],
-                                     'cluster_type': data['type']['name'],
-                                     'site': data['site'],
-                                     'tags': data['tags']},
-                            'state': cluster['state']}
-            netbox_clusters.append(cluster_info)
-
-        self.ansible_data['netbox_clusters'] = netbox_clusters
-
-    def virtual_machines(self):
-        """Extract NetBox virtual machines"""
-        netbox_virtual_machines = []
-        for virtual_machine in self.netbox_data['netbox_virtual_machines']:
-            data = virtual_machine['data']
-            vm_info = {'data': {'disk': data['disk'],
-                                'memory': data['memory'],
-                                'name': data['name'],
-                                'platform': data['platform']['name'],
-                                'site': data['site'],
-                                'vcpus': data['vcpus'],
-                                'status': data['status']['label'],
-                                'tags': data['tags'],
-                                'custom_fields': data['custom_fields']
-                                },
-                       'state': virtual_machine['state']}
-
-            # Update cluster with name only if defined
-            if data['cluster'] is not None:
-                vm_info['data']['cluster'] = data['cluster']['name']
-            # Update virtual_machine_role with name only if defined
-            if data['role'] is not None:
-                vm_info['data']['virtual_machine_role'] = data['role']['name']
-            # Update site with name only if defined
-            if data['site'] is not None:
-                vm_info['data']['site'] = data['site']['name']
-            # Update tenant with name only if defined
-            if data['tenant'] is not None:
-                vm_info['data']['tenant'] = data['tenant']['name']
-
-            netbox_virtual_machines.append(vm_info)
-
-        self.ansible_data['netbox_virtual_machines'] = netbox_virtual_machines
-
-    def virtual_interfaces(self):
-        """Extract NetBox virtual interfaces"""
-        netbox_virtual_interfaces = []
-        for interface in self.netbox_data['netbox_virtual_interfaces']:
-            data = interface['data']
-            if data['form_factor'] is not None:
-                data['form_factor'] = data['form_factor']['label']
-            if data['mode'] is not None:
-                data['mode'] = data['mode']['label']
-            interface_info = {'data': {
-                'description': data['description'],
-                'enabled': data['enabled'],
-                'mac_address': data['mac_address'],
-                'mode': data['mode'],
-                'mtu': data['mtu'],
-                'name': data['name'],
-                'tagged_vlans': data['tagged_vlans'],
-                'tags': data['tags'],
-                'untagged_vlan': data['untagged_vlan'],
-                'virtual_machine': data['virtual_machine']['name']
-            }, 'state': interface['state']}
-            netbox_virtual_interfaces.append(interface_info)
-
-        self.ansible_data[
-            'netbox_virtual_interfaces'] = netbox_virtual_interfaces
+        self.translate('netbox_secret_roles')
+        self.translate('netbox_secrets')
@@ -0,0 +1,154 @@
+"""lib/netbox/apply.py"""
+
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from lib.netbox.ingest import COLLECTIONS as ENDPOINTS
+from lib.netbox.mapping import dependency_levels
+from lib.netbox.paginator import Paginator
+from lib.netbox.plan import COLLECTIONS, NetBoxPlan, answered, dependencies
+from lib.netbox.stats import Stats, text_table
+
+# Levels of collections in which every reference can be resolved from
+# objects written by previous levels, but self references. Collections of
+# a level do not reference each other.
+APPLY_LEVELS = dependency_levels(
+    {key: dependencies(key) for key in COLLECTIONS})
+
+
+def plan_summary(plan):
+    """Returns the number of changes planned to every collection"""
+    return {key: dict({action: len(changes[action])
+                       for action in ('create', 'update', 'delete')},
+                      noop=changes['noop'])
+            for key, changes in plan.items()}
+
+
+def plan_table(plan):
+    """Returns the number of changes planned as a text table"""
+    header = ('collection', 'create', 'update', 'delete', 'noop')
+    rows = [(key,) + tuple(str(len(changes[action]))
+                           for action in ('create', 'update', 'delete')) +
+            (str(changes['noop']),)
+            for key, changes in plan.items()]
+    rows.append(('total',) + tuple(
+        str(sum(int(row[index]) for row in rows))
+        for index in range(1, len(header))))
+
+    return text_table(header, rows)
+
+
+class NetBoxApply(NetBoxPlan):
+    """Apply Ansible netbox_* collections to NetBox in bulk
+
+    Changes are planned and made by NetBoxPlan, shared with the netbox_bulk
+    module, through pynetbox's session. Collections are planned and
+    applied level by level of their dependencies, and every step measured.
+    """
+
+    def __init__(self, netbox, batch_size=100, workers=1, page_workers=1,
+                 stats=None):
+        super().__init__(netbox.base_url, batch_size=batch_size)
+        self.netbox = netbox
+        self.workers = workers
+        self.paginator = Paginator(netbox, workers=page_workers)
+        self.stats = stats if stats is not None else Stats()
+
+    def plan(self, ansible_data):
+        """Returns the changes to make to every collection
+
+        Collections are planned level by level of their dependencies, like
+        they are applied, so objects to create can be referenced by the
+        ones planned after them, through a negative placeholder id.
+        """
+        plan = {}
+        for level in APPLY_LEVELS:
+            level = [key for key in level if key in ansible_data]
+            plan.update(zip(level, self.concurrently(
+                lambda key: self.plan_collection(
+                    key, ansible_data[key] or []), level)))
+
+        return plan
+
+    def plan_collection(self, key, records, strict=True):
+        """Returns the changes to make to a collection, measuring it"""
+        # Read the collection before measuring its planning
+        self.cache.collection(key)
+        with self.stats.measure('plan', key) as step:
+            plan = super().plan_collection(key, records, strict)
+            step['objects'] = len(records)
+
+        return plan
+
+    def apply(self, plan):
+        """Make the planned changes to every collection
+
+        Objects are created and updated level by level of the collection
+        dependencies, then deleted level by level in reverse order. The
+        collections of a level are applied concurrently when more than one
+        worker is configured, and a level only starts once the previous
+        one is complete. Collections without changes are not written.
+        """
+        levels = [[key for key in level if key in plan and
+                   (plan[key]['create'] or plan[key]['update'])]
+                  for level in APPLY_LEVELS]
+        for level in levels:
+            self.concurrently(lambda key: self.apply_collection(
+                key, plan[key]), level)
+        for level in reversed(APPLY_LEVELS):
+            self.concurrently(lambda key: self.delete(
+                key, plan[key]['delete']),
+                [key for key in level if key in plan and plan[key]['delete']])
+
+    def concurrently(self, function, keys):
+        """Returns the results of a function called with every key
+
+        Keys are run concurrently using a thread pool when more than one
+        worker is configured.
+        """
+        if self.workers > 1 and len(keys) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return list(executor.map(function, keys))
+
+        return [function(key) for key in keys]
+
+    def apply_collection(self, key, plan):  # pylint: disable=arguments-differ
+        """Create and update the objects of a collection, measuring it"""
+        with self.stats.measure('apply', key) as step:
+            super().apply_collection(key, plan, step)
+
+    def delete(self, key, deletes):  # pylint: disable=arguments-differ
+        """Delete the planned objects of a collection, measuring it"""
+        with self.stats.measure('delete', key) as step:
+            super().delete(key, deletes, step)
+
+    def read(self, key):
+        """Returns the objects of a collection in NetBox, measuring it"""
+        app, name = ENDPOINTS[key]
+        endpoint = getattr(getattr(self.netbox, app), name)
+        with self.stats.measure('read', key) as step:
+            objects = self.paginator.all(endpoint)
+            step.update(
+                (counter, self.paginator.stats[endpoint.url][counter])
+                for counter in ('requests', 'bytes'))
+            step['objects'] = len(objects)
+
+        return objects
+
+    def request(self, method, url, body=None, bulk=False):
+        """Returns the status and data NetBox answers a request with
+
+        Errors are raised with the errors NetBox gives, but the ones
+        answered as expected.
+        """
+        response = self.netbox.http_session.request(
+            method, url, json=body, verify=self.netbox.ssl_verify,
+            headers=dict(self.paginator.headers(),
+                         **{'Content-Type': 'application/json'}))
+        if response.status_code >= 400 and not answered(
+                method, response.status_code, bulk):
+            raise requests.HTTPError('{} {} {}: {}'.format(
+                response.status_code, method, url, response.text),
+                response=response)
+
+        return (response.status_code,
+                response.json() if response.content else None)
@@ -0,0 +1,58 @@
+"""lib/netbox/cache.py"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+
+
+class SnapshotCache:
+    """On-disk cache of ingested collections
+
+    Each collection is stored as compressed JSON in a SQLite database,
+    keyed by the NetBox API url and collection name, and is served until
+    it is older than the configured TTL.
+    """
+
+    def __init__(self, cache_dir, url, ttl=3600, refresh=False):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'netbox.sqlite')
+        self.url = url
+        self.ttl = ttl
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS collections ('
+                'url TEXT, collection TEXT, created REAL, records BLOB, '
+                'PRIMARY KEY (url, collection))')
+
+    def connect(self):
+        """Returns a new connection, one is opened per thread and call"""
+        return sqlite3.connect(self.path, timeout=60)
+
+    def get(self, key):
+        """Returns the cached records of a collection or None if stale"""
+        if self.refresh:
+            return None
+
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                'SELECT created, records FROM collections '
+                'WHERE url = ? AND collection = ?',
+                (self.url, key)).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+
+        return json.loads(zlib.decompress(row[1]))
+
+    def put(self, key, records):
+        """Store the records of a collection"""
+        blob = zlib.compress(json.dumps(records).encode(), 1)
+        with self.lock, closing(self.connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO collections VALUES (?, ?, ?, ?)',
+                (self.url, key, time.time(), blob))
@@ -0,0 +1,106 @@
+"""lib/netbox/diff.py"""
+
+import json
+import os
+from itertools import groupby
+from operator import itemgetter
+import yaml
+from lib.netbox.plan import COLLECTIONS
+
+# LibYAML's parser is much faster than the pure Python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Fields of the Ansible data identifying an object across snapshots, the
+# ones bulk writes find it by. Objects of other collections are identified
+# by their whole data.
+NATURAL_KEYS = {key: spec['key'] for key, spec in COLLECTIONS.items()}
+
+
+def load_ansible(path):
+    """Returns Ansible data previously written to a file or directory
+
+    Directories are read as written by --output-dir, one file per
+    collection.
+    """
+    if os.path.isdir(path):
+        data = {}
+        for name in sorted(os.listdir(path)):
+            if name.endswith(('.json', '.yml', '.yaml')):
+                data.update(load_ansible(os.path.join(path, name)))
+        return data
+
+    with open(path, encoding='utf-8') as previous:
+        if path.endswith('.json'):
+            return json.load(previous)
+        return yaml.load(previous, Loader=SafeLoader) or {}
+
+
+def natural_keys(key, records):
+    """Returns the natural keys of the records of a collection
+
+    Objects sharing a natural key are told apart by their occurrence.
+    """
+    fields = NATURAL_KEYS.get(key)
+    seen = {}
+    keys = []
+    for record in records:
+        data = record['data']
+        if fields is None:
+            natural_key = (json.dumps(data, sort_keys=True),)
+        else:
+            natural_key = tuple(data.get(field) for field in fields)
+        occurrence = seen.get(natural_key, 0)
+        seen[natural_key] = occurrence + 1
+        keys.append(natural_key + (occurrence,))
+
+    return keys
+
+
+def diff_collection(key, previous, current):
+    """Returns the records of a collection which changed since previous
+
+    Added and changed records are returned as they are now, followed by
+    the previous records of removed objects with their state absent.
+    Removed objects identified like a current one, such as duplicates,
+    are left out, as removing them would remove the current one.
+    """
+    known = dict(zip(natural_keys(key, previous), previous))
+    changed, present = [], set()
+    for natural_key, record in zip(natural_keys(key, current), current):
+        if record.get('state', 'present') != 'absent':
+            present.add(natural_key[:-1])
+        if known.pop(natural_key, None) != record:
+            changed.append(record)
+    changed.extend({'data': record['data'], 'state': 'absent'}
+                   for natural_key, record in known.items()
+                   if record.get('state', 'present') != 'absent' and
+                   natural_key[:-1] not in present)
+
+    return changed
+
+
+def diff(previous, current):
+    """Returns the changes of every collection since previous"""
+    return {key: diff_collection(key, previous.get(key, []), records)
+            for key, records in current.items()}
+
+
+def diff_stream(previous, records, keys=()):
+    """Yields (collection, record) pairs which changed since previous
+
+    Collections are compared as soon as they are complete, so only one is
+    held at a time. Objects of keys with no records left are all removed.
+    """
+    seen = set()
+    for key, pairs in groupby(records, itemgetter(0)):
+        seen.add(key)
+        current = [record for _, record in pairs]
+        for record in diff_collection(key, previous.get(key, []), current):
+            yield key, record
+    for key in keys:
+        if key not in seen:
+            for record in diff_collection(key, previous.get(key, []), []):
+                yield key, record
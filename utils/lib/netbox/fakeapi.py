@@ -0,0 +1,502 @@
+"""lib/netbox/fakeapi.py"""
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# Every synthetic object was last updated at the same time
+TIMESTAMP = '2020-05-10T00:00:00.000000Z'
+
+# Base of the urls of nested objects, which are never followed
+API_URL = 'http://netbox.example.com/api'
+
+
+def choice(value, label):
+    """Returns a NetBox choice field"""
+    return {'value': value, 'label': label}
+
+
+class Inventory:  # pylint: disable=unused-argument
+    """Synthetic NetBox inventory generated on demand
+
+    Objects are computed from their index, so no inventory is held in
+    memory and any page of any scale can be served. The scale is the
+    approximate total number of objects across all endpoints.
+    """
+
+    def __init__(self, scale=1000):
+        devices = max(1, scale // 16)
+        sites = max(1, devices // 50)
+        self.counts = {
+            'regions': 5,
+            'sites': sites,
+            'rack-roles': 5,
+            'rack-groups': sites,
+            'racks': max(1, devices // 20),
+            'manufacturers': 10,
+            'platforms': 10,
+            'device-types': 20,
+            'device-roles': 10,
+            'devices': devices,
+            'interfaces': devices * 8,
+            'cables': devices,
+            'console-connections': devices,
+            'inventory-items': devices,
+            'tenant-groups': 5,
+            'tenants': 20,
+            'roles': 5,
+            'vlan-groups': sites,
+            'vlans': sites * 4,
+            'vrfs': 20,
+            'rirs': 5,
+            'aggregates': 10,
+            'prefixes': sites * 4,
+            'ip-addresses': devices * 4,
+            'cluster-groups': 5,
+            'cluster-types': 5,
+            'clusters': max(1, devices // 100),
+            'virtual-machines': max(1, devices // 2),
+            'vm-interfaces': max(1, devices // 2),
+            'providers': 5,
+            'circuit-types': 5,
+            'circuits': sites,
+            'secret-roles': 5,
+            'secrets': 10,
+            'config-contexts': 5,
+        }
+        # Fields of objects changed since TIMESTAMP, keyed by endpoint and
+        # index, and objects deleted, which are left out of the listings
+        self.changes = {}
+        self.deleted = set()
+
+    def indexes(self, endpoint, watermark=None):
+        """Returns the indexes of the objects of an endpoint listed, the
+        ones last updated since the watermark when given"""
+        indexes = range(self.counts[endpoint])
+        if watermark is not None and watermark > TIMESTAMP:
+            indexes = sorted(
+                index for (changed, index), fields in self.changes.items()
+                if changed == endpoint and fields['last_updated'] >= watermark)
+        if self.deleted:
+            indexes = [index for index in indexes
+                       if (endpoint, index) not in self.deleted]
+
+        return indexes
+
+    def ref(self, endpoint, index):
+        """Returns the id of the object referenced by another's index"""
+        return index % self.counts[endpoint] + 1
+
+    def nested(self, endpoint, object_id, **extra):
+        """Returns the nested representation of an object"""
+        nested = {'id': object_id,
+                  'url': '{}/{}/{}/'.format(API_URL, endpoint, object_id),
+                  'name': '{}-{}'.format(endpoint, object_id),
+                  'slug': '{}-{}'.format(endpoint, object_id)}
+        nested.update(extra)
+        return nested
+
+    def brief(self, endpoint, index):
+        """Returns the brief representation of an object"""
+        return self.nested(endpoint, index + 1)
+
+    def record(self, endpoint, index):
+        """Returns the full representation of an object"""
+        record = self.brief(endpoint, index)
+        record.update({'tags': [], 'custom_fields': {},
+                       'created': TIMESTAMP[:10],
+                       'last_updated': TIMESTAMP})
+        builder = getattr(self, endpoint.replace('-', '_'), None)
+        if builder is not None:
+            record.update(builder(index))
+        record.update(self.changes.get((endpoint, index), {}))
+
+        return record
+
+    def site_ref(self, index):
+        """Returns a nested site"""
+        return self.nested('sites', self.ref('sites', index))
+
+    def tenant_ref(self, index):
+        """Returns a nested tenant, every other object has none"""
+        if index % 2:
+            return None
+        return self.nested('tenants', self.ref('tenants', index))
+
+    def regions(self, index):
+        """Returns the fields of a region"""
+        parent = self.nested('regions', 1) if index else None
+        return {'parent': parent, 'site_count': 0}
+
+    def sites(self, index):
+        """Returns the fields of a site"""
+        return {
+            'status': choice('active', 'Active'),
+            'region': self.nested('regions', self.ref('regions', index)),
+            'tenant': self.tenant_ref(index),
+            'facility': 'DC{}'.format(index), 'asn': 65000 + index % 1000,
+            'time_zone': 'UTC', 'description': '',
+            'physical_address': '', 'shipping_address': '',
+            'latitude': None, 'longitude': None, 'contact_name': '',
+            'contact_phone': '', 'contact_email': '', 'comments': ''}
+
+    def rack_roles(self, index):
+        """Returns the fields of a rack role"""
+        return {'color': '9e9e9e', 'description': ''}
+
+    def rack_groups(self, index):
+        """Returns the fields of a rack group"""
+        return {'site': self.site_ref(index)}
+
+    def racks(self, index):
+        """Returns the fields of a rack"""
+        return {
+            'facility_id': None, 'site': self.site_ref(index),
+            'group': self.nested(
+                'rack-groups', self.ref('rack-groups', index)),
+            'tenant': self.tenant_ref(index),
+            'status': choice('active', 'Active'),
+            'role': self.nested('rack-roles', self.ref('rack-roles', index)),
+            'serial': '', 'asset_tag': None,
+            'type': choice('4-post-cabinet', '4-post cabinet'),
+            'width': choice(19, '19 inches'), 'u_height': 42,
+            'desc_units': False, 'outer_width': None, 'outer_depth': None,
+            'outer_unit': None, 'comments': ''}
+
+    def platforms(self, index):
+        """Returns the fields of a platform"""
+        return {
+            'manufacturer': self.nested(
+                'manufacturers', self.ref('manufacturers', index)),
+            'napalm_driver': '', 'napalm_args': None}
+
+    def device_types(self, index):
+        """Returns the fields of a device type"""
+        return {
+            'manufacturer': self.nested(
+                'manufacturers', self.ref('manufacturers', index)),
+            'model': 'model-{}'.format(index + 1), 'part_number': '',
+            'u_height': 1, 'is_full_depth': True, 'subdevice_role': None,
+            'comments': ''}
+
+    def device_roles(self, index):
+        """Returns the fields of a device role"""
+        return {'color': '9e9e9e', 'vm_role': True}
+
+    def devices(self, index):
+        """Returns the fields of a device"""
+        device_type = self.ref('device-types', index)
+        return {
+            'device_type': self.nested(
+                'device-types', device_type,
+                model='model-{}'.format(device_type)),
+            'device_role': self.nested(
+                'device-roles', self.ref('device-roles', index)),
+            'tenant': self.tenant_ref(index),
+            'platform': self.nested('platforms', self.ref('platforms', index)),
+            'serial': 'SN{:08d}'.format(index), 'asset_tag': None,
+            'site': self.site_ref(index),
+            'rack': self.nested('racks', self.ref('racks', index)),
+            'position': index % 42 + 1, 'face': choice('front', 'Front'),
+            'parent_device': None, 'status': choice('active', 'Active'),
+            'primary_ip': None, 'cluster': None, 'virtual_chassis': None,
+            'vc_position': None, 'vc_priority': None, 'comments': '',
+            'local_context_data': None}
+
+    def interfaces(self, index):
+        """Returns the fields of a device interface"""
+        return {
+            'device': self.nested('devices', index // 8 + 1),
+            'name': 'eth{}'.format(index % 8),
+            'type': choice('1000base-t', '1000BASE-T (1GE)'),
+            'enabled': True, 'lag': None, 'mtu': None,
+            'mac_address': None, 'mgmt_only': False, 'description': '',
+            'connected_endpoint_type': None, 'connected_endpoint': None,
+            'connection_status': None, 'cable': None, 'mode': None,
+            'untagged_vlan': None, 'tagged_vlans': [],
+            'count_ipaddresses': 0}
+
+    def inventory_items(self, index):
+        """Returns the fields of an inventory item"""
+        return {
+            'device': self.nested('devices', self.ref('devices', index)),
+            'parent': None,
+            'manufacturer': self.nested(
+                'manufacturers', self.ref('manufacturers', index)),
+            'part_id': '', 'serial': '', 'asset_tag': None,
+            'discovered': False, 'description': ''}
+
+    def tenants(self, index):
+        """Returns the fields of a tenant"""
+        return {
+            'group': self.nested(
+                'tenant-groups', self.ref('tenant-groups', index)),
+            'description': '', 'comments': ''}
+
+    def roles(self, index):
+        """Returns the fields of an IPAM role"""
+        return {'weight': 1000}
+
+    def vlan_groups(self, index):
+        """Returns the fields of a VLAN group"""
+        return {'site': self.site_ref(index)}
+
+    def vlans(self, index):
+        """Returns the fields of a VLAN"""
+        return {
+            'site': self.site_ref(index),
+            'group': self.nested(
+                'vlan-groups', self.ref('vlan-groups', index)),
+            'vid': index % 4094 + 1, 'tenant': self.tenant_ref(index),
+            'status': choice('active', 'Active'), 'role': None,
+            'description': ''}
+
+    def vrfs(self, index):
+        """Returns the fields of a VRF"""
+        return {'rd': '65000:{}'.format(index + 1),
+                'tenant': self.tenant_ref(index), 'enforce_unique': True,
+                'description': ''}
+
+    def rirs(self, index):
+        """Returns the fields of a RIR"""
+        return {'is_private': True}
+
+    def aggregates(self, index):
+        """Returns the fields of an aggregate"""
+        return {'family': choice(4, 'IPv4'),
+                'prefix': '10.{}.0.0/16'.format(index),
+                'rir': self.nested('rirs', self.ref('rirs', index)),
+                'date_added': None, 'description': ''}
+
+    def prefixes(self, index):
+        """Returns the fields of a prefix"""
+        return {
+            'family': choice(4, 'IPv4'),
+            'prefix': '10.{}.{}.0/24'.format(index // 256 % 256, index % 256),
+            'site': self.site_ref(index),
+            'vrf': self.nested('vrfs', self.ref('vrfs', index)),
+            'tenant': self.tenant_ref(index), 'vlan': None,
+            'status': choice('active', 'Active'),
+            'role': self.nested('roles', self.ref('roles', index)),
+            'is_pool': False, 'description': ''}
+
+    def ip_addresses(self, index):
+        """Returns the fields of an IP address"""
+        interface = self.ref('interfaces', index)
+        return {
+            'family': choice(4, 'IPv4'),
+            'address': '10.{}.{}.{}/24'.format(
+                index // 65536 % 256, index // 256 % 256, index % 256),
+            'vrf': self.nested('vrfs', self.ref('vrfs', index)),
+            'tenant': self.tenant_ref(index),
+            'status': choice('active', 'Active'), 'role': None,
+            'interface': {
+                'id': interface,
+                'url': '{}/dcim/interfaces/{}/'.format(API_URL, interface),
+                'device': self.nested('devices', (interface - 1) // 8 + 1),
+                'virtual_machine': None,
+                'name': 'eth{}'.format((interface - 1) % 8)},
+            'nat_inside': None, 'nat_outside': None, 'dns_name': '',
+            'description': ''}
+
+    def clusters(self, index):
+        """Returns the fields of a cluster"""
+        return {
+            'type': self.nested(
+                'cluster-types', self.ref('cluster-types', index)),
+            'group': self.nested(
+                'cluster-groups', self.ref('cluster-groups', index)),
+            'site': self.site_ref(index), 'comments': ''}
+
+    def virtual_machines(self, index):
+        """Returns the fields of a virtual machine"""
+        return {
+            'status': choice('active', 'Active'),
+            'site': self.site_ref(index),
+            'cluster': self.nested('clusters', self.ref('clusters', index)),
+            'role': self.nested(
+                'device-roles', self.ref('device-roles', index)),
+            'tenant': self.tenant_ref(index),
+            'platform': self.nested('platforms', self.ref('platforms', index)),
+            'primary_ip': None, 'vcpus': 2, 'memory': 4096, 'disk': 40,
+            'comments': '', 'local_context_data': None}
+
+    def vm_interfaces(self, index):
+        """Returns the fields of a virtual machine interface"""
+        return {
+            'virtual_machine': self.nested(
+                'virtual-machines', self.ref('virtual-machines', index)),
+            'name': 'eth0', 'form_factor': choice(0, 'Virtual'),
+            'enabled': True, 'mtu': None, 'mac_address': None,
+            'description': '', 'mode': None, 'untagged_vlan': None,
+            'tagged_vlans': []}
+
+    def providers(self, index):
+        """Returns the fields of a circuit provider"""
+        return {'asn': 65000 + index, 'account': '', 'portal_url': '',
+                'noc_contact': '', 'admin_contact': '', 'comments': ''}
+
+    def circuits(self, index):
+        """Returns the fields of a circuit"""
+        return {
+            'cid': 'CID-{}'.format(index + 1),
+            'provider': self.nested('providers', self.ref('providers', index)),
+            'type': self.nested(
+                'circuit-types', self.ref('circuit-types', index)),
+            'status': choice('active', 'Active'),
+            'tenant': self.tenant_ref(index), 'install_date': None,
+            'commit_rate': None, 'description': '', 'comments': ''}
+
+    def secrets(self, index):
+        """Returns the fields of a secret"""
+        return {
+            'device': self.nested('devices', self.ref('devices', index)),
+            'role': self.nested(
+                'secret-roles', self.ref('secret-roles', index)),
+            'plaintext': None, 'hash': None}
+
+    def config_contexts(self, index):
+        """Returns the fields of a config context"""
+        return {
+            'weight': 1000, 'description': '', 'is_active': True,
+            'regions': [], 'sites': [self.site_ref(index)], 'roles': [],
+            'platforms': [
+                self.nested('platforms', self.ref('platforms', index))],
+            'cluster_groups': [], 'clusters': [], 'tenant_groups': [],
+            'tenants': [], 'data': {'ntp_servers': ['10.0.0.1']}}
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    """Answer requests to an in-process stand-in for the NetBox API"""
+
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment, avoiding delayed ACK stalls
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log every request"""
+
+    def page(self, query, count):
+        """Returns the offset and limit of the page of a list requested,
+        and the url of the next page"""
+        server = self.server
+        limit = int(query.get('limit', [server.page_size])[0])
+        if limit == 0 or limit > server.max_page_size:
+            limit = server.max_page_size
+        offset = int(query.get('offset', [0])[0])
+
+        next_url = None
+        if offset + limit < count:
+            query = dict(query, limit=[limit], offset=[offset + limit])
+            next_url = 'http://{}{}?{}'.format(
+                self.headers['Host'], urlparse(self.path).path,
+                urlencode(query, doseq=True))
+
+        return offset, limit, next_url
+
+    def respond(self, status, body=None):
+        """Send a JSON response"""
+        payload = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('API-Version', '2.8')
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.answered(self.command, status, len(payload))
+
+
+class APIServer(ThreadingHTTPServer):
+    """In-process stand-in for a NetBox API, counting what it answers"""
+
+    daemon_threads = True
+
+    def __init__(self, handler, page_size=50, max_page_size=1000):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        # Requests answered, by method and by status, and bytes sent, by
+        # concurrent handler threads
+        self.requests = 0
+        self.methods = Counter()
+        self.statuses = Counter()
+        self.bytes_sent = 0
+        self.counters_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        """Returns the base url to hand to pynetbox"""
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def answered(self, method, status, size):
+        """Count a request answered"""
+        with self.counters_lock:
+            self.requests += 1
+            self.methods[method] += 1
+            self.statuses[status] += 1
+            self.bytes_sent += size
+
+    def start(self):
+        """Serve requests from a background thread"""
+        # Poll often, so stopping the server does not hold up its user
+        self.thread = threading.Thread(
+            target=self.serve_forever, kwargs={'poll_interval': 0.01},
+            daemon=True)
+        self.thread.start()
+
+        return self.url
+
+    def stop(self):
+        """Stop serving requests"""
+        self.shutdown()
+        self.server_close()
+
+
+class FakeNetBoxHandler(APIHandler):
+    """Serve the read only list views of the NetBox API"""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve a page of a list endpoint"""
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        endpoint = parts[-1] if len(parts) > 2 else None
+        if parts[-2:] == ['virtualization', 'interfaces']:
+            endpoint = 'vm-interfaces'
+        inventory = server.inventory
+        if endpoint not in inventory.counts:
+            self.respond(404, {'detail': 'Not found.'})
+            return
+
+        indexes = inventory.indexes(
+            endpoint, query.get('last_updated__gte', [None])[0])
+        offset, limit, next_url = self.page(query, len(indexes))
+
+        if 'brief' in query:
+            build = inventory.brief
+        else:
+            build = inventory.record
+        results = [build(endpoint, index)
+                   for index in indexes[offset:offset + limit]]
+        self.respond(200, {'count': len(indexes), 'next': next_url,
+                           'previous': None, 'results': results})
+
+
+class FakeNetBox(APIServer):
+    """In-process stand-in for a NetBox API serving a synthetic inventory"""
+
+    def __init__(self, scale=1000, latency=0.0, page_size=50,
+                 max_page_size=1000):
+        super().__init__(FakeNetBoxHandler, page_size=page_size,
+                         max_page_size=max_page_size)
+        self.inventory = Inventory(scale)
+        self.latency = latency
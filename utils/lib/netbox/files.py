@@ -0,0 +1,24 @@
+"""lib/netbox/files.py"""
+
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """Open a file to write in place of path, replacing it once written
+
+    The file is written next to path and renamed over it, so readers never
+    see a partially written file. Text is written as UTF-8. Path is left
+    as it was when writing fails.
+    """
+    temporary = '{}.tmp'.format(path)
+    encoding = None if 'b' in mode else 'utf-8'
+    try:
+        with open(temporary, mode, encoding=encoding) as written:
+            yield written
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    os.replace(temporary, path)
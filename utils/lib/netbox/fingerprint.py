@@ -0,0 +1,89 @@
+"""lib/netbox/fingerprint.py"""
+
+import hashlib
+import json
+import os
+from lib.netbox.files import atomic_write
+
+
+def digest(data):
+    """Returns the content digest of JSON serializable data
+
+    Data is canonicalized first, so equal data always has the same digest
+    whatever the order of its keys.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+class Fingerprints:
+    """Content fingerprints of ingested collections and their records
+
+    The fingerprint of a collection is computed from the sorted digests of
+    its records, so it does not depend on the order they were listed in.
+    Fingerprints are saved to a manifest, compared with the one saved by
+    the previous run to tell which collections are unchanged.
+    """
+
+    def __init__(self, path, settings=None):
+        self.path = path
+        # Anything else the outputs depend on, such as the output format
+        self.settings = settings or {}
+        self.records = {}
+        self.previous = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as manifest:
+                self.previous = json.load(manifest)
+
+    def stream(self, records):
+        """Yields (collection, record) pairs, fingerprinting them"""
+        for key, record in records:
+            self.add(key, record)
+            yield key, record
+
+    def add(self, key, record):
+        """Fingerprint a record of a collection"""
+        data = record['data']
+        self.records.setdefault(key, {})[data['id']] = digest(data)
+
+    def fingerprint(self, key):
+        """Returns the fingerprint of a collection"""
+        digests = sorted(self.records.get(key, {}).values())
+
+        return digest(digests)
+
+    def unchanged(self, key, dependencies=()):
+        """Returns whether a collection is unchanged since the previous run
+
+        It is only unchanged if the collections it depends on are too, and
+        the settings are the same.
+        """
+        if self.previous.get('settings') != self.settings:
+            return False
+        collections = self.previous.get('collections', {})
+        # Empty collections are left out of manifests
+        empty = digest([])
+
+        return all(
+            collections.get(dependency, {}).get('fingerprint', empty) ==
+            self.fingerprint(dependency)
+            for dependency in {key}.union(dependencies))
+
+    def manifest(self):
+        """Returns the manifest of every fingerprinted collection"""
+        return {
+            'settings': self.settings,
+            'collections': {
+                key: {'fingerprint': self.fingerprint(key),
+                      'objects': len(records),
+                      'records': {str(object_id): record_digest
+                                  for object_id, record_digest
+                                  in records.items()}}
+                for key, records in self.records.items()},
+        }
+
+    def save(self):
+        """Write the manifest, replacing it atomically"""
+        with atomic_write(self.path) as manifest:
+            json.dump(self.manifest(), manifest)
@@ -1,15 +1,91 @@
 """lib/netbox/ingest.py"""
 
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from lib.netbox.paginator import Paginator
+from lib.netbox.stats import Stats
+
+# Every collection ingested, keyed by its output name and in output order.
+# Values are the pynetbox app and endpoint the collection is read from.
+COLLECTIONS = {
+    # DCIM
+    'netbox_regions': ('dcim', 'regions'),
+    'netbox_sites': ('dcim', 'sites'),
+    'netbox_rack_roles': ('dcim', 'rack_roles'),
+    'netbox_rack_groups': ('dcim', 'rack_groups'),
+    'netbox_racks': ('dcim', 'racks'),
+    'netbox_manufacturers': ('dcim', 'manufacturers'),
+    'netbox_platforms': ('dcim', 'platforms'),
+    'netbox_device_types': ('dcim', 'device_types'),
+    'netbox_device_roles': ('dcim', 'device_roles'),
+    'netbox_devices': ('dcim', 'devices'),
+    'netbox_device_interfaces': ('dcim', 'interfaces'),
+    'netbox_cables': ('dcim', 'cables'),
+    'netbox_console_connections': ('dcim', 'console_connections'),
+    'netbox_inventory_items': ('dcim', 'inventory_items'),
+    # Tenancy
+    'netbox_tenant_groups': ('tenancy', 'tenant_groups'),
+    'netbox_tenants': ('tenancy', 'tenants'),
+    # IPAM
+    'netbox_ipam_roles': ('ipam', 'roles'),
+    'netbox_vlan_groups': ('ipam', 'vlan_groups'),
+    'netbox_vlans': ('ipam', 'vlans'),
+    'netbox_vrfs': ('ipam', 'vrfs'),
+    'netbox_rirs': ('ipam', 'rirs'),
+    'netbox_aggregates': ('ipam', 'aggregates'),
+    'netbox_prefixes': ('ipam', 'prefixes'),
+    'netbox_ip_addresses': ('ipam', 'ip_addresses'),
+    # Virtualization
+    'netbox_cluster_groups': ('virtualization', 'cluster_groups'),
+    'netbox_cluster_types': ('virtualization', 'cluster_types'),
+    'netbox_clusters': ('virtualization', 'clusters'),
+    'netbox_virtual_machines': ('virtualization', 'virtual_machines'),
+    'netbox_virtual_interfaces': ('virtualization', 'interfaces'),
+    # Circuits
+    'netbox_providers': ('circuits', 'providers'),
+    'netbox_circuit_types': ('circuits', 'circuit_types'),
+    'netbox_circuits': ('circuits', 'circuits'),
+    # Secrets
+    'netbox_secret_roles': ('secrets', 'secret_roles'),
+    'netbox_secrets': ('secrets', 'secrets'),
+    # Extras
+    'netbox_config_contexts': ('extras', 'config_contexts'),
+}
+
+# Fields always kept when a collection is pruned to selected fields
+KEPT_FIELDS = ('id', 'last_updated')
+
 
 class NetBoxIngest:
     """Main NetBox ingestion class"""
 
-    def __init__(self, netbox):
+    def __init__(self, netbox, workers=1, page_workers=1, state=None,
+                 cache=None, fields=None, brief=(), references=None,
+                 page_size=0, auto_page_size=False, stats=None):
         self.netbox_data = {}
         self.netbox = netbox
+        self.workers = workers
+        self.paginator = Paginator(netbox, workers=page_workers,
+                                   page_size=page_size,
+                                   auto_tune=auto_page_size)
+        self.stats = stats if stats is not None else Stats()
+        self.state = state
+        self.cache = cache
+        # Only collections in the fields manifest are ingested when given
+        self.fields = fields
+        self.brief = brief
+        # Referencing fields of pruned collections are kept as bare ids
+        self.references = references or {}
+        self.collections = [key for key in COLLECTIONS
+                            if fields is None or key in fields]
 
     def data(self):
         """Collect all relevant NetBox data"""
+        if self.workers > 1:
+            self.concurrent_collections()
+            return self.netbox_data
+
         # DCIM
         self.dcim_collections()
         # Tenancy
@@ -27,6 +103,156 @@ class NetBoxIngest:
 
         return self.netbox_data
 
+    def concurrent_collections(self):
+        """Collect every collection concurrently using a thread pool"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Consume the results so any collection error is raised here
+            list(executor.map(self.collect, self.collections))
+
+        # Collections complete in any order, so restore the sequential
+        # ordering to keep the output identical to a serial run
+        self.netbox_data = {
+            key: self.netbox_data[key] for key in self.collections}
+
+    def endpoint(self, key):
+        """Returns the pynetbox endpoint of a collection"""
+        app, endpoint = COLLECTIONS[key]
+
+        return getattr(getattr(self.netbox, app), endpoint)
+
+    def stream(self, order=None):
+        """Yields (collection, record) pairs for every NetBox object
+
+        Collections are yielded in output order unless another order is
+        given. They are read one after another, their pages yielded as
+        they arrive, so memory use does not grow with the size of the
+        inventory. With more than one worker, collections are fetched
+        concurrently and each is yielded once it and the ones before it
+        are complete, holding at most one collection per worker.
+        """
+        keys = [key for key in order or self.collections
+                if key in self.collections]
+        if self.workers > 1:
+            yield from self.concurrent_stream(keys)
+            return
+
+        for key in keys:
+            for record in self.records(key):
+                yield key, record
+
+    def concurrent_stream(self, keys):
+        """Yields the records of collections fetched by a thread pool"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for key in keys:
+                pending.append(
+                    (key, executor.submit(list, self.records(key))))
+                if len(pending) >= self.workers:
+                    key, future = pending.popleft()
+                    for record in future.result():
+                        yield key, record
+            while pending:
+                key, future = pending.popleft()
+                for record in future.result():
+                    yield key, record
+
+    def records(self, key):
+        """Yields the records of a single collection, measuring it"""
+        with self.stats.measure('ingest', key) as step:
+            for record in self.fetch(key):
+                step['objects'] += 1
+                yield {'data': record, 'state': 'present'}
+            # Paging counters of the collection's endpoint, none if cached
+            step.update(self.paginator.stats.get(self.endpoint(key).url, {}))
+
+    def fetch(self, key):
+        """Returns the NetBox objects of a collection, cached if enabled"""
+        if self.cache is None:
+            return self.fetch_api(key)
+
+        results = self.cache.get(self.storage_key(key))
+        if results is None:
+            results = list(self.fetch_api(key))
+            self.cache.put(self.storage_key(key), results)
+
+        return results
+
+    def fetch_api(self, key):
+        """Returns the NetBox objects of a collection from the API"""
+        endpoint = self.endpoint(key)
+        if self.state is not None:
+            return self.incremental(key, endpoint)
+
+        return self.listing(key, endpoint)
+
+    def listing(self, key, endpoint, params=None):
+        """Yields the objects of an endpoint pruned to the selected fields"""
+        params = dict(params or {})
+        if key in self.brief:
+            params['brief'] = 1
+        for page in self.paginator.pages(endpoint, params):
+            for record in page['results']:
+                yield self.prune(key, record)
+
+    def prune(self, key, record):
+        """Returns a record with only the selected fields of a collection"""
+        if self.fields is None:
+            return record
+
+        pruned = {field: record[field]
+                  for field in KEPT_FIELDS + self.fields[key]
+                  if field in record}
+        for field in self.references.get(key, ()):
+            if isinstance(pruned.get(field), dict):
+                pruned[field] = pruned[field]['id']
+
+        return pruned
+
+    def storage_key(self, key):
+        """Returns the key a collection is cached and saved under
+
+        Pruned collections are stored apart from full ones, keyed by the
+        fields they were pruned to.
+        """
+        if self.fields is None:
+            return key
+
+        selection = repr((self.fields[key], key in self.brief,
+                          self.references.get(key))).encode()
+        return '{}:{:08x}'.format(key, zlib.crc32(selection))
+
+    def incremental(self, key, endpoint):
+        """Returns a collection updated from its previously saved state
+
+        Only objects changed since the saved last_updated watermark are
+        fetched in full. A brief listing of all ids then drops deleted
+        objects and restores the server ordering.
+        """
+        storage_key = self.storage_key(key)
+        watermark = self.state.watermark(storage_key)
+        if watermark is None:
+            records = list(self.listing(key, endpoint))
+        else:
+            known = {record['id']: record
+                     for record in self.state.records(storage_key)}
+            changed = self.listing(
+                key, endpoint, {'last_updated__gte': watermark})
+            known.update((record['id'], record) for record in changed)
+            # Objects created after the changed listing are not known yet,
+            # they are newer than the watermark and picked up next run
+            ids = self.paginator.all(endpoint, {'brief': 1})
+            records = [known[record['id']] for record in ids
+                       if record['id'] in known]
+
+        self.state.update(storage_key, records)
+
+        return records
+
+    def collect(self, key):
+        """Collect all objects of a single collection if it is selected"""
+        if key in self.collections:
+            self.netbox_data[key] = list(self.records(key))
+
     def dcim_collections(self):
         """Collect DCIM related info"""
         self.regions()
@@ -85,362 +311,140 @@ class NetBoxIngest:
 
     def regions(self):
         """Returns all NetBox regions"""
-        netbox_regions = []
-        all_regions = self.netbox.dcim.regions.all()
-        for region in all_regions:
-            region_info = {'data': dict(region), 'state': 'present'}
-            netbox_regions.append(region_info)
-
-        self.netbox_data['netbox_regions'] = netbox_regions
+        self.collect('netbox_regions')
 
     def sites(self):
         """Returns all NetBox sites"""
-        netbox_sites = []
-        all_sites = self.netbox.dcim.sites.all()
-        for site in all_sites:
-            site_info = {'data': dict(site), 'state': 'present'}
-            netbox_sites.append(site_info)
-
-        self.netbox_data['netbox_sites'] = netbox_sites
+        self.collect('netbox_sites')
 
     def rack_roles(self):
         """Returns all NetBox rack roles"""
-        netbox_rack_roles = []
-        all_rack_roles = self.netbox.dcim.rack_roles.all()
-        for role in all_rack_roles:
-            role_info = {'data': dict(
-                role), 'state': 'present'}
-            netbox_rack_roles.append(role_info)
-
-        self.netbox_data['netbox_rack_roles'] = netbox_rack_roles
+        self.collect('netbox_rack_roles')
 
     def rack_groups(self):
         """Returns all NetBox rack groups"""
-        netbox_rack_groups = []
-        all_rack_groups = self.netbox.dcim.rack_groups.all()
-        for group in all_rack_groups:
-            group_info = {'data': dict(
-                group), 'state': 'present'}
-            netbox_rack_groups.append(group_info)
-
-        self.netbox_data['netbox_rack_groups'] = netbox_rack_groups
+        self.collect('netbox_rack_groups')
 
     def racks(self):
         """Returns all NetBox racks"""
-        netbox_racks = []
-        all_racks = self.netbox.dcim.racks.all()
-        for rack in all_racks:
-            rack_info = {'data': dict(
-                rack), 'state': 'present'}
-            netbox_racks.append(rack_info)
-
-        self.netbox_data['netbox_racks'] = netbox_racks
+        self.collect('netbox_racks')
 
     def manufacturers(self):
         """Returns all NetBox manufacturers"""
-        netbox_manufacturers = []
-        all_manufacturers = self.netbox.dcim.manufacturers.all()
-        for manufacturer in all_manufacturers:
-            manufacturer_info = {'data': dict(
-                manufacturer), 'state': 'present'}
-            netbox_manufacturers.append(manufacturer_info)
-
-        self.netbox_data['netbox_manufacturers'] = netbox_manufacturers
+        self.collect('netbox_manufacturers')
 
     def platforms(self):
         """Returns all NetBox platforms"""
-        netbox_platforms = []
-        all_platforms = self.netbox.dcim.platforms.all()
-        for platform in all_platforms:
-            platform_info = {'data': dict(platform), 'state': 'present'}
-            netbox_platforms.append(platform_info)
-
-        self.netbox_data['netbox_platforms'] = netbox_platforms
+        self.collect('netbox_platforms')
 
     def device_types(self):
         """Returns all NetBox device types"""
-        netbox_device_types = []
-        all_netbox_device_types = self.netbox.dcim.device_types.all()
-        for device_type in all_netbox_device_types:
-            device_type_info = {'data': dict(device_type), 'state': 'present'}
-            netbox_device_types.append(device_type_info)
-
-        self.netbox_data['netbox_device_types'] = netbox_device_types
+        self.collect('netbox_device_types')
 
     def device_roles(self):
         """Returns all NetBox device roles"""
-        netbox_device_roles = []
-        all_device_roles = self.netbox.dcim.device_roles.all()
-        for role in all_device_roles:
-            role_info = {'data': dict(role), 'state': 'present'}
-            netbox_device_roles.append(role_info)
-
-        self.netbox_data['netbox_device_roles'] = netbox_device_roles
+        self.collect('netbox_device_roles')
 
     def devices(self):
         """Returns all NetBox devices"""
-        netbox_devices = []
-        all_devices = self.netbox.dcim.devices.all()
-        for device in all_devices:
-            device_info = {'data': dict(device), 'state': 'present'}
-            netbox_devices.append(device_info)
-
-        self.netbox_data['netbox_devices'] = netbox_devices
+        self.collect('netbox_devices')
 
     def interfaces(self):
         """Returns all NetBox interfaces"""
-        netbox_device_interfaces = []
-        all_interfaces = self.netbox.dcim.interfaces.all()
-        for interface in all_interfaces:
-            interface_info = {'data': dict(interface), 'state': 'present'}
-            netbox_device_interfaces.append(interface_info)
-
-        self.netbox_data['netbox_device_interfaces'] = netbox_device_interfaces
+        self.collect('netbox_device_interfaces')
 
     def cables(self):
         """Returns all NetBox cables"""
-        netbox_cables = []
-        all_cables = self.netbox.dcim.cables.all()
-        for cable in all_cables:
-            cable_info = {'data': dict(cable), 'state': 'present'}
-            netbox_cables.append(cable_info)
-
-        self.netbox_data['netbox_cables'] = netbox_cables
+        self.collect('netbox_cables')
 
     def console_connections(self):
         """Returns all NetBox console connections"""
-        netbox_console_connections = []
-        all_console_connections = self.netbox.dcim.console_connections.all()
-        for connection in all_console_connections:
-            connection_info = {'data': dict(connection), 'state': 'present'}
-            netbox_console_connections.append(connection_info)
-
-        self.netbox_data[
-            'netbox_console_connections'] = netbox_console_connections
+        self.collect('netbox_console_connections')
 
     def inventory_items(self):
         """Returns all NetBox inventory items"""
-        netbox_inventory_items = []
-        all_inventory_items = self.netbox.dcim.inventory_items.all()
-        for item in all_inventory_items:
-            item_info = {'data': dict(item), 'state': 'present'}
-            netbox_inventory_items.append(item_info)
-
-        self.netbox_data['netbox_inventory_items'] = netbox_inventory_items
+        self.collect('netbox_inventory_items')
 
     def tenant_groups(self):
         """Returns all NetBox tenant groups"""
-        netbox_tenant_groups = []
-        all_tenant_groups = self.netbox.tenancy.tenant_groups.all()
-        for group in all_tenant_groups:
-            group_info = {'data': dict(group), 'state': 'present'}
-            netbox_tenant_groups.append(group_info)
-
-        self.netbox_data['netbox_tenant_groups'] = netbox_tenant_groups
+        self.collect('netbox_tenant_groups')
 
     def tenants(self):
         """Returns all NetBox tenants"""
-        netbox_tenants = []
-        all_tenants = self.netbox.tenancy.tenants.all()
-        for tenant in all_tenants:
-            tenant_info = {'data': dict(tenant), 'state': 'present'}
-            netbox_tenants.append(tenant_info)
-
-        self.netbox_data['netbox_tenants'] = netbox_tenants
+        self.collect('netbox_tenants')
 
     def roles(self):
         """Returns all NetBox roles"""
-        netbox_ipam_roles = []
-        all_roles = self.netbox.ipam.roles.all()
-        for role in all_roles:
-            role_info = {'data': dict(role), 'state': 'present'}
-            netbox_ipam_roles.append(role_info)
-
-        self.netbox_data['netbox_ipam_roles'] = netbox_ipam_roles
+        self.collect('netbox_ipam_roles')
 
     def vlan_groups(self):
         """Returns all NetBox VLAN groups"""
-        netbox_vlan_groups = []
-        all_vlan_groups = self.netbox.ipam.vlan_groups.all()
-        for group in all_vlan_groups:
-            group_info = {'data': dict(group), 'state': 'present'}
-            netbox_vlan_groups.append(group_info)
-
-        self.netbox_data['netbox_vlan_groups'] = netbox_vlan_groups
+        self.collect('netbox_vlan_groups')
 
     def vlans(self):
         """Returns all NetBox VLANs"""
-        netbox_vlans = []
-        all_vlans = self.netbox.ipam.vlans.all()
-        for vlan in all_vlans:
-            vlan_info = {'data': dict(vlan), 'state': 'present'}
-            netbox_vlans.append(vlan_info)
-
-        self.netbox_data['netbox_vlans'] = netbox_vlans
+        self.collect('netbox_vlans')
 
     def vrfs(self):
         """Returns all NetBox VRFs"""
-        netbox_vrfs = []
-        all_vrfs = self.netbox.ipam.vrfs.all()
-        for vrf in all_vrfs:
-            vrf_info = {'data': dict(vrf), 'state': 'present'}
-            netbox_vrfs.append(vrf_info)
-
-        self.netbox_data['netbox_vrfs'] = netbox_vrfs
+        self.collect('netbox_vrfs')
 
     def rirs(self):
         """Returns all NetBox RIRs"""
-        netbox_rirs = []
-        all_rirs = self.netbox.ipam.rirs.all()
-        for rir in all_rirs:
-            rir_info = {'data': dict(rir), 'state': 'present'}
-            netbox_rirs.append(rir_info)
-
-        self.netbox_data['netbox_rirs'] = netbox_rirs
+        self.collect('netbox_rirs')
 
     def aggs(self):
         """Returns all NetBox aggregates"""
-        netbox_aggregates = []
-        all_aggs = self.netbox.ipam.aggregates.all()
-        for agg in all_aggs:
-            agg_info = {'data': dict(agg), 'state': 'present'}
-            netbox_aggregates.append(agg_info)
-
-        self.netbox_data['netbox_aggregates'] = netbox_aggregates
+        self.collect('netbox_aggregates')
 
     def prefixes(self):
         """Returns all NetBox prefixes"""
-        netbox_prefixes = []
-        all_prefixes = self.netbox.ipam.prefixes.all()
-        for prefix in all_prefixes:
-            prefix_info = {'data': dict(prefix), 'state': 'present'}
-            netbox_prefixes.append(prefix_info)
-
-        self.netbox_data['netbox_prefixes'] = netbox_prefixes
+        self.collect('netbox_prefixes')
 
     def ip_addresses(self):
         """Returns all NetBox IP addresses"""
-        netbox_ip_addresses = []
-        all_ip_addresses = self.netbox.ipam.ip_addresses.all()
-        for address in all_ip_addresses:
-            address_info = {'data': dict(address), 'state': 'present'}
-            netbox_ip_addresses.append(address_info)
-
-        self.netbox_data['netbox_ip_addresses'] = netbox_ip_addresses
+        self.collect('netbox_ip_addresses')
 
     def cluster_groups(self):
         """Returns all NetBox cluster groups"""
-        netbox_cluster_groups = []
-        all_cluster_groups = self.netbox.virtualization.cluster_groups.all()
-        for group in all_cluster_groups:
-            group_info = {'data': dict(group), 'state': 'present'}
-            netbox_cluster_groups.append(group_info)
-
-        self.netbox_data['netbox_cluster_groups'] = netbox_cluster_groups
+        self.collect('netbox_cluster_groups')
 
     def cluster_types(self):
         """Returns all NetBox cluster types"""
-        netbox_cluster_types = []
-        all_cluster_types = self.netbox.virtualization.cluster_types.all()
-        for cluster_type in all_cluster_types:
-            cluster_info = {'data': dict(cluster_type), 'state': 'present'}
-            netbox_cluster_types.append(cluster_info)
-
-        self.netbox_data['netbox_cluster_types'] = netbox_cluster_types
+        self.collect('netbox_cluster_types')
 
     def clusters(self):
         """Returns all NetBox clusters"""
-        netbox_clusters = []
-        all_clusters = self.netbox.virtualization.clusters.all()
-        for cluster in all_clusters:
-            cluster_info = {'data': dict(cluster), 'state': 'present'}
-            netbox_clusters.append(cluster_info)
-
-        self.netbox_data['netbox_clusters'] = netbox_clusters
+        self.collect('netbox_clusters')
 
     def virtual_machines(self):
         """Returns all NetBox virtual machines"""
-        netbox_virtual_machines = []
-        all_vms = self.netbox.virtualization.virtual_machines.all()
-        for virtual_machine in all_vms:
-            virtual_machine_info = {'data': dict(
-                virtual_machine), 'state': 'present'}
-            netbox_virtual_machines.append(virtual_machine_info)
-
-        self.netbox_data['netbox_virtual_machines'] = netbox_virtual_machines
+        self.collect('netbox_virtual_machines')
 
     def virtual_interfaces(self):
         """Returns all NetBox virtual machines"""
-        netbox_virtual_interfaces = []
-        all_virtual_interfaces = self.netbox.virtualization.interfaces.all()
-        for interface in all_virtual_interfaces:
-            interface_info = {'data': dict(
-                interface), 'state': 'present'}
-            netbox_virtual_interfaces.append(interface_info)
-
-        self.netbox_data['netbox_virtual_interfaces'] = netbox_virtual_interfaces
+        self.collect('netbox_virtual_interfaces')
 
     def providers(self):
         """Returns all NetBox circuit providers"""
-        netbox_providers = []
-        all_providers = self.netbox.circuits.providers.all()
-        for provider in all_providers:
-            provider_info = {'data': dict(
-                provider), 'state': 'present'}
-            netbox_providers.append(provider_info)
-
-        self.netbox_data['netbox_providers'] = netbox_providers
+        self.collect('netbox_providers')
 
     def circuit_types(self):
         """Returns all NetBox circuit types"""
-        netbox_circuit_types = []
-        all_circuit_types = self.netbox.circuits.circuit_types.all()
-        for circuit_type in all_circuit_types:
-            circuit_type_info = {'data': dict(
-                circuit_type), 'state': 'present'}
-            netbox_circuit_types.append(circuit_type_info)
-
-        self.netbox_data['netbox_circuit_types'] = netbox_circuit_types
+        self.collect('netbox_circuit_types')
 
     def circuits(self):
         """Returns all NetBox circuits"""
-        netbox_circuits = []
-        all_circuit = self.netbox.circuits.circuits.all()
-        for circuit in all_circuit:
-            circuit_info = {'data': dict(
-                circuit), 'state': 'present'}
-            netbox_circuits.append(circuit_info)
-
-        self.netbox_data['netbox_circuits'] = netbox_circuits
+        self.collect('netbox_circuits')
 
     def secret_roles(self):
         """Returns all NetBox secret roles"""
-        netbox_secret_roles = []
-        all_secret_roles = self.netbox.secrets.secret_roles.all()
-        for role in all_secret_roles:
-            role_info = {'data': dict(
-                role), 'state': 'present'}
-            netbox_secret_roles.append(role_info)
-
-        self.netbox_data['netbox_secret_roles'] = netbox_secret_roles
+        self.collect('netbox_secret_roles')
 
     def secrets(self):
         """Returns all NetBox secrets"""
-        netbox_secrets = []
-        all_secrets = self.netbox.secrets.secrets.all()
-        for secret in all_secrets:
-            secret_info = {'data': dict(
-                secret), 'state': 'present'}
-            netbox_secrets.append(secret_info)
-
-        self.netbox_data['netbox_secrets'] = netbox_secrets
+        self.collect('netbox_secrets')
 
     def config_contexts(self):
         """Returns all NetBox config contexts"""
-        netbox_config_contexts = []
-        all_config_contexts = self.netbox.extras.config_contexts.all()
-        for context in all_config_contexts:
-            context_info = {'data': dict(context), 'state': 'present'}
-            netbox_config_contexts.append(context_info)
-
-        self.netbox_data['netbox_config_contexts'] = netbox_config_contexts
+        self.collect('netbox_config_contexts')
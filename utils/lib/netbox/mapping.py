@@ -0,0 +1,166 @@
+"""lib/netbox/mapping.py"""
+
+from collections import namedtuple
+
+# Output field of a translated record, read from a source field of the
+# NetBox record, or from the first defined of several, and converted by an
+# extractor: None keeps the value as is, 'label' and 'value' read a choice,
+# a Reference resolves a referenced object and a tuple of fields maps a
+# nested object. Optional fields are only output when defined.
+Field = namedtuple('Field', 'output source extract optional',
+                   defaults=(None, None, False))
+
+# Attribute of an object referenced in another collection, or of each of a
+# list of objects when many
+Reference = namedtuple('Reference', 'key attribute many',
+                       defaults=('name', False))
+
+
+def choice_label(choice):
+    """Returns the label of a NetBox choice, if defined"""
+    if choice is None:
+        return None
+
+    return choice['label']
+
+
+def choice_value(choice):
+    """Returns the value of a NetBox choice, if defined"""
+    if choice is None:
+        return None
+
+    return choice['value']
+
+
+def first_defined(data, sources):
+    """Returns the first defined value of several source fields"""
+    for source in sources:
+        value = data.get(source)
+        if value is not None:
+            return value
+
+    return None
+
+
+def field(spec):
+    """Returns the Field of a mapping entry, given as one or a field name"""
+    if isinstance(spec, str):
+        return Field(spec)
+
+    return spec
+
+
+def sources(mapping):
+    """Returns the source fields read by a mapping"""
+    read = set()
+    for spec in map(field, mapping):
+        source = spec.source or spec.output
+        read.update((source,) if isinstance(source, str) else source)
+
+    return tuple(sorted(read))
+
+
+def references(mapping):
+    """Returns the source fields of a mapping holding a single reference"""
+    return tuple(sorted(
+        spec.source or spec.output for spec in map(field, mapping)
+        if isinstance(spec.extract, Reference) and not spec.extract.many))
+
+
+def lookups(mapping):
+    """Returns the (collection, attribute) pairs references are resolved by"""
+    found = set()
+    for spec in map(field, mapping):
+        if isinstance(spec.extract, Reference):
+            found.add((spec.extract.key, spec.extract.attribute))
+        elif isinstance(spec.extract, tuple):
+            found.update(lookups(spec.extract))
+
+    return found
+
+
+def dependency_levels(dependencies):
+    """Returns keys in levels, each after the levels of the keys it depends on
+
+    Keys of a level only depend on keys of previous levels, so they do not
+    depend on each other. Keys otherwise keep their order, and a key
+    depending on itself does not prevent it from being placed.
+    """
+    levels, placed, pending = [], set(), list(dependencies)
+    while pending:
+        level = [key for key in pending
+                 if dependencies[key] - {key} <= placed]
+        if not level:
+            raise ValueError('Circular dependencies between {}'.format(
+                ', '.join(pending)))
+        levels.append(level)
+        placed.update(level)
+        pending = [key for key in pending if key not in placed]
+
+    return levels
+
+
+def dependency_order(dependencies):
+    """Returns keys ordered after the keys they depend on"""
+    return [key for level in dependency_levels(dependencies) for key in level]
+
+
+def compile_mapping(mapping):
+    """Returns a function translating a record according to a mapping
+
+    The mapping is compiled to the source of a function building the
+    translated record in a single dict display, which is then compiled by
+    Python, so no per-field dispatch is left when translating. The function
+    is called with the record and a function resolving references.
+    """
+    namespace = {'choice_label': choice_label, 'choice_value': choice_value,
+                 'first_defined': first_defined}
+    return namespace[_generate(mapping, namespace)]
+
+
+def _generate(mapping, namespace):
+    """Define the function of a mapping in a namespace, returning its name"""
+    function = 'translate_{}'.format(len(namespace))
+    namespace[function] = None
+    displayed, optional = [], []
+    for spec in map(field, mapping):
+        expression = _expression(spec, namespace)
+        if spec.optional:
+            optional.append((spec.output, expression))
+        else:
+            displayed.append('{!r}: {}'.format(spec.output, expression))
+
+    lines = ['def {}(data, name):'.format(function),
+             '    record = {{{}}}'.format(', '.join(displayed))]
+    for output, expression in optional:
+        lines.extend(['    value = {}'.format(expression),
+                      '    if value is not None:',
+                      '        record[{!r}] = value'.format(output)])
+    lines.append('    return record')
+    exec('\n'.join(lines), namespace)  # pylint: disable=exec-used
+
+    return function
+
+
+def _expression(spec, namespace):
+    """Returns the source of the expression extracting a field"""
+    source = spec.source or spec.output
+    if isinstance(source, str):
+        value = 'data[{!r}]'.format(source)
+    else:
+        value = 'first_defined(data, {!r})'.format(tuple(source))
+
+    extract = spec.extract
+    if extract is None:
+        return value
+    if extract in ('label', 'value'):
+        return 'choice_{}({})'.format(extract, value)
+    if isinstance(extract, Reference):
+        if extract.many:
+            return '[name({!r}, item, {!r}) for item in {}]'.format(
+                extract.key, extract.attribute, value)
+        return 'name({!r}, {}, {!r})'.format(
+            extract.key, value, extract.attribute)
+
+    nested = _generate(extract, namespace)
+    return '(None if {0} is None else {1}({0}, name))'.format(value, nested)
@@ -0,0 +1,126 @@
+"""lib/netbox/paginator.py"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# NetBox's default PAGINATE_COUNT, where auto tuning starts from
+DEFAULT_PAGE_SIZE = 50
+
+
+class Paginator:
+    """Fetch every object of a NetBox list endpoint page by page"""
+
+    def __init__(self, netbox, workers=1, page_size=0, auto_tune=False,
+                 target_time=1.0):
+        self.netbox = netbox
+        self.workers = workers
+        # A page size of 0 asks NetBox for its maximum page size
+        self.page_size = page_size
+        self.auto_tune = auto_tune
+        self.target_time = target_time
+        # Page size used, requests made and bytes received per endpoint url,
+        # counted by concurrent page workers under the lock
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def headers(self):
+        """Returns the headers sent with every page request"""
+        headers = {'accept': 'application/json;'}
+        if self.netbox.token:
+            headers['authorization'] = 'Token {}'.format(self.netbox.token)
+        if self.netbox.session_key:
+            headers['X-Session-Key'] = self.netbox.session_key
+
+        return headers
+
+    def page(self, url, params=None, stats=None):
+        """Returns a single page of an endpoint, counting it in stats"""
+        response = self.netbox.http_session.get(
+            url, headers=self.headers(), params=params,
+            verify=self.netbox.ssl_verify)
+        response.raise_for_status()
+        if stats is not None:
+            # Content-Length is the size on the wire when compressed
+            size = int(response.headers.get(
+                'Content-Length', len(response.content)))
+            with self.lock:
+                stats['requests'] += 1
+                stats['bytes'] += size
+
+        return response.json()
+
+    def all(self, endpoint, params=None):
+        """Returns all objects of a pynetbox endpoint in server order"""
+        results = []
+        for page in self.pages(endpoint, params):
+            results.extend(page['results'])
+
+        return results
+
+    def pages(self, endpoint, params=None):
+        """Yields every page of a pynetbox endpoint in server order
+
+        By default the first page is requested with a limit of 0, which
+        NetBox answers with its maximum page size. When auto tuning, the
+        limit starts at the configured page size and doubles with every
+        page for as long as NetBox honours it and answers faster than the
+        target time. The remaining pages are then requested by offset with
+        the page size found, concurrently when more than one worker is
+        configured, and yielded in order. At most one page per worker is
+        held in memory ahead of the consumer.
+        """
+        url = '{}/'.format(endpoint.url)
+        params = dict(params or {})
+        stats = self.stats.setdefault(
+            endpoint.url, {'page_size': 0, 'requests': 0, 'bytes': 0})
+
+        limit = self.page_size
+        if self.auto_tune and not limit:
+            limit = DEFAULT_PAGE_SIZE
+        offset = 0
+        while True:
+            started = time.monotonic()
+            last = self.page(
+                url, dict(params, limit=limit, offset=offset), stats)
+            elapsed = time.monotonic() - started
+            yield last
+            page_size = len(last['results'])
+            # The limit asked for, or the size NetBox capped it to when the
+            # page is full. 0 is NetBox's maximum on a single page.
+            stats['page_size'] = page_size if last['next'] else limit
+            offset += page_size
+            if not last['next'] or not page_size:
+                return
+            if not (self.auto_tune and page_size == limit and
+                    elapsed < self.target_time):
+                break
+            limit *= 2
+
+        def fetch(offset):
+            return self.page(
+                url, dict(params, limit=page_size, offset=offset), stats)
+
+        offsets = range(offset, last['count'], page_size)
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = deque()
+                for offset in offsets:
+                    pending.append(executor.submit(fetch, offset))
+                    if len(pending) >= self.workers:
+                        last = pending.popleft().result()
+                        yield last
+                while pending:
+                    last = pending.popleft().result()
+                    yield last
+        else:
+            for offset in offsets:
+                last = fetch(offset)
+                yield last
+
+        # Objects created while paging push results past the expected count,
+        # so follow any remaining links from the last page
+        while last['next']:
+            last = self.page(last['next'], stats=stats)
+            yield last
@@ -0,0 +1,19 @@
+"""lib/netbox/plan.py"""
+
+import os
+from importlib.util import module_from_spec, spec_from_file_location
+
+# Planning of bulk writes is shared with the netbox_bulk Ansible module. It
+# does not need Ansible, so it is loaded from the collection's module_utils
+# by path, without adding them to sys.path.
+PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'plugins',
+    'module_utils', 'netbox_plan.py'))
+SPEC = spec_from_file_location('lib.netbox.netbox_plan', PATH)
+netbox_plan = module_from_spec(SPEC)  # pylint: disable=invalid-name
+SPEC.loader.exec_module(netbox_plan)
+
+COLLECTIONS = netbox_plan.COLLECTIONS
+NetBoxPlan = netbox_plan.NetBoxPlan
+answered = netbox_plan.answered
+dependencies = netbox_plan.dependencies
@@ -0,0 +1,45 @@
+"""lib/netbox/session.py"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Responses worth retrying, NetBox is rate limited or temporarily failing
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter applying a default timeout to every request"""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        """Send a request, with the default timeout unless one is given"""
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        return super().send(request, **kwargs)
+
+
+def build_session(pool_size=10, timeout=60, retries=3, backoff=0.5):
+    """Returns a requests session tuned for talking to a remote NetBox
+
+    Connections are kept alive in a pool sized for the number of concurrent
+    requests, responses are requested compressed, and idempotent requests
+    are retried with exponential backoff on connection errors and
+    429/5xx responses, honouring any Retry-After header.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff,
+                  status_forcelist=RETRY_STATUSES, raise_on_status=False)
+    adapter = TimeoutHTTPAdapter(
+        timeout=timeout, max_retries=retry, pool_maxsize=max(pool_size, 1))
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                            'Connection': 'keep-alive'})
+
+    return session
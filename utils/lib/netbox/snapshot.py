@@ -0,0 +1,83 @@
+"""lib/netbox/snapshot.py"""
+
+import mmap
+import struct
+from itertools import groupby
+from operator import itemgetter
+import msgpack
+from lib.netbox.ansible import gc_paused
+from lib.netbox.files import atomic_write
+from lib.netbox.stats import Stats
+
+# Start of every snapshot file, followed by one MessagePack array of
+# records per collection, the index of collections and the index offset
+MAGIC = b'NBSNAP1\n'
+OFFSET = struct.Struct('<Q')
+
+
+def save_snapshot(path, records, keys=()):
+    """Write (collection, record) pairs to a snapshot file
+
+    Collections are packed as soon as they are complete, so only one is
+    held at a time. Keys with no records are saved as empty collections.
+    The file is replaced atomically.
+    """
+    index = {}
+    with atomic_write(path, 'wb') as snapshot:
+        snapshot.write(MAGIC)
+        collections = ((key, [record for _, record in pairs])
+                       for key, pairs in groupby(records, itemgetter(0)))
+        for key, collection in collections:
+            packed = msgpack.packb(collection)
+            index[key] = [snapshot.tell(), len(packed)]
+            snapshot.write(packed)
+        for key in keys:
+            if key not in index:
+                packed = msgpack.packb([])
+                index[key] = [snapshot.tell(), len(packed)]
+                snapshot.write(packed)
+        offset = snapshot.tell()
+        snapshot.write(msgpack.packb(index))
+        snapshot.write(OFFSET.pack(offset))
+
+
+class NetBoxSnapshot:
+    """NetBox data read back from a snapshot file
+
+    Reads like a NetBoxIngest. The file is memory mapped and a collection
+    is only unpacked when it is read.
+    """
+
+    def __init__(self, path, stats=None):
+        self.stats = stats if stats is not None else Stats()
+        with open(path, 'rb') as snapshot:
+            self.buffer = mmap.mmap(
+                snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a NetBox snapshot'.format(path))
+
+        offset, = OFFSET.unpack(self.buffer[-OFFSET.size:])
+        self.index = msgpack.unpackb(self.buffer[offset:-OFFSET.size])
+        self.collections = list(self.index)
+
+    def data(self):
+        """Returns every collection of the snapshot"""
+        return {key: self.collection(key) for key in self.collections}
+
+    def stream(self, order=None):
+        """Yields (collection, record) pairs, in file order unless given"""
+        for key in order or self.collections:
+            if key in self.index:
+                for record in self.collection(key):
+                    yield key, record
+
+    def collection(self, key):
+        """Returns the records of a single collection, measuring it"""
+        offset, length = self.index[key]
+        with self.stats.measure('load', key) as step, gc_paused():
+            records = msgpack.unpackb(
+                memoryview(self.buffer)[offset:offset + length])
+            step['objects'] = len(records)
+            step['bytes'] = length
+
+        return records
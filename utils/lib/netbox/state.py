@@ -0,0 +1,50 @@
+"""lib/netbox/state.py"""
+
+import json
+import os
+from lib.netbox.files import atomic_write
+
+
+class IngestState:
+    """Previously ingested collections and their last_updated watermarks
+
+    The state is saved with the NetBox API url it was ingested from, and a
+    state saved for another url, or without one, is ignored, so objects of
+    different NetBox instances are never merged.
+    """
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+        self.collections = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as state_file:
+                saved = json.load(state_file)
+            if saved.get('url') == url:
+                self.collections = saved.get('collections', {})
+
+    def watermark(self, key):
+        """Returns the newest last_updated seen for a collection"""
+        return self.collections.get(key, {}).get('watermark')
+
+    def records(self, key):
+        """Returns the records saved for a collection"""
+        return self.collections.get(key, {}).get('records', [])
+
+    def update(self, key, records):
+        """Replace the saved records of a collection
+
+        Collections whose objects carry no last_updated timestamp get no
+        watermark and are always ingested in full.
+        """
+        timestamps = [record['last_updated'] for record in records
+                      if record.get('last_updated') is not None]
+        self.collections[key] = {
+            'watermark': max(timestamps) if timestamps else None,
+            'records': records}
+
+    def save(self):
+        """Write the state file, replacing it atomically"""
+        with atomic_write(self.path) as state_file:
+            json.dump({'url': self.url, 'collections': self.collections},
+                      state_file)
@@ -0,0 +1,119 @@
+"""lib/netbox/stats.py"""
+
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from lib.netbox.files import atomic_write
+
+# Measurements of every step, in report order
+FIELDS = ('wall_time', 'requests', 'objects', 'bytes', 'page_size',
+          'peak_memory_delta')
+
+# Prometheus metric name and help text of every measurement
+METRICS = {
+    'wall_time': ('netbox_step_seconds', 'Wall time of the step'),
+    'requests': ('netbox_step_requests', 'API requests made by the step'),
+    'objects': ('netbox_step_objects', 'Objects produced by the step'),
+    'bytes': ('netbox_step_bytes', 'Bytes received from the API'),
+    'page_size': ('netbox_step_page_size', 'Objects requested per page'),
+    'peak_memory_delta': ('netbox_step_peak_memory_delta_bytes',
+                          'Growth of the process peak RSS during the step'),
+}
+
+
+def max_rss():
+    """Returns the peak resident set size of the process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        return peak
+
+    return peak * 1024
+
+
+def text_table(header, rows, labels=1):
+    """Returns rows of strings as a text table
+
+    The first labels columns are aligned left, the others right.
+    """
+    widths = [max(len(row[index]) for row in [header] + rows)
+              for index in range(len(header))]
+
+    return '\n'.join('  '.join(
+        value.ljust(width) if index < labels else value.rjust(width)
+        for index, (value, width) in enumerate(zip(row, widths)))
+        for row in [header] + rows)
+
+
+class Stats:
+    """Timing and size measurements of ingest and translation steps
+
+    Memory is measured as the growth of the process peak RSS while a step
+    runs, which is only attributable to a single step when steps do not
+    run concurrently.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, phase, name):
+        """Measure a step, yielding its counters to be filled in"""
+        step = {'phase': phase, 'name': name}
+        step.update((field, 0) for field in FIELDS)
+        with self.lock:
+            self.steps.append(step)
+
+        peak = max_rss()
+        started = time.monotonic()
+        try:
+            yield step
+        finally:
+            step['wall_time'] = round(time.monotonic() - started, 6)
+            step['peak_memory_delta'] = max_rss() - peak
+
+    def report(self):
+        """Returns every measured step"""
+        return list(self.steps)
+
+    def table(self):
+        """Returns the measured steps as a text table"""
+        header = ('phase', 'name') + FIELDS
+        rows = [tuple(str(step.get(column, '')) for column in header)
+                for step in self.steps]
+
+        return text_table(header, rows, labels=2)
+
+    def write(self, stats_format, stream=None):
+        """Write the measured steps to stderr as JSON or as a table, if a
+        format is given"""
+        stream = stream or sys.stderr
+        if stats_format == 'json':
+            stream.write(json.dumps(self.report(), indent=2))
+            stream.write('\n')
+        elif stats_format == 'table':
+            stream.write(self.table())
+            stream.write('\n')
+
+    def prometheus(self, path):
+        """Write the measured steps as a Prometheus textfile
+
+        The file is replaced atomically so a collector never reads a
+        partially written file.
+        """
+        lines = []
+        for field in FIELDS:
+            metric, description = METRICS[field]
+            lines.append('# HELP {} {}'.format(metric, description))
+            lines.append('# TYPE {} gauge'.format(metric))
+            for step in self.steps:
+                lines.append('{}{{phase="{}",name="{}"}} {}'.format(
+                    metric, step['phase'], step['name'], step[field]))
+
+        with atomic_write(path) as textfile:
+            textfile.write('\n'.join(lines))
+            textfile.write('\n')
@@ -0,0 +1,341 @@
+"""Tests of lib/netbox/apply.py against a stateful stand-in for NetBox"""
+
+import copy
+import unittest
+import pynetbox
+from lib.netbox.apply import NetBoxApply, plan_summary
+from lib.netbox.diff import diff_collection
+from tests.writable import WritableNetBox
+
+# Ansible data of a small inventory. Objects referencing others of their
+# own collection come first, so they are planned and created in passes.
+DATA = {
+    'netbox_regions': [
+        {'data': {'name': 'France', 'parent_region': 'Europe'},
+         'state': 'present'},
+        {'data': {'name': 'Europe'}, 'state': 'present'},
+    ],
+    'netbox_tenant_groups': [
+        {'data': {'name': 'Customers'}, 'state': 'present'},
+    ],
+    'netbox_tenants': [
+        {'data': {'name': 'T1', 'slug': 't1', 'tenant_group': 'Customers'},
+         'state': 'present'},
+        {'data': {'name': 'T2', 'slug': 't2', 'tenant_group': 'Customers'},
+         'state': 'present'},
+    ],
+    'netbox_sites': [
+        {'data': {'name': 'Paris', 'slug': 'paris', 'region': 'France',
+                  'status': 'Active', 'tenant': 'T1'},
+         'state': 'present'},
+    ],
+    'netbox_manufacturers': [
+        {'data': {'name': 'Acme'}, 'state': 'present'},
+    ],
+    'netbox_device_types': [
+        {'data': {'model': 'Box 1', 'slug': 'box-1', 'manufacturer': 'Acme'},
+         'state': 'present'},
+    ],
+    'netbox_device_roles': [
+        {'data': {'name': 'Leaf', 'color': '00ff00'}, 'state': 'present'},
+    ],
+    'netbox_vlans': [
+        {'data': {'name': 'mgmt', 'site': 'Paris'}, 'state': 'present'},
+    ],
+    'netbox_devices': [
+        {'data': {'name': 'dev1', 'site': 'Paris', 'tenant': 'T1',
+                  'device_type': 'Box 1', 'device_role': 'Leaf',
+                  'status': 'Active', 'serial': 'SN1'},
+         'state': 'present'},
+        {'data': {'name': 'dev2', 'site': 'Paris', 'tenant': None,
+                  'device_type': 'Box 1', 'device_role': 'Leaf',
+                  'status': 'Planned', 'serial': 'SN2'},
+         'state': 'present'},
+    ],
+    'netbox_device_interfaces': [
+        {'data': {'name': 'eth0', 'device': 'dev1',
+                  'type': '1000BASE-T (1GE)',
+                  'lag': {'name': 'bond0', 'device': 'dev1'},
+                  'tagged_vlans': [{'name': 'mgmt', 'site': 'Paris'}]},
+         'state': 'present'},
+        {'data': {'name': 'bond0', 'device': 'dev1',
+                  'type': 'Link Aggregation Group (LAG)'},
+         'state': 'present'},
+        {'data': {'name': 'eth0', 'device': 'dev2',
+                  'type': '1000BASE-T (1GE)'},
+         'state': 'present'},
+    ],
+}
+
+# Objects referencing others which identify them, or not
+PLACED = {
+    'netbox_rack_groups': [
+        {'data': {'name': 'Row 1', 'site': 'Paris'}, 'state': 'present'},
+        {'data': {'name': 'Row 2', 'site': 'Paris'}, 'state': 'present'},
+    ],
+    'netbox_racks': [
+        {'data': {'name': 'R1', 'site': 'Paris', 'rack_group': 'Row 1'},
+         'state': 'present'},
+    ],
+    'netbox_vrfs': [
+        {'data': {'name': 'Blue', 'tenant': 'T1'}, 'state': 'present'},
+    ],
+    'netbox_cluster_types': [
+        {'data': {'name': 'VMware'}, 'state': 'present'},
+    ],
+    'netbox_clusters': [
+        {'data': {'name': 'C1', 'cluster_type': 'VMware'},
+         'state': 'present'},
+        {'data': {'name': 'C2', 'cluster_type': 'VMware'},
+         'state': 'present'},
+    ],
+    'netbox_virtual_machines': [
+        {'data': {'name': 'web', 'cluster': 'C1'}, 'state': 'present'},
+    ],
+}
+
+# Requests writing to NetBox
+WRITES = ('POST', 'PATCH', 'DELETE')
+
+
+class NetBoxApplyTest(unittest.TestCase):
+    """Plan and apply Ansible data to a stand-in for NetBox"""
+
+    def setUp(self):
+        # Pages of 2 objects, so collections are read page by page
+        self.server = WritableNetBox(max_page_size=2)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.data = copy.deepcopy(DATA)
+
+    def netbox_apply(self, **kwargs):
+        """Returns a NetBoxApply writing to the stand-in"""
+        netbox = pynetbox.api(url=self.server.url, token='token')
+
+        return NetBoxApply(netbox, **kwargs)
+
+    def apply(self, data, **kwargs):
+        """Plan and apply data, returning the summary of the plan"""
+        netbox_apply = self.netbox_apply(**kwargs)
+        plan = netbox_apply.plan(data)
+        netbox_apply.apply(plan)
+
+        return plan_summary(plan)
+
+    def one(self, endpoint, **fields):
+        """Returns the only object of an endpoint with the values of fields"""
+        found = self.server.find(endpoint, **fields)
+        self.assertEqual(len(found), 1, found)
+
+        return found[0]
+
+    def writes(self):
+        """Returns the number of write requests answered"""
+        return sum(self.server.methods[method] for method in WRITES)
+
+    def test_plan_writes_nothing(self):
+        plan = self.netbox_apply().plan(self.data)
+        self.assertEqual(self.writes(), 0)
+        self.assertEqual(plan_summary(plan)['netbox_device_interfaces'],
+                         {'create': 3, 'update': 0, 'delete': 0, 'noop': 0})
+        # Objects to create are referenced through placeholder ids
+        device = plan['netbox_devices']['create'][0]['data']
+        site = plan['netbox_sites']['create'][0]
+        self.assertEqual(device['site'], site['id'])
+        self.assertLess(site['id'], 0)
+
+    def test_apply_creates_objects(self):
+        summary = self.apply(self.data)
+        self.assertEqual(sum(changes['create']
+                             for changes in summary.values()), 15)
+
+        europe = self.one('dcim/regions', name='Europe')
+        self.assertEqual(europe['slug'], 'europe')
+        self.one('dcim/regions', name='France', parent=europe['id'])
+        site = self.one('dcim/sites', slug='paris')
+        self.assertEqual(site['status'], 'active')
+        tenant = self.one('tenancy/tenants', slug='t1')
+        dev1 = self.one('dcim/devices', name='dev1', site=site['id'],
+                        tenant=tenant['id'], status='active')
+        bond0 = self.one('dcim/interfaces', name='bond0', device=dev1['id'],
+                         type='lag')
+        vlan = self.one('ipam/vlans', name='mgmt')
+        self.one('dcim/interfaces', name='eth0', device=dev1['id'],
+                 lag=bond0['id'], tagged_vlans=[vlan['id']])
+
+    def test_rerun_is_converged(self):
+        self.apply(self.data)
+        writes = self.writes()
+
+        summary = self.apply(self.data)
+        self.assertEqual(self.writes(), writes)
+        for key, changes in summary.items():
+            self.assertEqual(
+                changes, {'create': 0, 'update': 0, 'delete': 0,
+                          'noop': len(self.data[key])}, key)
+
+    def test_update(self):
+        self.apply(self.data)
+        dev1 = self.one('dcim/devices', name='dev1')
+        self.server.methods.clear()
+
+        device = self.data['netbox_devices'][0]['data']
+        device.update(serial='SN9', tenant='T2', status='Offline')
+        summary = self.apply(self.data)
+        self.assertEqual(summary['netbox_devices'],
+                         {'create': 0, 'update': 1, 'delete': 0, 'noop': 1})
+        tenant = self.one('tenancy/tenants', slug='t2')
+        self.assertEqual(
+            self.one('dcim/devices', name='dev1'),
+            dict(dev1, serial='SN9', tenant=tenant['id'], status='offline'))
+        # NetBox 2.8 refuses bulk updates, which are sent one at a time
+        self.assertEqual(self.server.methods['PATCH'], 2)
+        self.assertEqual(self.server.methods['POST'], 0)
+
+    def test_move(self):
+        self.data.update(copy.deepcopy(PLACED))
+        self.apply(self.data)
+        rack = self.one('dcim/racks', name='R1')
+        vrf = self.one('ipam/vrfs', name='Blue')
+        web = self.one('virtualization/virtual-machines', name='web')
+
+        self.data['netbox_racks'][0]['data']['rack_group'] = 'Row 2'
+        self.data['netbox_vrfs'][0]['data']['tenant'] = 'T2'
+        self.data['netbox_virtual_machines'][0]['data']['cluster'] = 'C2'
+        summary = self.apply(self.data)
+        for key in ('netbox_racks', 'netbox_vrfs', 'netbox_virtual_machines'):
+            self.assertEqual(summary[key], {'create': 0, 'update': 1,
+                                            'delete': 0, 'noop': 0}, key)
+        self.assertEqual(
+            self.one('dcim/racks', name='R1'), dict(
+                rack, group=self.one('dcim/rack-groups', name='Row 2')['id']))
+        self.assertEqual(self.one('ipam/vrfs', name='Blue'), dict(
+            vrf, tenant=self.one('tenancy/tenants', slug='t2')['id']))
+        self.assertEqual(
+            self.one('virtualization/virtual-machines', name='web'), dict(
+                web, cluster=self.one('virtualization/clusters',
+                                      name='C2')['id']))
+
+    def test_move_diffed(self):
+        self.data.update(copy.deepcopy(PLACED))
+        self.apply(self.data)
+        web = self.one('virtualization/virtual-machines', name='web')
+
+        # The diff of a move is the record as it is now, and the previous
+        # one absent, identified by another cluster
+        previous = self.data['netbox_virtual_machines']
+        current = copy.deepcopy(previous)
+        current[0]['data']['cluster'] = 'C2'
+        self.data = {'netbox_virtual_machines': diff_collection(
+            'netbox_virtual_machines', previous, current)}
+        self.assertEqual(len(self.data['netbox_virtual_machines']), 2)
+        summary = self.apply(self.data)
+        self.assertEqual(summary['netbox_virtual_machines'],
+                         {'create': 0, 'update': 1, 'delete': 0, 'noop': 0})
+        self.one('virtualization/virtual-machines', id=web['id'])
+
+    def test_match_by_key(self):
+        self.data.update(copy.deepcopy(PLACED))
+        self.data['netbox_virtual_machines'].append(
+            {'data': {'name': 'web', 'cluster': 'C2'}, 'state': 'present'})
+        self.apply(self.data)
+        self.assertEqual(len(self.server.find(
+            'virtualization/virtual-machines', name='web')), 2)
+
+        # Objects matched by name are told apart by their cluster
+        summary = self.apply(self.data)
+        self.assertEqual(summary['netbox_virtual_machines'],
+                         {'create': 0, 'update': 0, 'delete': 0, 'noop': 2})
+        self.data['netbox_virtual_machines'][1]['state'] = 'absent'
+        self.apply(self.data)
+        cluster = self.one('virtualization/clusters', name='C1')
+        self.one('virtualization/virtual-machines', cluster=cluster['id'])
+
+    def test_duplicate_keys(self):
+        self.data['netbox_rack_roles'] = [
+            {'data': {'name': 'US', 'slug': 'us', 'color': 'ff0000'},
+             'state': 'present'},
+            {'data': {'name': 'US', 'slug': 'us-2', 'color': '00ff00'},
+             'state': 'present'},
+        ]
+        plan = self.netbox_apply().plan(self.data)
+        self.assertEqual(plan_summary(plan)['netbox_rack_roles'],
+                         {'create': 2, 'update': 0, 'delete': 0, 'noop': 0})
+        self.apply(self.data)
+        self.assertEqual([role['slug'] for role in self.server.find(
+            'dcim/rack-roles', name='US')], ['us', 'us-2'])
+
+        # Each record is joined with its own object
+        summary = self.apply(self.data)
+        self.assertEqual(summary['netbox_rack_roles'],
+                         {'create': 0, 'update': 0, 'delete': 0, 'noop': 2})
+        self.data['netbox_rack_roles'][1]['data']['color'] = '0000ff'
+        plan = self.netbox_apply().plan(self.data)
+        update = plan['netbox_rack_roles']['update']
+        self.assertEqual(len(update), 1)
+        self.assertEqual(update[0]['id'], self.one(
+            'dcim/rack-roles', slug='us-2')['id'])
+
+    def test_delete(self):
+        self.apply(self.data)
+        dev2 = self.one('dcim/devices', name='dev2')
+
+        self.data['netbox_devices'][1]['state'] = 'absent'
+        self.data['netbox_device_interfaces'][2]['state'] = 'absent'
+        summary = self.apply(self.data)
+        self.assertEqual(summary['netbox_devices']['delete'], 1)
+        self.assertEqual(summary['netbox_device_interfaces']['delete'], 1)
+        self.assertEqual(self.server.find('dcim/devices', id=dev2['id']), [])
+        self.assertEqual(
+            self.server.find('dcim/interfaces', device=dev2['id']), [])
+        self.one('dcim/devices', name='dev1')
+
+        # Absent objects which do not exist are left alone
+        summary = self.apply(self.data)
+        self.assertEqual(summary['netbox_devices'],
+                         {'create': 0, 'update': 0, 'delete': 0, 'noop': 1})
+
+    def test_delete_tree(self):
+        self.apply(self.data)
+
+        # Regions absent parents first, which NetBox deletes along with
+        # their children
+        self.data['netbox_regions'] = [
+            dict(record, state='absent')
+            for record in reversed(self.data['netbox_regions'])]
+        summary = self.apply(self.data)
+        self.assertEqual(summary['netbox_regions']['delete'], 2)
+        self.assertEqual(self.server.statuses[404], 0)
+        self.assertEqual(self.server.find('dcim/regions'), [])
+
+    def test_delete_deleted(self):
+        self.apply(self.data)
+        dev2 = self.one('dcim/devices', name='dev2')
+
+        # Objects deleted since planned are left alone
+        self.data['netbox_devices'][1]['state'] = 'absent'
+        netbox_apply = self.netbox_apply()
+        plan = netbox_apply.plan(self.data)
+        self.server.delete('dcim/devices', dev2['id'])
+        netbox_apply.apply(plan)
+        self.assertEqual(self.server.statuses[404], 1)
+
+    def test_concurrent_apply(self):
+        self.apply(self.data, workers=4, page_workers=2, batch_size=1)
+        self.assertEqual(len(self.server.find('dcim/interfaces')), 3)
+        writes = self.writes()
+
+        summary = self.apply(self.data, workers=4, page_workers=2)
+        self.assertEqual(self.writes(), writes)
+        self.assertFalse(any(changes['create'] or changes['update']
+                             for changes in summary.values()))
+
+    def test_missing_reference(self):
+        self.data['netbox_devices'][0]['data']['site'] = 'Lyon'
+        with self.assertRaises(LookupError):
+            self.netbox_apply().plan(self.data)
+        self.assertEqual(self.writes(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
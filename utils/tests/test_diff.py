@@ -0,0 +1,99 @@
+"""Tests of lib/netbox/diff.py"""
+
+import unittest
+from lib.netbox.diff import diff, diff_collection, diff_stream
+
+
+def record(state='present', **data):
+    """Returns an Ansible record"""
+    return {'data': data, 'state': state}
+
+
+class DiffCollectionTest(unittest.TestCase):
+    """Changes of a single collection"""
+
+    def test_unchanged(self):
+        records = [record(name='dev1', site='s1', tenant='t1')]
+        self.assertEqual(
+            diff_collection('netbox_devices', records, list(records)), [])
+
+    def test_added_changed_removed(self):
+        previous = [record(name='dev1', serial='1'),
+                    record(name='dev2', serial='2')]
+        current = [record(name='dev1', serial='9'),
+                   record(name='dev3', serial='3')]
+        self.assertEqual(diff_collection('netbox_devices', previous, current),
+                         [current[0], current[1],
+                          record('absent', name='dev2', serial='2')])
+
+    def test_changed_tenant_updates_device(self):
+        # Devices are found by name, so the previous tenant must not be
+        # removed as another device
+        previous = [record(name='dev1', site='s1', tenant='T1')]
+        current = [record(name='dev1', site='s1', tenant='T2')]
+        self.assertEqual(diff_collection('netbox_devices', previous, current),
+                         current)
+
+    def test_changed_rack_group_updates_rack(self):
+        previous = [record(name='r1', site='s1', rack_group='g1')]
+        current = [record(name='r1', site='s1', rack_group='g2')]
+        self.assertEqual(diff_collection('netbox_racks', previous, current),
+                         current)
+
+    def test_changed_rd_updates_vrf(self):
+        previous = [record(name='vrf1', rd='65000:1', tenant=None)]
+        current = [record(name='vrf1', rd='65000:2', tenant=None)]
+        self.assertEqual(diff_collection('netbox_vrfs', previous, current),
+                         current)
+
+    def test_moved_virtual_machine(self):
+        # Virtual machines are found by name and cluster, so the one of the
+        # previous cluster is another one to remove
+        previous = [record(name='vm1', cluster='c1', tenant='T1')]
+        current = [record(name='vm1', cluster='c2', tenant='T1')]
+        self.assertEqual(
+            diff_collection('netbox_virtual_machines', previous, current),
+            [current[0], record('absent', name='vm1', cluster='c1',
+                                tenant='T1')])
+
+    def test_removed_duplicate_is_not_absent(self):
+        previous = [record(name='dev1', serial='1'),
+                    record(name='dev1', serial='2')]
+        current = [record(name='dev1', serial='1')]
+        self.assertEqual(
+            diff_collection('netbox_devices', previous, current), [])
+
+    def test_absent_records_are_not_removed_again(self):
+        previous = [record('absent', name='dev1')]
+        self.assertEqual(diff_collection('netbox_devices', previous, []), [])
+
+    def test_whole_data_identity(self):
+        previous = [record(cable='a')]
+        current = [record(cable='b')]
+        self.assertEqual(diff_collection('netbox_cables', previous, current),
+                         [current[0], record('absent', cable='a')])
+
+
+class DiffTest(unittest.TestCase):
+    """Changes of every collection"""
+
+    def test_diff(self):
+        previous = {'netbox_sites': [record(name='s1', slug='s1')]}
+        current = {'netbox_sites': [record(name='S1', slug='s1')],
+                   'netbox_regions': [record(name='r1')]}
+        self.assertEqual(diff(previous, current), current)
+
+    def test_diff_stream(self):
+        previous = {'netbox_regions': [record(name='r1')],
+                    'netbox_sites': [record(name='s1', slug='s1')]}
+        records = [('netbox_regions', record(name='r1')),
+                   ('netbox_regions', record(name='r2'))]
+        self.assertEqual(
+            list(diff_stream(previous, records,
+                             ['netbox_regions', 'netbox_sites'])),
+            [('netbox_regions', record(name='r2')),
+             ('netbox_sites', record('absent', name='s1', slug='s1'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
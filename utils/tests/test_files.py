@@ -0,0 +1,48 @@
+"""Tests of lib/netbox/files.py"""
+
+import os
+import tempfile
+import unittest
+from lib.netbox.files import atomic_write
+
+
+class AtomicWriteTest(unittest.TestCase):
+    """Files replaced once written"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'state.json')
+        with open(self.path, 'w', encoding='utf-8') as previous:
+            previous.write('previous')
+
+    def read(self):
+        """Returns the content of the file and the files next to it"""
+        with open(self.path, encoding='utf-8') as written:
+            content = written.read()
+
+        return content, sorted(os.listdir(os.path.dirname(self.path)))
+
+    def test_replace(self):
+        with atomic_write(self.path) as written:
+            written.write('é')
+            self.assertEqual(self.read(), ('previous', [
+                'state.json', 'state.json.tmp']))
+        self.assertEqual(self.read(), ('é', ['state.json']))
+
+    def test_binary(self):
+        with atomic_write(self.path, 'wb') as written:
+            written.write(b'\x00')
+        with open(self.path, 'rb') as written:
+            self.assertEqual(written.read(), b'\x00')
+
+    def test_failure(self):
+        with self.assertRaises(ValueError):
+            with atomic_write(self.path) as written:
+                written.write('partial')
+                raise ValueError('failed')
+        self.assertEqual(self.read(), ('previous', ['state.json']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests of lib/netbox/ingest.py against the fake NetBox API"""
+
+import os
+import tempfile
+import unittest
+import pynetbox
+from lib.netbox.fakeapi import TIMESTAMP, FakeNetBox
+from lib.netbox.ingest import NetBoxIngest
+from lib.netbox.state import IngestState
+
+# Times objects are changed at after the first ingestion
+CHANGED = '2020-05-11T00:00:00.000000Z'
+CHANGED_AGAIN = '2020-05-12T00:00:00.000000Z'
+
+
+class IncrementalTest(unittest.TestCase):
+    """Collections updated from their saved state"""
+
+    key = 'netbox_sites'
+
+    def setUp(self):
+        self.server = FakeNetBox(scale=2000, max_page_size=4)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.netbox = pynetbox.api(url=self.server.url, token='t')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'state.json')
+
+    def ingest(self):
+        """Returns the collection ingested from the saved state, saving it"""
+        state = IngestState(self.path, self.netbox.base_url)
+        records = list(NetBoxIngest(self.netbox, state=state).fetch(self.key))
+        state.save()
+
+        return records
+
+    def listing(self):
+        """Returns the collection listed in full"""
+        return list(NetBoxIngest(self.netbox).fetch(self.key))
+
+    def watermark(self):
+        """Returns the watermark saved for the collection"""
+        return IngestState(self.path, self.netbox.base_url).watermark(
+            self.key)
+
+    def test_unchanged(self):
+        first = self.ingest()
+        self.assertEqual(len(first), 2)
+        self.assertEqual(self.watermark(), TIMESTAMP)
+        self.assertEqual(self.ingest(), first)
+        self.assertEqual(self.watermark(), TIMESTAMP)
+
+    def test_changed(self):
+        self.ingest()
+        changes = self.server.inventory.changes
+        changes['sites', 0] = {'last_updated': CHANGED, 'facility': 'DC9'}
+        records = self.ingest()
+        self.assertEqual(records, self.listing())
+        self.assertEqual(records[0]['facility'], 'DC9')
+        self.assertEqual(self.watermark(), CHANGED)
+
+        changes['sites', 1] = {'last_updated': CHANGED_AGAIN, 'asn': 1}
+        records = self.ingest()
+        self.assertEqual(records, self.listing())
+        self.assertEqual(records[1]['asn'], 1)
+        self.assertEqual(self.watermark(), CHANGED_AGAIN)
+
+        # Only objects changed since the watermark are listed, the others
+        # are merged from the saved state by id, so a change which did not
+        # update the timestamp is not seen
+        changes['sites', 0]['facility'] = 'DC8'
+        self.assertEqual(self.ingest(), records)
+
+    def test_created(self):
+        self.ingest()
+        self.server.inventory.counts['sites'] += 1
+        self.server.inventory.changes['sites', 2] = {'last_updated': CHANGED}
+        records = self.ingest()
+        self.assertEqual(records, self.listing())
+        self.assertEqual([record['id'] for record in records], [1, 2, 3])
+
+    def test_deleted(self):
+        self.server.inventory.counts['sites'] = 6
+        first = self.ingest()
+        self.server.inventory.deleted.update((('sites', 0), ('sites', 4)))
+        records = self.ingest()
+        self.assertEqual(records, self.listing())
+        # The remaining objects keep the server order, across pages
+        self.assertEqual(records, [first[index] for index in (1, 2, 3, 5)])
+        self.assertEqual(self.watermark(), TIMESTAMP)
+
+
+if __name__ == '__main__':
+    unittest.main()
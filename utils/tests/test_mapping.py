@@ -0,0 +1,181 @@
+"""Tests of the mappings compiled by lib/netbox/mapping.py"""
+
+import unittest
+from lib.netbox.ansible import MAPPINGS, TRANSLATIONS
+from lib.netbox.mapping import (
+    Field, Reference, choice_label, choice_value, compile_mapping,
+    dependency_levels, field, first_defined, lookups, references, sources)
+
+
+def name(key, value, attribute='name'):
+    """Resolve references to their collection and the attribute read"""
+    if value is None:
+        return None
+
+    return '{}:{}'.format(key, value[attribute])
+
+
+def interpreted(mapping, data, resolve):
+    """Returns a record translated field by field, as compiled mappings do"""
+    record = {}
+    for spec in map(field, mapping):
+        source = spec.source or spec.output
+        if isinstance(source, str):
+            value = data[source]
+        else:
+            value = first_defined(data, source)
+        extract = spec.extract
+        if extract == 'label':
+            value = choice_label(value)
+        elif extract == 'value':
+            value = choice_value(value)
+        elif isinstance(extract, Reference) and extract.many:
+            value = [resolve(extract.key, item, extract.attribute)
+                     for item in value]
+        elif isinstance(extract, Reference):
+            value = resolve(extract.key, value, extract.attribute)
+        elif extract is not None and value is not None:
+            value = interpreted(extract, value, resolve)
+        if value is not None or not spec.optional:
+            record[spec.output] = value
+
+    return record
+
+
+def sample(mapping):
+    """Returns a NetBox record defining every field a mapping reads
+
+    Fields read from several sources are only defined by the last one.
+    """
+    data = {}
+    for spec in map(field, mapping):
+        source = spec.source or spec.output
+        if not isinstance(source, str):
+            data.update(dict.fromkeys(source[:-1]))
+            source = source[-1]
+        extract = spec.extract
+        nested = {'id': 1, 'name': 'a', 'model': 'b', 'address': 'c'}
+        if extract in ('label', 'value'):
+            data[source] = {'value': 'active', 'label': 'Active'}
+        elif isinstance(extract, Reference):
+            data[source] = [nested, nested] if extract.many else nested
+        elif extract is not None:
+            data[source] = sample(extract)
+        else:
+            data[source] = '{} value'.format(source)
+
+    return data
+
+
+class CompileMappingTest(unittest.TestCase):
+    """Compiled translations of mappings"""
+
+    def test_fields(self):
+        translate = compile_mapping((
+            'name',
+            Field('renamed', 'source'),
+            Field('first', ('missing', 'defined')),
+            Field('status', extract='label'),
+            Field('family', extract='value'),
+            Field('empty', extract='label'),
+        ))
+        self.assertEqual(translate({
+            'name': 'a', 'source': 'b', 'missing': None, 'defined': 'c',
+            'status': {'value': 'active', 'label': 'Active'},
+            'family': {'value': 4, 'label': 'IPv4'}, 'empty': None,
+            'unmapped': 'd'}, name), {
+                'name': 'a', 'renamed': 'b', 'first': 'c',
+                'status': 'Active', 'family': 4, 'empty': None})
+
+    def test_references(self):
+        translate = compile_mapping((
+            Field('site', extract=Reference('netbox_sites')),
+            Field('device_type', extract=Reference(
+                'netbox_device_types', 'model')),
+            Field('tenant', extract=Reference('netbox_tenants')),
+            Field('tagged_vlans',
+                  extract=Reference('netbox_vlans', many=True)),
+        ))
+        self.assertEqual(translate({
+            'site': {'id': 1, 'name': 'Paris'},
+            'device_type': {'id': 2, 'model': 'Box 1'}, 'tenant': None,
+            'tagged_vlans': [{'id': 3, 'name': 'a'},
+                             {'id': 4, 'name': 'b'}]}, name), {
+                'site': 'netbox_sites:Paris',
+                'device_type': 'netbox_device_types:Box 1', 'tenant': None,
+                'tagged_vlans': ['netbox_vlans:a', 'netbox_vlans:b']})
+
+    def test_optional(self):
+        translate = compile_mapping((
+            'name', Field('role', extract='label', optional=True)))
+        self.assertEqual(translate({'name': 'a', 'role': None}, name),
+                         {'name': 'a'})
+        self.assertEqual(translate({'name': 'a', 'role': {
+            'value': 'vip', 'label': 'VIP'}}, name),
+                         {'name': 'a', 'role': 'VIP'})
+
+    def test_nested(self):
+        translate = compile_mapping((
+            'address',
+            Field('interface', extract=(
+                'name',
+                Field('device', extract=Reference('netbox_devices'),
+                      optional=True),
+                Field('virtual_machine',
+                      extract=Reference('netbox_virtual_machines'),
+                      optional=True),
+            )),
+            Field('nat_inside', extract=('address', 'vrf')),
+        ))
+        self.assertEqual(translate({
+            'address': '10.0.0.1/24',
+            'interface': {'id': 1, 'name': 'eth0',
+                          'device': {'id': 2, 'name': 'dev1'},
+                          'virtual_machine': None},
+            'nat_inside': None}, name), {
+                'address': '10.0.0.1/24',
+                'interface': {'name': 'eth0',
+                              'device': 'netbox_devices:dev1'},
+                'nat_inside': None})
+
+    def test_every_mapping(self):
+        for key, mapping in MAPPINGS.items():
+            data = sample(mapping)
+            self.assertEqual(TRANSLATIONS[key](data, name),
+                             interpreted(mapping, data, name), key)
+
+
+class MappingTest(unittest.TestCase):
+    """Fields and references read by mappings"""
+
+    mapping = (
+        'name',
+        Field('first', ('b', 'a')),
+        Field('site', extract=Reference('netbox_sites')),
+        Field('tags', extract=Reference('netbox_tags', many=True)),
+        Field('nat_inside', extract=(
+            'address', Field('vrf', extract=Reference('netbox_vrfs')))),
+    )
+
+    def test_sources(self):
+        self.assertEqual(sources(self.mapping),
+                         ('a', 'b', 'name', 'nat_inside', 'site', 'tags'))
+
+    def test_references(self):
+        self.assertEqual(references(self.mapping), ('site',))
+
+    def test_lookups(self):
+        self.assertEqual(lookups(self.mapping), {
+            ('netbox_sites', 'name'), ('netbox_tags', 'name'),
+            ('netbox_vrfs', 'name')})
+
+    def test_dependency_levels(self):
+        self.assertEqual(dependency_levels({
+            'a': set(), 'b': {'a', 'b'}, 'c': {'a'}, 'd': {'b', 'c'}}),
+                         [['a'], ['b', 'c'], ['d']])
+        with self.assertRaises(ValueError):
+            dependency_levels({'a': {'b'}, 'b': {'a'}})
+
+
+if __name__ == '__main__':
+    unittest.main()
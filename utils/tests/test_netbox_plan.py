@@ -0,0 +1,113 @@
+"""Tests of the planning shared with the netbox_bulk module"""
+
+import copy
+import json
+import unittest
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from lib.netbox.apply import APPLY_LEVELS
+from lib.netbox.plan import NetBoxPlan, answered
+from tests.test_apply import DATA
+from tests.writable import WritableNetBox
+
+
+class UrllibNetBoxPlan(NetBoxPlan):
+    """NetBoxPlan sending requests with urllib, as netbox_bulk does"""
+
+    def request(self, method, url, body=None, bulk=False):
+        data = None if body is None else json.dumps(body).encode()
+        request = Request(url, data=data, method=method, headers={
+            'Authorization': 'Token token',
+            'Content-Type': 'application/json'})
+        try:
+            with urlopen(request) as response:
+                status, content = response.status, response.read()
+        except HTTPError as error:
+            if answered(method, error.code, bulk):
+                return error.code, None
+            raise
+
+        return status, json.loads(content) if content else None
+
+    def read(self, key):
+        url = '{}?limit=0'.format(self.endpoint(key))
+        objects = []
+        while url:
+            _, page = self.request('GET', url)
+            objects.extend(page['results'])
+            url = page['next']
+
+        return objects
+
+
+class NetBoxPlanTest(unittest.TestCase):
+    """Plan and write collections one at a time, as the module does"""
+
+    def setUp(self):
+        self.server = WritableNetBox(max_page_size=2)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.data = copy.deepcopy(DATA)
+
+    def netbox_plan(self):
+        """Returns a NetBoxPlan writing to the stand-in"""
+        return UrllibNetBoxPlan('{}/api/'.format(self.server.url))
+
+    def run_collections(self, strict=True, write=True):
+        """Plan and write every collection in turn, returning the plans"""
+        netbox_plan = self.netbox_plan()
+        plans = {}
+        for key in [key for level in APPLY_LEVELS for key in level
+                    if key in self.data]:
+            plan = plans[key] = netbox_plan.plan_collection(
+                key, self.data[key], strict)
+            if write:
+                netbox_plan.apply_collection(key, plan)
+                netbox_plan.delete(key, plan['delete'])
+
+        return plans
+
+    def test_check_mode(self):
+        self.data['netbox_devices'][0]['data']['site'] = 'Lyon'
+        plans = self.run_collections(strict=False, write=False)
+        self.assertEqual(sum(self.server.methods[method]
+                             for method in ('POST', 'PATCH', 'DELETE')), 0)
+        # Devices of a missing site are planned as given
+        creates = plans['netbox_devices']['create']
+        self.assertEqual([create['name'] for create in creates],
+                         ['dev2', 'dev1'])
+        self.assertEqual(creates[1]['data'],
+                         self.data['netbox_devices'][0]['data'])
+
+    def test_write_and_rerun(self):
+        self.run_collections()
+        dev1 = self.server.find('dcim/devices', name='dev1')[0]
+        self.assertEqual(len(self.server.find(
+            'dcim/interfaces', device=dev1['id'])), 2)
+
+        self.data['netbox_devices'][0]['data']['serial'] = 'SN9'
+        self.data['netbox_devices'][1]['state'] = 'absent'
+        self.data['netbox_device_interfaces'][2]['state'] = 'absent'
+        plans = self.run_collections()
+        self.assertEqual(plans['netbox_devices']['update'][0]['after'],
+                         {'serial': 'SN9'})
+        self.assertEqual(len(plans['netbox_devices']['delete']), 1)
+        self.assertEqual(self.server.find('dcim/devices', serial='SN9'),
+                         [dict(dev1, serial='SN9')])
+        self.assertEqual(len(self.server.find('dcim/devices')), 1)
+
+        self.server.methods.clear()
+        plans = self.run_collections()
+        self.assertEqual(self.server.methods['POST'], 0)
+        self.assertEqual(self.server.methods['PATCH'], 0)
+        self.assertFalse(any(plan['create'] or plan['update']
+                             for plan in plans.values()))
+
+    def test_missing_reference(self):
+        self.data['netbox_devices'][0]['data']['site'] = 'Lyon'
+        with self.assertRaises(LookupError):
+            self.run_collections()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Tests of lib/netbox/paginator.py against the fake NetBox API"""
+
+import unittest
+import pynetbox
+from lib.netbox.fakeapi import FakeNetBox
+from lib.netbox.paginator import Paginator
+
+
+class PaginatorTest(unittest.TestCase):
+    """Pages fetched one after another, concurrently or auto tuned"""
+
+    def setUp(self):
+        self.server = FakeNetBox(scale=1000, max_page_size=120)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.netbox = pynetbox.api(url=self.server.url, token='t')
+        self.endpoint = self.netbox.dcim.interfaces
+        self.count = self.server.inventory.counts['interfaces']
+
+    def pages(self, params=None, **options):
+        """Returns the pages of the endpoint and the paging stats"""
+        paginator = Paginator(self.netbox, **options)
+        pages = list(paginator.pages(self.endpoint, params))
+
+        return pages, paginator.stats[self.endpoint.url]
+
+    def results(self, params=None, **options):
+        """Returns the objects of the endpoint"""
+        pages, _ = self.pages(params, **options)
+
+        return [record for page in pages for record in page['results']]
+
+    def test_serial(self):
+        pages, stats = self.pages(page_size=50)
+        self.assertEqual(len(pages), 10)
+        self.assertEqual(stats['page_size'], 50)
+        self.assertEqual(stats['requests'], 10)
+        self.assertEqual(
+            [record['id'] for page in pages for record in page['results']],
+            list(range(1, self.count + 1)))
+
+    def test_maximum_page_size(self):
+        pages, stats = self.pages()
+        self.assertEqual(len(pages), 5)
+        self.assertEqual(stats['page_size'], 120)
+
+    def test_equal_outputs(self):
+        serial = self.results(page_size=50)
+        self.assertEqual(len(serial), self.count)
+        for options in ({'page_size': 50, 'workers': 4},
+                        {'page_size': 7, 'workers': 3},
+                        {'workers': 4},
+                        {'auto_tune': True},
+                        {'auto_tune': True, 'workers': 4},
+                        {'auto_tune': True, 'page_size': 16, 'workers': 2}):
+            self.assertEqual(self.results(**options), serial, options)
+
+    def test_auto_tune(self):
+        pages, stats = self.pages(auto_tune=True, workers=4)
+        # Limits of 50 then 100 are honoured, 200 is capped to NetBox's
+        # maximum, which the remaining pages are requested with
+        self.assertEqual([len(page['results']) for page in pages[:3]],
+                         [50, 100, 120])
+        self.assertEqual(stats['page_size'], 120)
+        self.assertEqual(stats['requests'], len(pages))
+
+    def test_params(self):
+        serial = self.results({'brief': 1}, page_size=50)
+        self.assertEqual(serial[0], {'id': 1, 'url': serial[0]['url'],
+                                     'name': 'interfaces-1',
+                                     'slug': 'interfaces-1'})
+        self.assertEqual(
+            self.results({'brief': 1}, page_size=50, workers=4), serial)
+        self.assertEqual(
+            self.results({'brief': 1}, auto_tune=True, workers=4), serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,269 @@
+"""Stateful stand-in for the NetBox 2.8 API, as written to by apply.py"""
+
+import json
+import threading
+from urllib.parse import parse_qs, urlparse
+from lib.netbox.fakeapi import APIHandler, APIServer
+
+# Choices of the status fields, as (value, label)
+STATUS = (('active', 'Active'), ('planned', 'Planned'),
+          ('offline', 'Offline'))
+
+# Writable fields of the list endpoints served. Each is a plain field
+# (None), a reference to an object of another endpoint, a list of them,
+# or a tuple of choices.
+ENDPOINTS = {
+    'dcim/regions': {'name': None, 'slug': None, 'parent': 'dcim/regions'},
+    'dcim/sites': {'name': None, 'slug': None, 'region': 'dcim/regions',
+                   'tenant': 'tenancy/tenants', 'status': STATUS,
+                   'description': None, 'tags': None},
+    'dcim/rack-groups': {'name': None, 'slug': None, 'site': 'dcim/sites'},
+    'dcim/racks': {'name': None, 'site': 'dcim/sites',
+                   'group': 'dcim/rack-groups', 'tenant': 'tenancy/tenants',
+                   'status': STATUS},
+    'dcim/rack-roles': {'name': None, 'slug': None, 'color': None},
+    'dcim/manufacturers': {'name': None, 'slug': None},
+    'dcim/device-types': {'model': None, 'slug': None,
+                          'manufacturer': 'dcim/manufacturers'},
+    'dcim/device-roles': {'name': None, 'slug': None, 'color': None},
+    'dcim/devices': {'name': None, 'site': 'dcim/sites',
+                     'tenant': 'tenancy/tenants',
+                     'device_type': 'dcim/device-types',
+                     'device_role': 'dcim/device-roles',
+                     'rack': 'dcim/racks', 'status': STATUS, 'serial': None,
+                     'tags': None, 'custom_fields': None},
+    'dcim/interfaces': {
+        'name': None, 'device': 'dcim/devices', 'lag': 'dcim/interfaces',
+        'type': (('1000base-t', '1000BASE-T (1GE)'),
+                 ('lag', 'Link Aggregation Group (LAG)')),
+        'tagged_vlans': ['ipam/vlans'], 'enabled': None},
+    'tenancy/tenant-groups': {'name': None, 'slug': None},
+    'tenancy/tenants': {'name': None, 'slug': None,
+                        'group': 'tenancy/tenant-groups'},
+    'ipam/vlans': {'name': None, 'vid': None, 'site': 'dcim/sites'},
+    'ipam/vrfs': {'name': None, 'rd': None, 'tenant': 'tenancy/tenants'},
+    'virtualization/cluster-types': {'name': None, 'slug': None},
+    'virtualization/clusters': {'name': None,
+                                'type': 'virtualization/cluster-types'},
+    'virtualization/virtual-machines': {
+        'name': None, 'cluster': 'virtualization/clusters',
+        'tenant': 'tenancy/tenants', 'status': STATUS},
+}
+
+# Objects deleted along with the ones they reference, as NetBox 2.8 does,
+# by the endpoint and field of the reference
+CASCADES = {
+    'dcim/regions': (('dcim/regions', 'parent'),),
+    'dcim/devices': (('dcim/interfaces', 'device'),),
+}
+
+
+class WritableNetBoxHandler(APIHandler):
+    """Serve and write the list and detail views of the NetBox API
+
+    Like NetBox before 2.10, list endpoints create objects in bulk but do
+    not update or delete them, answering 405.
+    """
+
+    def route(self):
+        """Returns the endpoint, object id and query of the request"""
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part][1:]
+        object_id = int(parts.pop()) if parts[-1].isdigit() else None
+
+        return '/'.join(parts), object_id, parse_qs(url.query)
+
+    def body(self):
+        """Returns the JSON body of the request"""
+        length = int(self.headers.get('Content-Length', 0))
+
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def do_OPTIONS(self):  # pylint: disable=invalid-name
+        """Describe the fields a list endpoint accepts"""
+        endpoint, _, _ = self.route()
+        fields = {'id': {'type': 'integer', 'read_only': True}}
+        for name, kind in ENDPOINTS[endpoint].items():
+            fields[name] = {'type': 'field', 'read_only': False}
+            if isinstance(kind, tuple):
+                fields[name]['choices'] = [
+                    {'value': value, 'display_name': label}
+                    for value, label in kind]
+        self.respond(200, {'name': endpoint, 'actions': {'POST': fields}})
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve a page of a list endpoint, or an object"""
+        endpoint, object_id, query = self.route()
+        server = self.server
+        with server.lock:
+            objects = server.objects[endpoint]
+            if object_id is not None:
+                if object_id not in objects:
+                    self.respond(404, {'detail': 'Not found.'})
+                else:
+                    self.respond(200, server.render(
+                        endpoint, objects[object_id]))
+                return
+            results = [server.render(endpoint, data)
+                       for _, data in sorted(objects.items())]
+
+        offset, limit, next_url = self.page(query, len(results))
+        self.respond(200, {'count': len(results), 'next': next_url,
+                           'previous': None,
+                           'results': results[offset:offset + limit]})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Create an object, or a list of them"""
+        endpoint, _, _ = self.route()
+        body = self.body()
+        items = body if isinstance(body, list) else [body]
+        server = self.server
+        with server.lock:
+            errors = [server.errors(endpoint, item) for item in items]
+            if any(errors):
+                self.respond(400, errors if isinstance(body, list)
+                             else errors[0])
+                return
+            created = []
+            for item in items:
+                server.last_id += 1
+                server.objects[endpoint][server.last_id] = dict(
+                    item, id=server.last_id)
+                created.append(server.render(
+                    endpoint, server.objects[endpoint][server.last_id]))
+        self.respond(201, created if isinstance(body, list) else created[0])
+
+    def do_PATCH(self):  # pylint: disable=invalid-name
+        """Update an object"""
+        endpoint, object_id, _ = self.route()
+        # Read the body first, the connection is reused
+        item = self.body()
+        server = self.server
+        with server.lock:
+            if object_id is None:
+                self.respond(405, {
+                    'detail': 'Method "PATCH" not allowed.'})
+                return
+            if object_id not in server.objects[endpoint]:
+                self.respond(404, {'detail': 'Not found.'})
+                return
+            errors = server.errors(endpoint, item)
+            if errors:
+                self.respond(400, errors)
+                return
+            server.objects[endpoint][object_id].update(item)
+            self.respond(200, server.render(
+                endpoint, server.objects[endpoint][object_id]))
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """Delete an object"""
+        endpoint, object_id, _ = self.route()
+        self.body()
+        server = self.server
+        with server.lock:
+            if object_id is None:
+                self.respond(405, {
+                    'detail': 'Method "DELETE" not allowed.'})
+                return
+            if object_id not in server.objects[endpoint]:
+                self.respond(404, {'detail': 'Not found.'})
+                return
+            server.delete(endpoint, object_id)
+        self.respond(204)
+
+
+class WritableNetBox(APIServer):
+    """In-process stand-in for a NetBox API holding written objects
+
+    Objects are held as written, references by id and choices by value,
+    and rendered like NetBox does, references as nested objects and
+    choices with their label. Writes of unknown fields, missing objects or
+    invalid choices are refused.
+    """
+
+    def __init__(self, page_size=50, max_page_size=1000):
+        super().__init__(WritableNetBoxHandler, page_size=page_size,
+                         max_page_size=max_page_size)
+        self.objects = {endpoint: {} for endpoint in ENDPOINTS}
+        self.last_id = 0
+        # Deleting an object deletes the ones cascading while holding it
+        self.lock = threading.RLock()
+
+    def add(self, endpoint, **data):
+        """Add an object as written, returning its id"""
+        with self.lock:
+            self.last_id += 1
+            self.objects[endpoint][self.last_id] = dict(data, id=self.last_id)
+
+        return self.last_id
+
+    def find(self, endpoint, **fields):
+        """Returns the objects of an endpoint with the values of fields"""
+        with self.lock:
+            objects = sorted(self.objects[endpoint].items())
+
+        return [dict(data) for _, data in objects
+                if all(data.get(name) == value
+                       for name, value in fields.items())]
+
+    def delete(self, endpoint, object_id):
+        """Delete an object and the ones referencing it which cascade"""
+        with self.lock:
+            self.objects[endpoint].pop(object_id)
+            for referencing, field in CASCADES.get(endpoint, ()):
+                for found in [found for found, data
+                              in self.objects[referencing].items()
+                              if data.get(field) == object_id]:
+                    if found in self.objects[referencing]:
+                        self.delete(referencing, found)
+
+    def errors(self, endpoint, item):
+        """Returns the errors of an object written, by field"""
+        errors = {}
+        for name, value in item.items():
+            kind = ENDPOINTS[endpoint].get(name)
+            if name not in ENDPOINTS[endpoint]:
+                errors[name] = ['Unknown field.']
+            elif isinstance(kind, tuple):
+                if value not in [choice for choice, _ in kind]:
+                    errors[name] = ['"{}" is not a valid choice.'.format(
+                        value)]
+            elif kind is not None and value is not None:
+                references = value if isinstance(kind, list) else [value]
+                target = kind[0] if isinstance(kind, list) else kind
+                missing = [reference for reference in references
+                           if reference not in self.objects[target]]
+                if missing:
+                    errors[name] = ['Invalid pk "{}" - object does not '
+                                    'exist.'.format(missing[0])]
+
+        return errors
+
+    def render(self, endpoint, data):
+        """Returns an object as NetBox answers it"""
+        rendered = {}
+        for name, value in data.items():
+            kind = ENDPOINTS[endpoint].get(name)
+            if value is None or kind is None:
+                rendered[name] = value
+            elif isinstance(kind, tuple):
+                rendered[name] = {'value': value,
+                                  'label': dict(kind)[value]}
+            elif isinstance(kind, list):
+                rendered[name] = [self.nested(kind[0], item)
+                                  for item in value]
+            else:
+                rendered[name] = self.nested(kind, value)
+
+        return rendered
+
+    def nested(self, endpoint, object_id):
+        """Returns the nested representation of a referenced object"""
+        data = self.objects[endpoint].get(object_id, {})
+        nested = {'id': object_id, 'url': '{}/api/{}/{}/'.format(
+            self.url, endpoint, object_id)}
+        for name in ('name', 'slug', 'model'):
+            if name in data:
+                nested[name] = data[name]
+
+        return nested